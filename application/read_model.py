@@ -0,0 +1,497 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from domain.interfaces import ITaskRepository, IUserRepository
+from domain.models import Category, Recurrence, Subtask, Task, TaskFacets, TaskProjection, User
+from domain.recurrence import pending_occurrences
+from infrastructure.metrics import register_metrics
+from infrastructure.shared_cache import CLEAR_ALL, SHARED_CACHE_ENABLED, SharedCache, shared_cache
+
+READ_MODEL_ENABLED = os.getenv("READ_MODEL_ENABLED", "1") == "1"
+READ_MODEL_MAX_BYTES = int(float(os.getenv("READ_MODEL_MAX_MB", "32")) * 1024 * 1024)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "0"))
+
+# Write generations are kept for this many recently written users; older
+# ones fold into a single floor value.
+TRACKED_GENERATIONS = 10000
+
+# Rough per-object footprint of a cached Task/Subtask dataclass, on top of its strings.
+TASK_OVERHEAD_BYTES = 700
+SUBTASK_OVERHEAD_BYTES = 350
+
+
+def estimate_size(tasks: List[Task]) -> int:
+    size = sys.getsizeof(tasks)
+    for task in tasks:
+        size += TASK_OVERHEAD_BYTES + len(task.title) + len(task.category or "")
+        size += sum(SUBTASK_OVERHEAD_BYTES + len(s.title) for s in task.subtasks)
+    return size
+
+
+@dataclass
+class _UserEntry:
+    tasks: List[Task]
+    by_id: Dict[int, Task] = field(default_factory=dict)
+    size: int = 0
+
+
+def _copy_task(task: Task) -> Task:
+    # Cached tasks are never handed out or taken in by reference, so callers
+    # may change what they get without changing the cache.
+    return replace(
+        task,
+        subtasks=[replace(subtask) for subtask in task.subtasks],
+        recurrence=replace(task.recurrence) if task.recurrence is not None else None,
+    )
+
+
+def _task_list_key(user_id: int) -> str:
+    return f"tasks:{user_id}"
+
+
+# The shared cache holds JSON, so cached values are spelled out field by field.
+_TASK_DATETIMES = ("deadline", "created_at", "completed_at", "archived_at")
+
+
+def _datetime_to_json(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _datetime_from_json(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _task_to_json(task: Task) -> dict:
+    data = asdict(task)
+    for name in _TASK_DATETIMES:
+        data[name] = _datetime_to_json(data[name])
+    if data["recurrence"] is not None:
+        data["recurrence"]["start"] = _datetime_to_json(data["recurrence"]["start"])
+    return data
+
+
+def _task_from_json(data: dict) -> Task:
+    data = dict(data)
+    for name in _TASK_DATETIMES:
+        data[name] = _datetime_from_json(data[name])
+    data["subtasks"] = [Subtask(**subtask) for subtask in data["subtasks"]]
+    if data["recurrence"] is not None:
+        data["recurrence"] = Recurrence(**{**data["recurrence"], "start": _datetime_from_json(data["recurrence"]["start"])})
+    return Task(**data)
+
+
+class TaskReadModel:
+    # Task lists are kept in process memory and, when a shared cache is
+    # given, mirrored there so other workers can load them and learn about
+    # each other's writes.
+    def __init__(self, max_bytes: int = READ_MODEL_MAX_BYTES, shared: Optional[SharedCache] = None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: "OrderedDict[int, _UserEntry]" = OrderedDict()
+        # A user's generation changes on every write, so a list loaded
+        # before the write is not stored after it.
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._clock = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        if shared is not None:
+            shared.add_listener(self._on_remote_invalidation)
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        shared_version = self.shared.version() if self.shared is not None else 0
+        with self._lock:
+            return self._generation(user_id), shared_version
+
+    def get_list(self, user_id: int) -> Optional[List[Task]]:
+        self.sync()
+        with self._lock:
+            entry = self._touch(user_id)
+            if entry is not None:
+                return [_copy_task(task) for task in entry.tasks]
+        return self._load_shared(user_id)
+
+    def get_task(self, user_id: int, task_id: int) -> Optional[Task]:
+        # Returns None on a cold user, and for tasks outside the user's
+        # personal list, such as those of their workspaces.
+        self.sync()
+        with self._lock:
+            entry = self._touch(user_id)
+            task = entry.by_id.get(task_id) if entry else None
+            return _copy_task(task) if task is not None else None
+
+    def is_warm(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._entries
+
+    def put_list(self, user_id: int, tasks: List[Task], generation: Tuple[int, int]):
+        local_generation, shared_version = generation
+        with self._lock:
+            # A write that happened while the list was loading makes it stale.
+            if self._generation(user_id) != local_generation:
+                return
+            self._store(user_id, tasks)
+        if self.shared is not None:
+            self.shared.set(_task_list_key(user_id), [_task_to_json(task) for task in tasks], since=shared_version)
+
+    def apply(self, user_id: int, change: Callable[[List[Task]], List[Task]]):
+        with self._lock:
+            self._bump(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._store(user_id, change(list(entry.tasks)))
+        self._broadcast(user_id)
+
+    def invalidate(self, user_id: int):
+        self._drop(user_id)
+        self._broadcast(user_id)
+
+    def clear(self, shared: bool = True):
+        with self._lock:
+            self._clear_local()
+        if shared and self.shared is not None:
+            self.shared.clear()
+
+    def sync(self):
+        if self.shared is not None:
+            self.shared.poll()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "remote_invalidations": self.remote_invalidations,
+            }
+
+    def _load_shared(self, user_id: int) -> Optional[List[Task]]:
+        if self.shared is None:
+            return None
+        generation = self.generation(user_id)
+        data = self.shared.get(_task_list_key(user_id))
+        if data is None:
+            return None
+        try:
+            tasks = [_task_from_json(task) for task in data]
+        except (KeyError, TypeError, ValueError):
+            # Written by a release whose Task had other fields.
+            return None
+        with self._lock:
+            self.shared_hits += 1
+            if self._generation(user_id) == generation[0]:
+                self._store(user_id, tasks)
+        return list(tasks)
+
+    def _broadcast(self, user_id: int):
+        if self.shared is not None:
+            self.shared.invalidate(_task_list_key(user_id))
+
+    def _on_remote_invalidation(self, key: str):
+        with self._lock:
+            self.remote_invalidations += 1
+            if key == CLEAR_ALL:
+                self._clear_local()
+                return
+        if key.startswith("tasks:"):
+            self._drop(int(key.split(":", 1)[1]))
+
+    def _drop(self, user_id: int):
+        with self._lock:
+            self._bump(user_id)
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self.size -= entry.size
+                self.invalidations += 1
+
+    def _clear_local(self):
+        # Every list being loaded anywhere in the process is stale now.
+        self._clock += 1
+        self._generations.clear()
+        self._generation_floor = self._clock
+        self._entries.clear()
+        self.size = 0
+
+    def _generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, self._generation_floor)
+
+    def _bump(self, user_id: int):
+        self._clock += 1
+        self._generations[user_id] = self._clock
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > TRACKED_GENERATIONS:
+            # Forgotten users fall back to the floor, which is at least their
+            # last generation, so a load from before their write still fails.
+            _, self._generation_floor = self._generations.popitem(last=False)
+
+    def _touch(self, user_id: int) -> Optional[_UserEntry]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def _store(self, user_id: int, tasks: List[Task]):
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            self.size -= old.size
+        tasks = [_copy_task(task) for task in tasks]
+        entry = _UserEntry(tasks=tasks, by_id={t.id: t for t in tasks}, size=estimate_size(tasks))
+        if entry.size > self.max_bytes:
+            return
+        self._entries[user_id] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+
+task_read_model = TaskReadModel(shared=shared_cache if SHARED_CACHE_ENABLED else None)
+register_metrics("read_model", task_read_model.stats)
+
+
+def _replace_task(updated: Task) -> Callable[[List[Task]], List[Task]]:
+    return lambda tasks: [updated if t.id == updated.id else t for t in tasks]
+
+
+def _remove_task(task_id: int) -> Callable[[List[Task]], List[Task]]:
+    # Deleting an occurrence of a recurring task removes its whole series.
+    def change(tasks: List[Task]) -> List[Task]:
+        series_id = next((t.series_id for t in tasks if t.id == task_id), None)
+        return [t for t in tasks if t.id != task_id and (series_id is None or t.series_id != series_id)]
+    return change
+
+
+class CachedTaskRepository(ITaskRepository):
+    def __init__(self, repository: ITaskRepository, read_model: TaskReadModel = task_read_model):
+        self.repository = repository
+        self.read_model = read_model
+        self._in_transaction = False
+
+    @contextmanager
+    def transaction(self, user_id: int, allow_split: bool = False) -> Iterator[None]:
+        # Writes inside the block may still roll back, so the cached list is
+        # left alone until the end and then dropped either way.
+        self._in_transaction = True
+        try:
+            with self.repository.transaction(user_id, allow_split):
+                yield
+        finally:
+            self._in_transaction = False
+            self.read_model.invalidate(user_id)
+
+    def _apply(self, user_id: int, change: Callable[[List[Task]], List[Task]]):
+        if not self._in_transaction:
+            self.read_model.apply(user_id, change)
+
+    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None, recurrence: Optional[Recurrence] = None, workspace_id: Optional[int] = None) -> Optional[Task]:
+        task = self.repository.create(title, user_id, deadline, priority, category, recurrence, workspace_id)
+        if task is not None and workspace_id is None:
+            self._apply(user_id, lambda tasks: tasks + [task])
+        return task
+
+    def get_by_id(self, task_id: int, user_id: int, projection: Optional[TaskProjection] = None) -> Optional[Task]:
+        # Only personal lists are cached; a miss may still be a workspace task.
+        task = self.read_model.get_task(user_id, task_id)
+        if task is not None:
+            return task
+        return self.repository.get_by_id(task_id, user_id, projection)
+
+    def get_all_by_user(self, user_id: int, workspace_id: Optional[int] = None, projection: Optional[TaskProjection] = None) -> List[Task]:
+        if workspace_id is not None:
+            return self.repository.get_all_by_user(user_id, workspace_id, projection)
+        tasks = self.read_model.get_list(user_id)
+        if tasks is not None and not pending_occurrences(tasks, datetime.utcnow()):
+            return tasks
+        if projection is not None:
+            # A partial list must not be cached as the user's full list.
+            return self.repository.get_all_by_user(user_id, projection=projection)
+        generation = self.read_model.generation(user_id)
+        tasks = self.repository.get_all_by_user(user_id)
+        self.read_model.put_list(user_id, tasks, generation)
+        return list(tasks)
+
+    def get_visible(self, user_id: int, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self.repository.get_visible(user_id, projection)
+
+    def get_due(self, user_id: int, start: datetime, end: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        tasks = self.read_model.get_list(user_id)
+        if tasks is None or pending_occurrences(tasks, datetime.utcnow(), start, end, limit):
+            return self._load_through(user_id, lambda: self.repository.get_due(user_id, start, end, limit, projection))
+        due = [t for t in tasks if not t.completed and t.deadline is not None and start <= t.deadline < end]
+        return sorted(due, key=lambda t: (t.deadline, t.id))[:limit]
+    
+    def get_overdue(self, user_id: int, now: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        tasks = self.read_model.get_list(user_id)
+        if tasks is None or pending_occurrences(tasks, now):
+            return self._load_through(user_id, lambda: self.repository.get_overdue(user_id, now, limit, projection))
+        overdue = [t for t in tasks if not t.completed and t.deadline is not None and t.deadline < now]
+        return sorted(overdue, key=lambda t: (t.deadline, t.id))[:limit]
+    
+    def _load_through(self, user_id: int, query: Callable[[], List[Task]]) -> List[Task]:
+        # The repository may materialize recurring occurrences on the way,
+        # which makes the user's cached list stale here and on other workers.
+        warm = self.read_model.is_warm(user_id)
+        tasks = query()
+        if warm or any(t.series_id is not None for t in tasks):
+            self.read_model.invalidate(user_id)
+        return tasks
+    
+    def update(self, task_id: int, user_id: int, title: Optional[str] = None, completed: Optional[bool] = None, deadline: Optional[datetime] = None, priority: Optional[str] = None, category: Optional[str] = None) -> Optional[Task]:
+        task = self.repository.update(task_id, user_id, title, completed, deadline, priority, category)
+        if task is not None and completed and task.series_id is not None:
+            # Earlier completed occurrences were compacted away.
+            self.read_model.invalidate(user_id)
+        elif task is not None:
+            self._apply(user_id, _replace_task(task))
+        return task
+
+    def delete(self, task_id: int, user_id: int) -> bool:
+        deleted = self.repository.delete(task_id, user_id)
+        if deleted:
+            self._apply(user_id, _remove_task(task_id))
+        return deleted
+
+    def delete_completed(self, user_id: int) -> int:
+        count = self.repository.delete_completed(user_id)
+        self.read_model.invalidate(user_id)
+        return count
+
+    def update_positions(self, user_id: int, task_positions: List[tuple]) -> bool:
+        result = self.repository.update_positions(user_id, task_positions)
+        self.read_model.invalidate(user_id)
+        return result
+
+    def add_subtask(self, task_id: int, user_id: int, title: str) -> Optional[Subtask]:
+        subtask = self.repository.add_subtask(task_id, user_id, title)
+        self.read_model.invalidate(user_id)
+        return subtask
+
+    def toggle_subtask(self, subtask_id: int, task_id: int, user_id: int, completed: bool) -> Optional[Subtask]:
+        subtask = self.repository.toggle_subtask(subtask_id, task_id, user_id, completed)
+        self.read_model.invalidate(user_id)
+        return subtask
+
+    def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
+        deleted = self.repository.delete_subtask(subtask_id, task_id, user_id)
+        self.read_model.invalidate(user_id)
+        return deleted
+
+    def add_subtasks(self, task_id: int, user_id: int, titles: List[str]) -> Optional[List[Subtask]]:
+        subtasks = self.repository.add_subtasks(task_id, user_id, titles)
+        self.read_model.invalidate(user_id)
+        return subtasks
+    
+    def set_subtasks_completed(self, task_id: int, user_id: int, completed: bool) -> Optional[int]:
+        count = self.repository.set_subtasks_completed(task_id, user_id, completed)
+        self.read_model.invalidate(user_id)
+        return count
+    
+    def delete_completed_subtasks(self, task_id: int, user_id: int) -> Optional[int]:
+        count = self.repository.delete_completed_subtasks(task_id, user_id)
+        self.read_model.invalidate(user_id)
+        return count
+    
+    def iter_tasks(self, user_id: int, chunk_size: int = 500) -> Iterator[Task]:
+        return self.repository.iter_tasks(user_id, chunk_size)
+    
+    def import_tasks(self, user_id: int, tasks: List[Task]) -> int:
+        count = self.repository.import_tasks(user_id, tasks)
+        self.read_model.invalidate(user_id)
+        return count
+    
+    def get_archived(self, user_id: int, offset: int = 0, limit: int = 50) -> List[Task]:
+        return self.repository.get_archived(user_id, offset, limit)
+    
+    def restore_archived(self, task_id: int, user_id: int) -> Optional[Task]:
+        task = self.repository.restore_archived(task_id, user_id)
+        if task is not None:
+            self._apply(user_id, lambda tasks: tasks + [task])
+        return task
+    
+    def get_categories(self, user_id: int) -> List[Category]:
+        return self.repository.get_categories(user_id)
+    
+    def create_category(self, user_id: int, name: str) -> Optional[Category]:
+        return self.repository.create_category(user_id, name)
+    
+    def delete_category(self, category_id: int, user_id: int) -> bool:
+        deleted = self.repository.delete_category(category_id, user_id)
+        if deleted:
+            self.read_model.invalidate(user_id)
+        return deleted
+    
+    def get_facets(self, user_id: int) -> TaskFacets:
+        return self.repository.get_facets(user_id)
+    
+    def close(self) -> None:
+        self.repository.close()
+
+
+def _user_key(username: str) -> str:
+    return f"user:{username}"
+
+
+class CachedUserRepository(IUserRepository):
+    # Caches bearer-token lookups by username in the shared cache. Only found
+    # users are cached; every user write invalidates the affected usernames
+    # on all workers.
+    def __init__(self, repository: IUserRepository, cache: SharedCache = shared_cache, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.repository = repository
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+
+    def create(self, username: str, email: str, hashed_password: str) -> User:
+        user = self.repository.create(username, email, hashed_password)
+        self.cache.invalidate(_user_key(username))
+        return user
+
+    def get_by_username(self, username: str) -> Optional[User]:
+        data = self.cache.get(_user_key(username))
+        if data is not None:
+            return User(**data)
+        since = self.cache.version()
+        user = self.repository.get_by_username(username)
+        if user is not None:
+            self.cache.set(_user_key(username), asdict(user), self.ttl_seconds, since=since)
+        return user
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        return self.repository.get_by_email(email)
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        return self.repository.get_by_id(user_id)
+
+    def find_existing(self, usernames: List[str], emails: List[str]) -> List[User]:
+        return self.repository.find_existing(usernames, emails)
+
+    def create_many(self, users: List[Tuple[str, str, str]]) -> List[User]:
+        created = self.repository.create_many(users)
+        for user in created:
+            self.cache.invalidate(_user_key(user.username))
+        return created
+
+    def close(self) -> None:
+        self.repository.close()
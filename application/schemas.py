@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, Field, EmailStr, StringConstraints
+from typing import Annotated, Dict, Literal, Optional, List, Union
 from datetime import datetime
 
 
@@ -20,6 +20,21 @@ class UserResponse(BaseModel):
     email: str
 
 
+class UserProvisionBatch(BaseModel):
+    users: List[UserCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class SkippedUser(BaseModel):
+    username: str
+    email: str
+    reason: str
+
+
+class ProvisionResult(BaseModel):
+    created: List[UserResponse] = []
+    skipped: List[SkippedUser] = []
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -36,11 +51,34 @@ class SubtaskCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
 
 
+class SubtaskBulkCreate(BaseModel):
+    titles: List[Annotated[str, Field(min_length=1, max_length=200)]] = Field(..., min_length=1, max_length=100)
+
+
+class SubtaskBulkToggle(BaseModel):
+    completed: bool
+
+
+CategoryName = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=50)]
+# On a task an empty string means no category, and clears it on update.
+TaskCategory = Optional[Union[Literal[""], CategoryName]]
+
+
+class RecurrenceRule(BaseModel):
+    frequency: Literal["daily", "weekly", "monthly"]
+    interval: int = Field(default=1, ge=1, le=366)
+
+
+class RecurrenceResponse(RecurrenceRule):
+    start: datetime
+
+
 class TaskCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
     deadline: Optional[datetime] = None
     priority: str = Field(default="medium", pattern="^(low|medium|high)$")
-    category: Optional[str] = None
+    category: TaskCategory = None
+    recurrence: Optional[RecurrenceRule] = None
 
 
 class TaskUpdate(BaseModel):
@@ -48,7 +86,7 @@ class TaskUpdate(BaseModel):
     completed: Optional[bool] = None
     deadline: Optional[datetime] = None
     priority: Optional[str] = Field(None, pattern="^(low|medium|high)$")
-    category: Optional[str] = None
+    category: TaskCategory = None
 
 
 class TaskResponse(BaseModel):
@@ -61,10 +99,145 @@ class TaskResponse(BaseModel):
     created_at: Optional[datetime] = None
     position: int
     subtasks: List[SubtaskResponse] = []
+    completed_at: Optional[datetime] = None
+    recurrence: Optional[RecurrenceResponse] = None
+    series_id: Optional[int] = None
+    workspace_id: Optional[int] = None
+    subtask_total: int = 0
+    subtask_completed: int = 0
     
     class Config:
         from_attributes = True
 
 
+class ArchivedTaskResponse(TaskResponse):
+    archived_at: datetime
+
+
+class SubtaskImport(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+    completed: bool = False
+
+
+class TaskImport(TaskCreate):
+    # A series cannot be rebuilt from its exported occurrences, so records
+    # carrying a rule are reported instead of imported without it.
+    recurrence: None = None
+    completed: bool = False
+    completed_at: Optional[datetime] = None
+    subtasks: List[SubtaskImport] = Field(default_factory=list, max_length=500)
+
+
+class ImportRecordError(BaseModel):
+    line: int
+    detail: str
+
+
+class ImportSummary(BaseModel):
+    imported: int = 0
+    subtasks: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: List[ImportRecordError] = []
+
+
+class CategoryCreate(BaseModel):
+    name: CategoryName
+
+
+class CategoryResponse(BaseModel):
+    id: int
+    name: str
+
+
+class CategoryFacet(CategoryResponse):
+    task_count: int
+
+
+class TaskFacetsResponse(BaseModel):
+    categories: List[CategoryFacet]
+    uncategorized: int
+    priorities: Dict[str, int]
+    completed: int
+    open: int
+
+
+class WorkspaceCreate(BaseModel):
+    name: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=100)]
+
+
+class WorkspaceResponse(BaseModel):
+    id: int
+    name: str
+    role: str
+    created_at: Optional[datetime] = None
+
+
+class WorkspaceMemberUpdate(BaseModel):
+    username: str
+    role: Literal["owner", "editor", "viewer"]
+
+
+class WorkspaceMemberResponse(BaseModel):
+    user_id: int
+    username: str
+    role: str
+
+
 class TaskPositionUpdate(BaseModel):
     task_positions: List[tuple]
+
+
+class CreateTaskOperation(TaskCreate):
+    op: Literal["create"]
+
+
+class UpdateTaskOperation(TaskUpdate):
+    op: Literal["update"]
+    task_id: int
+
+
+class DeleteTaskOperation(BaseModel):
+    op: Literal["delete"]
+    task_id: int
+
+
+class AddSubtaskOperation(SubtaskCreate):
+    op: Literal["subtask_add"]
+    task_id: int
+
+
+class ToggleSubtaskOperation(BaseModel):
+    op: Literal["subtask_toggle"]
+    task_id: int
+    subtask_id: int
+    completed: bool
+
+
+class DeleteSubtaskOperation(BaseModel):
+    op: Literal["subtask_delete"]
+    task_id: int
+    subtask_id: int
+
+
+class MoveTasksOperation(BaseModel):
+    op: Literal["move"]
+    positions: Dict[int, int]
+
+
+TaskOperation = Annotated[
+    Union[CreateTaskOperation, UpdateTaskOperation, DeleteTaskOperation, AddSubtaskOperation,
+          ToggleSubtaskOperation, DeleteSubtaskOperation, MoveTasksOperation],
+    Field(discriminator="op"),
+]
+
+
+class TaskOperationBatch(BaseModel):
+    operations: List[TaskOperation] = Field(..., min_length=1, max_length=100)
+
+
+class TaskOperationResult(BaseModel):
+    op: str
+    task: Optional[TaskResponse] = None
+    subtask: Optional[SubtaskResponse] = None
+    deleted: Optional[bool] = None
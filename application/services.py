@@ -1,29 +1,57 @@
-from domain.models import Task, User, Subtask
-from domain.interfaces import ITaskRepository, IUserRepository
-from .schemas import TaskCreate, TaskUpdate, UserCreate
-from infrastructure.auth import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from typing import List, Optional
-from datetime import timedelta
+from domain.models import Category, Recurrence, Task, TaskFacets, TaskProjection, User, Subtask, Workspace, WorkspaceMember
+from domain.interfaces import ITaskRepository, IUserRepository, IWorkspaceRepository
+from domain.exceptions import BatchOperationError
+from .schemas import ImportSummary, ProvisionResult, SkippedUser, TaskCreate, TaskUpdate, UserCreate, UserResponse, TaskOperation
+from . import task_transfer
+from .write_coalescing import WriteCoalescer
+from infrastructure.auth import verify_password, get_password_hash, hash_passwords, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from typing import BinaryIO, Iterator, List, Optional
+from datetime import datetime, timedelta, timezone
+
+
+def _as_utc(value: datetime) -> datetime:
+    # The database holds naive datetimes in UTC. Aware values are converted;
+    # naive ones are taken to be UTC already.
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 class TaskService:
-    def __init__(self, repository: ITaskRepository):
+    def __init__(self, repository: ITaskRepository, coalescer: Optional[WriteCoalescer] = None):
         self.repository = repository
+        self.coalescer = coalescer
     
-    def create_task(self, task_data: TaskCreate, user_id: int) -> Task:
+    def create_task(self, task_data: TaskCreate, user_id: int, workspace_id: Optional[int] = None) -> Optional[Task]:
+        deadline, recurrence = task_data.deadline, None
+        if task_data.recurrence is not None:
+            # Occurrences are scheduled against the server's UTC clock.
+            deadline = _as_utc(deadline) if deadline else None
+            recurrence = Recurrence(frequency=task_data.recurrence.frequency, interval=task_data.recurrence.interval)
         return self.repository.create(
             title=task_data.title, 
             user_id=user_id, 
-            deadline=task_data.deadline,
+            deadline=deadline,
             priority=task_data.priority,
-            category=task_data.category
+            category=task_data.category,
+            recurrence=recurrence,
+            workspace_id=workspace_id
         )
     
-    def get_task(self, task_id: int, user_id: int) -> Optional[Task]:
-        return self.repository.get_by_id(task_id, user_id)
+    def get_task(self, task_id: int, user_id: int, projection: Optional[TaskProjection] = None) -> Optional[Task]:
+        return self.repository.get_by_id(task_id, user_id, projection)
+    
+    def get_all_tasks(self, user_id: int, workspace_id: Optional[int] = None, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self.repository.get_all_by_user(user_id, workspace_id, projection)
+    
+    def get_visible_tasks(self, user_id: int, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self.repository.get_visible(user_id, projection)
+    
+    def get_due_tasks(self, user_id: int, start: datetime, end: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self.repository.get_due(user_id, _as_utc(start), _as_utc(end), limit, projection)
     
-    def get_all_tasks(self, user_id: int) -> List[Task]:
-        return self.repository.get_all_by_user(user_id)
+    def get_overdue_tasks(self, user_id: int, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self.repository.get_overdue(user_id, datetime.utcnow(), limit, projection)
     
     def update_task(self, task_id: int, user_id: int, task_data: TaskUpdate) -> Optional[Task]:
         return self.repository.update(
@@ -43,16 +71,129 @@ class TaskService:
         return self.repository.delete_completed(user_id)
     
     def update_task_positions(self, user_id: int, task_positions: List[tuple]) -> bool:
-        return self.repository.update_positions(user_id, task_positions)
+        if self.coalescer is None:
+            return self.repository.update_positions(user_id, task_positions)
+        # Positions are absolute, so a later drag simply overrides an earlier one per task.
+        return self.coalescer.submit(
+            self.repository, user_id, "positions", dict(task_positions),
+            merge=lambda pending, new: {**pending, **new},
+            apply=lambda repository, positions: repository.update_positions(user_id, list(positions.items())),
+        )
     
     def add_subtask(self, task_id: int, user_id: int, title: str) -> Optional[Subtask]:
         return self.repository.add_subtask(task_id, user_id, title)
     
     def toggle_subtask(self, subtask_id: int, task_id: int, user_id: int, completed: bool) -> Optional[Subtask]:
-        return self.repository.toggle_subtask(subtask_id, task_id, user_id, completed)
+        if self.coalescer is None:
+            return self.repository.toggle_subtask(subtask_id, task_id, user_id, completed)
+        return self.coalescer.submit(
+            self.repository, user_id, ("subtask", task_id, subtask_id), completed,
+            merge=lambda pending, new: new,
+            apply=lambda repository, value: repository.toggle_subtask(subtask_id, task_id, user_id, value),
+        )
     
     def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
         return self.repository.delete_subtask(subtask_id, task_id, user_id)
+    
+    def add_subtasks(self, task_id: int, user_id: int, titles: List[str]) -> Optional[List[Subtask]]:
+        return self.repository.add_subtasks(task_id, user_id, titles)
+    
+    def set_subtasks_completed(self, task_id: int, user_id: int, completed: bool) -> Optional[int]:
+        return self.repository.set_subtasks_completed(task_id, user_id, completed)
+    
+    def delete_completed_subtasks(self, task_id: int, user_id: int) -> Optional[int]:
+        return self.repository.delete_completed_subtasks(task_id, user_id)
+    
+    def get_archived_tasks(self, user_id: int, offset: int = 0, limit: int = 50) -> List[Task]:
+        return self.repository.get_archived(user_id, offset, limit)
+    
+    def restore_archived_task(self, task_id: int, user_id: int) -> Optional[Task]:
+        return self.repository.restore_archived(task_id, user_id)
+    
+    def get_categories(self, user_id: int) -> List[Category]:
+        return self.repository.get_categories(user_id)
+    
+    def create_category(self, user_id: int, name: str) -> Optional[Category]:
+        return self.repository.create_category(user_id, name)
+    
+    def delete_category(self, category_id: int, user_id: int) -> bool:
+        return self.repository.delete_category(category_id, user_id)
+    
+    def get_facets(self, user_id: int) -> TaskFacets:
+        return self.repository.get_facets(user_id)
+    
+    def export_tasks(self, user_id: int, fmt: str) -> Iterator[str]:
+        tasks = self.repository.iter_tasks(user_id, task_transfer.EXPORT_CHUNK_SIZE)
+        return task_transfer.export_csv(tasks) if fmt == "csv" else task_transfer.export_ndjson(tasks)
+    
+    def import_tasks(self, user_id: int, upload: BinaryIO, fmt: str) -> ImportSummary:
+        return task_transfer.import_tasks(upload, fmt, lambda batch: self.repository.import_tasks(user_id, batch), _as_utc)
+    
+    def apply_operations(self, user_id: int, operations: List[TaskOperation]) -> List[dict]:
+        results = []
+        with self.repository.transaction(user_id):
+            for index, operation in enumerate(operations):
+                result = self._apply_operation(user_id, operation)
+                if result is None:
+                    raise BatchOperationError(index, operation.op)
+                results.append(result)
+        return results
+    
+    def _apply_operation(self, user_id: int, operation: TaskOperation) -> Optional[dict]:
+        if operation.op == "create":
+            return {"op": operation.op, "task": self.create_task(operation, user_id)}
+        if operation.op == "update":
+            task = self.update_task(operation.task_id, user_id, operation)
+            return {"op": operation.op, "task": task} if task else None
+        if operation.op == "delete":
+            return {"op": operation.op, "deleted": True} if self.delete_task(operation.task_id, user_id) else None
+        if operation.op == "subtask_add":
+            subtask = self.add_subtask(operation.task_id, user_id, operation.title)
+            return {"op": operation.op, "subtask": subtask} if subtask else None
+        # Already one transaction; coalescing here could tie other requests' writes to its rollback.
+        if operation.op == "subtask_toggle":
+            subtask = self.repository.toggle_subtask(operation.subtask_id, operation.task_id, user_id, operation.completed)
+            return {"op": operation.op, "subtask": subtask} if subtask else None
+        if operation.op == "subtask_delete":
+            deleted = self.delete_subtask(operation.subtask_id, operation.task_id, user_id)
+            return {"op": operation.op, "deleted": True} if deleted else None
+        self.repository.update_positions(user_id, list(operation.positions.items()))
+        return {"op": operation.op}
+
+
+class WorkspaceService:
+    def __init__(self, repository: IWorkspaceRepository, user_repository: IUserRepository):
+        self.repository = repository
+        self.user_repository = user_repository
+    
+    def create_workspace(self, name: str, user_id: int) -> Workspace:
+        return self.repository.create(name, user_id)
+    
+    def get_workspaces(self, user_id: int) -> List[Workspace]:
+        return self.repository.get_for_user(user_id)
+    
+    def get_role(self, workspace_id: int, user_id: int) -> Optional[str]:
+        return self.repository.get_role(workspace_id, user_id)
+    
+    def get_members(self, workspace_id: int) -> List[WorkspaceMember]:
+        return self.repository.get_members(workspace_id)
+    
+    def set_member(self, workspace_id: int, username: str, role: str) -> Optional[WorkspaceMember]:
+        user = self.user_repository.get_by_username(username)
+        if user is None:
+            return None
+        self.repository.set_member(workspace_id, user.id, role)
+        return WorkspaceMember(user_id=user.id, username=user.username, role=role)
+    
+    def remove_member(self, workspace_id: int, user_id: int) -> bool:
+        return self.repository.remove_member(workspace_id, user_id)
+    
+    def is_last_owner(self, workspace_id: int, user_id: int) -> bool:
+        owners = [m.user_id for m in self.repository.get_members(workspace_id) if m.role == "owner"]
+        return owners == [user_id]
+    
+    def delete_workspace(self, workspace_id: int) -> bool:
+        return self.repository.delete(workspace_id)
 
 
 class AuthService:
@@ -71,6 +212,31 @@ class AuthService:
         hashed_password = get_password_hash(user_data.password)
         return self.user_repository.create(user_data.username, user_data.email, hashed_password)
     
+    def provision_users(self, users: List[UserCreate]) -> ProvisionResult:
+        result = ProvisionResult()
+        existing = self.user_repository.find_existing([u.username for u in users], [u.email for u in users])
+        taken_usernames = {user.username for user in existing}
+        taken_emails = {user.email for user in existing}
+        
+        pending = []
+        for user in users:
+            if user.username in taken_usernames or user.email in taken_emails:
+                result.skipped.append(SkippedUser(username=user.username, email=user.email, reason="already exists"))
+                continue
+            taken_usernames.add(user.username)
+            taken_emails.add(user.email)
+            pending.append(user)
+        
+        hashed = hash_passwords([user.password for user in pending])
+        created = self.user_repository.create_many([(u.username, u.email, h) for u, h in zip(pending, hashed)])
+        created_usernames = {user.username for user in created}
+        result.created = [UserResponse(id=user.id, username=user.username, email=user.email) for user in created]
+        result.skipped += [
+            SkippedUser(username=user.username, email=user.email, reason="registered concurrently")
+            for user in pending if user.username not in created_usernames
+        ]
+        return result
+    
     def authenticate_user(self, username: str, password: str) -> Optional[User]:
         user = self.user_repository.get_by_username(username)
         if not user:
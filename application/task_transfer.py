@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Tuple
+
+from pydantic import ValidationError
+
+from domain.models import Subtask, Task
+from .schemas import ImportRecordError, ImportSummary, TaskImport, TaskResponse
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+MAX_REPORTED_IMPORT_ERRORS = 20
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ["id", "title", "completed", "deadline", "priority", "category", "created_at", "completed_at", "position", "subtasks"]
+
+
+def export_ndjson(tasks: Iterable[Task]) -> Iterator[str]:
+    for task in tasks:
+        yield TaskResponse.model_validate(task, from_attributes=True).model_dump_json() + "\n"
+
+
+def export_csv(tasks: Iterable[Task]) -> Iterator[str]:
+    # Subtasks go into one JSON-encoded column so every task stays a single row.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for task in tasks:
+        data = TaskResponse.model_validate(task, from_attributes=True).model_dump(mode="json")
+        data["subtasks"] = json.dumps([{"title": s["title"], "completed": s["completed"]} for s in data["subtasks"]])
+        writer.writerow(["" if data[column] is None else data[column] for column in CSV_COLUMNS])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_records(text: io.TextIOBase) -> Iterator[Tuple[int, str]]:
+    for line_number, line in enumerate(text, start=1):
+        if line.strip():
+            yield line_number, line
+
+
+def _csv_records(text: io.TextIOBase) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _parse(fmt: str, raw) -> dict:
+    if fmt != "csv":
+        return json.loads(raw)
+    record = {key: value for key, value in raw.items() if key and value not in (None, "")}
+    if "subtasks" in record:
+        record["subtasks"] = json.loads(record["subtasks"])
+    return record
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        first = error.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        return f"{location}: {first['msg']}" if location else first["msg"]
+    return str(error)
+
+
+def _to_domain(record: TaskImport) -> Task:
+    return Task(
+        title=record.title,
+        completed=record.completed,
+        deadline=record.deadline,
+        priority=record.priority,
+        category=record.category,
+        completed_at=(record.completed_at or datetime.utcnow()) if record.completed else None,
+        subtasks=[Subtask(title=s.title, completed=s.completed) for s in record.subtasks],
+    )
+
+
+def import_tasks(
+    upload: BinaryIO,
+    fmt: str,
+    save_batch: Callable[[List[Task]], int],
+    normalize: Callable[[datetime], datetime],
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> ImportSummary:
+    # Reads the upload one record at a time and hands `save_batch` a full
+    # batch per transaction; invalid records are counted and skipped.
+    summary = ImportSummary()
+    batch: List[Task] = []
+
+    def fail(line_number: int, error: Exception):
+        summary.failed += 1
+        if len(summary.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            summary.errors.append(ImportRecordError(line=line_number, detail=_describe(error)))
+
+    def flush():
+        summary.imported += save_batch(batch)
+        summary.subtasks += sum(len(task.subtasks) for task in batch)
+        summary.batches += 1
+        batch.clear()
+
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    line_number = 0
+    try:
+        for line_number, raw in _csv_records(text) if fmt == "csv" else _ndjson_records(text):
+            try:
+                task = _to_domain(TaskImport.model_validate(_parse(fmt, raw)))
+            except ValueError as error:
+                fail(line_number, error)
+                continue
+            if task.deadline is not None:
+                task.deadline = normalize(task.deadline)
+            if task.completed_at is not None:
+                task.completed_at = normalize(task.completed_at)
+            batch.append(task)
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as error:
+        # The rest of the stream cannot be read reliably; keep what was parsed.
+        fail(line_number + 1, error)
+    if batch:
+        flush()
+    text.detach()
+    return summary
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from domain.interfaces import ITaskRepository
+from infrastructure.metrics import register_metrics
+
+# 0 turns coalescing off; a few milliseconds is enough to catch a drag-and-drop burst.
+WRITE_COALESCE_WINDOW_MS = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "0"))
+
+
+@dataclass
+class _Write:
+    value: Any
+    apply: Callable[[ITaskRepository, Any], Any]
+    result: Any = None
+
+
+@dataclass
+class _Batch:
+    writes: Dict[Hashable, _Write] = field(default_factory=dict)
+    done: threading.Event = field(default_factory=threading.Event)
+    started_at: float = 0.0
+    error: Optional[BaseException] = None
+
+
+class WriteCoalescer:
+    # Group commit for small, frequent writes. The first write a user sends
+    # opens a batch and waits out the window; writes from that user's other
+    # requests join it, and writes to the same key (the same rows) are merged
+    # so only the last value is written. The first request then applies the
+    # whole batch through its own repository in one transaction, and every
+    # caller gets the result for its key.
+    def __init__(self, window_ms: float = WRITE_COALESCE_WINDOW_MS):
+        self.window_ms = window_ms
+        self._open: Dict[int, _Batch] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.writes = 0
+        self.transactions = 0
+        self.failed_transactions = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    def submit(
+        self,
+        repository: ITaskRepository,
+        user_id: int,
+        key: Hashable,
+        value: Any,
+        merge: Callable[[Any, Any], Any],
+        apply: Callable[[ITaskRepository, Any], Any],
+    ) -> Any:
+        arrived = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            batch = self._open.get(user_id)
+            leader = batch is None
+            if leader:
+                batch = self._open[user_id] = _Batch()
+            write = batch.writes.get(key)
+            if write is None:
+                batch.writes[key] = _Write(value, apply)
+            else:
+                write.value = merge(write.value, value)
+
+        if leader:
+            time.sleep(self.window_ms / 1000)
+            with self._lock:
+                # Closed before writing: later arrivals start the next batch.
+                del self._open[user_id]
+                batch.started_at = time.perf_counter()
+            self._run(repository, user_id, batch)
+        else:
+            batch.done.wait()
+
+        self._record_wait((batch.started_at - arrived) * 1000)
+        if batch.error is not None:
+            raise batch.error
+        return batch.writes[key].result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window_ms,
+                "requests": self.requests,
+                "writes": self.writes,
+                "transactions": self.transactions,
+                "failed_transactions": self.failed_transactions,
+                "coalescing_ratio": round(self.requests / self.transactions, 3) if self.transactions else 0.0,
+                "added_latency_ms_avg": round(self.wait_ms_total / self.requests, 3) if self.requests else 0.0,
+                "added_latency_ms_max": round(self.wait_ms_max, 3),
+            }
+
+    def _run(self, repository: ITaskRepository, user_id: int, batch: _Batch):
+        try:
+            # The writes are separate requests, so they may commit apart.
+            with repository.transaction(user_id, allow_split=True):
+                for write in batch.writes.values():
+                    write.result = write.apply(repository, write.value)
+        except Exception as error:
+            # Everyone in the batch sees the failure, as they would have
+            # had their writes run one by one against the same database.
+            batch.error = error
+        finally:
+            with self._lock:
+                self.writes += len(batch.writes)
+                self.transactions += 1
+                if batch.error is not None:
+                    self.failed_transactions += 1
+            batch.done.set()
+
+    def _record_wait(self, wait_ms: float):
+        with self._lock:
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+
+write_coalescer = WriteCoalescer()
+register_metrics("write_coalescing", write_coalescer.stats)
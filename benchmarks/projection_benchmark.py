@@ -0,0 +1,62 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+VARIANTS = [
+    ("full", ""),
+    ("title,completed", "?fields=title,completed"),
+    ("+subtask_counts", "?fields=title,completed&include=subtask_counts"),
+    ("+subtasks", "?fields=title,completed&include=subtasks"),
+]
+
+
+def run(test_client, args):
+    with test_client as client:
+        client.post("/api/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench123"})
+        token = client.post("/api/auth/login", data={"username": "bench", "password": "bench123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(args.tasks):
+            task = client.post("/api/tasks/", json={"title": f"Task {i}", "category": "Bench"}, headers=headers).json()
+            if args.subtasks:
+                client.post(f"/api/tasks/{task['id']}/subtasks/bulk", json={"titles": [f"Step {j}" for j in range(args.subtasks)]}, headers=headers)
+
+        for name, query in VARIANTS:
+            size = len(client.get(f"/api/tasks/{query}", headers=headers).content)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                client.get(f"/api/tasks/{query}", headers=headers)
+            elapsed_ms = (time.perf_counter() - started) / args.repeat * 1000
+            print(f"{name:<18s} {size / 1024:9.1f} KiB  {elapsed_ms:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload size and latency of GET /api/tasks/ with and without sparse fieldsets")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--subtasks", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="projection-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/projection.db"
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    # Served from the database each time; the read model would hide the projection.
+    os.environ.setdefault("READ_MODEL_ENABLED", "0")
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    try:
+        run(TestClient(app), args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def storage_env(directory: str, shard_count: int) -> dict:
+    return {
+        "DATABASE_URL": f"sqlite:///{directory}/main.db",
+        "SHARD_COUNT": str(shard_count),
+        "SHARD_URL_TEMPLATE": f"sqlite:///{directory}/shard_{{}}.db",
+        "SQLITE_BUSY_TIMEOUT": "120",
+    }
+
+
+def writer(env: dict, worker: int, writes: int, barrier, results):
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from infrastructure.database import sharding_enabled
+    from infrastructure.repositories import ShardedTaskRepository, ShardedUserRepository, TaskRepository, UserRepository
+
+    user_repository = ShardedUserRepository() if sharding_enabled() else UserRepository()
+    user = user_repository.create(f"writer{worker}", f"writer{worker}@example.com", "x")
+    repository = ShardedTaskRepository() if sharding_enabled() else TaskRepository()
+    barrier.wait()
+    try:
+        for i in range(writes):
+            repository.create(f"Task {i}", user.id)
+    except Exception as error:
+        results.put(error)
+    else:
+        results.put(None)
+
+
+def run(shard_count: int, workers: int, writes: int) -> float:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        env = storage_env(directory, shard_count)
+        subprocess.run([sys.executable, "manage.py", "migrate"], cwd=ROOT, check=True,
+                       env={**os.environ, **env}, stdout=subprocess.DEVNULL)
+        barrier = context.Barrier(workers + 1)
+        results = context.Queue()
+        processes = [context.Process(target=writer, args=(env, worker, writes, barrier, results)) for worker in range(workers)]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        started = time.perf_counter()
+        errors = [error for error in (results.get() for _ in processes) if error is not None]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    if errors:
+        raise RuntimeError(f"{len(errors)} writers failed: {errors[0]}")
+    return workers * writes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task write throughput by shard count")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=100, help="task creations per worker")
+    args = parser.parse_args()
+
+    for shard_count in args.shards:
+        throughput = run(shard_count, args.workers, args.writes)
+        print(f"shards={shard_count:<3d} workers={args.workers:<3d} {throughput:10.1f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_once(database_url: str, workers: int, timeout: float) -> float:
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": database_url}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/auth/login", data=b"", timeout=1):
+                    pass
+            except urllib.error.HTTPError:
+                return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise TimeoutError("server did not answer in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from process start to first request served")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{directory}/startup.db"
+        subprocess.run([sys.executable, "manage.py", "migrate"], cwd=ROOT, check=True,
+                       env={**os.environ, "DATABASE_URL": database_url}, stdout=subprocess.DEVNULL)
+        timings = [measure_once(database_url, args.workers, args.timeout) for _ in range(args.runs)]
+
+    print(f"workers={args.workers} runs={args.runs}")
+    print(f"min    {min(timings) * 1000:8.1f} ms")
+    print(f"median {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"max    {max(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
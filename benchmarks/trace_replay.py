@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PARAMETER = re.compile(r"{(\w+)}")
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class Bucket:
+    # The replay's stand-in for every recorded user hashed into one bucket.
+    username: str
+    user_id: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+    tasks: List[int] = field(default_factory=list)
+    subtasks: Dict[int, List[int]] = field(default_factory=dict)
+    categories: List[int] = field(default_factory=list)
+    workspace_id: int = 0
+
+
+class Replay:
+    def __init__(self, client, entries: List[dict], seed: int, tasks: int, subtasks: int):
+        self.client = client
+        self.entries = entries
+        self.rng = random.Random(seed)
+        self.seed_tasks = tasks
+        self.seed_subtasks = subtasks
+        self.buckets: Dict[int, Bucket] = {}
+        self.registered = 0
+        self.results: List[list] = []
+        self.skipped = 0
+
+    async def seed(self):
+        for number in sorted({entry["u"] for entry in self.entries if entry.get("u") is not None} | {0}):
+            bucket = Bucket(username=f"replay-{number}")
+            response = await self.client.post("/api/auth/register", json={"username": bucket.username, "email": f"{bucket.username}@example.com", "password": "replay-password"})
+            bucket.user_id = response.json()["id"]
+            token = (await self.client.post("/api/auth/login", data={"username": bucket.username, "password": "replay-password"})).json()["access_token"]
+            bucket.headers = {"Authorization": f"Bearer {token}"}
+            for i in range(self.seed_tasks):
+                task = (await self.client.post("/api/tasks/", json={"title": f"Task {i}", "category": f"Category {i % 5}", "priority": self.rng.choice(["low", "medium", "high"])}, headers=bucket.headers)).json()
+                bucket.tasks.append(task["id"])
+                bucket.subtasks[task["id"]] = []
+                if self.seed_subtasks:
+                    created = await self.client.post(f"/api/tasks/{task['id']}/subtasks/bulk", json={"titles": [f"Step {j}" for j in range(self.seed_subtasks)]}, headers=bucket.headers)
+                    bucket.subtasks[task["id"]] = [subtask["id"] for subtask in created.json()]
+            bucket.categories = [category["id"] for category in (await self.client.get("/api/tasks/categories", headers=bucket.headers)).json()]
+            bucket.workspace_id = (await self.client.post("/api/workspaces/", json={"name": "Replay"}, headers=bucket.headers)).json()["id"]
+            self.buckets[number] = bucket
+
+    async def run(self, speed: float):
+        started = time.perf_counter()
+        first = self.entries[0]["t"] if self.entries else 0
+        pending = []
+        for entry in self.entries:
+            if speed <= 0:
+                await self.send(entry)
+                continue
+            delay = (entry["t"] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pending.append(asyncio.ensure_future(self.send(entry)))
+        await asyncio.gather(*pending)
+
+    async def send(self, entry: dict):
+        bucket = self.buckets[entry["u"] if entry.get("u") is not None else 0]
+        chosen: Dict[str, int] = {}
+        path = PARAMETER.sub(lambda match: str(self.resolve(match.group(1), bucket, chosen)), entry["r"])
+        request = {"params": {key: self.value(value, bucket, chosen) for key, value in entry.get("q", {}).items()}}
+        if entry["r"] == "/api/auth/login":
+            request["data"] = {"username": bucket.username, "password": "replay-password"}
+        elif entry["r"] == "/api/auth/register":
+            self.registered += 1
+            username = f"replay-new-{self.registered}"
+            request["json"] = {"username": username, "email": f"{username}@example.com", "password": "replay-password"}
+        elif "b" in entry:
+            request["json"] = self.value(entry["b"], bucket, chosen)
+        elif entry.get("n"):
+            # Uploads and bodies too large to shape cannot be rebuilt.
+            self.skipped += 1
+            return
+        if entry.get("u") is not None:
+            request["headers"] = bucket.headers
+
+        started = time.perf_counter()
+        response = await self.client.request(entry["m"], path, **request)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.results.append([entry["m"], entry["r"], response.status_code, round(elapsed_ms, 3)])
+        self.track(entry, response, bucket, chosen)
+
+    def resolve(self, name: str, bucket: Bucket, chosen: Dict[str, int]) -> int:
+        if name not in chosen:
+            if name in ("task_id", "id"):
+                chosen[name] = self.rng.choice(bucket.tasks) if bucket.tasks else 0
+            elif name == "subtask_id":
+                subtasks = bucket.subtasks.get(self.resolve("task_id", bucket, chosen), [])
+                chosen[name] = self.rng.choice(subtasks) if subtasks else 0
+            elif name == "category_id":
+                chosen[name] = self.rng.choice(bucket.categories) if bucket.categories else 0
+            elif name == "workspace_id":
+                chosen[name] = bucket.workspace_id
+            elif name == "user_id":
+                chosen[name] = bucket.user_id
+            else:
+                chosen[name] = 0
+        return chosen[name]
+
+    def value(self, shape, bucket: Bucket, chosen: Dict[str, int]):
+        if isinstance(shape, dict):
+            numbered = [key for key in shape if key.startswith("#")]
+            positions = self.rng.sample(bucket.tasks, min(len(bucket.tasks), len(numbered))) if numbered else []
+            return {
+                (str(positions.pop()) if key.startswith("#") and positions else key): self.value(value, bucket, chosen)
+                for key, value in shape.items()
+            }
+        if isinstance(shape, list):
+            return [self.value(item, bucket, chosen) for item in shape]
+        if not isinstance(shape, str) or len(shape) < 2:
+            return shape
+        if shape[0] == "#":
+            return self.resolve(shape[1:], bucket, chosen)
+        if shape[0] == "@" and re.fullmatch(r"@-?\d+", shape):
+            return (datetime.utcnow() + timedelta(seconds=int(shape[1:]))).isoformat()
+        if shape[0] == "~" and shape[1:].isdigit():
+            return "x" * max(int(shape[1:]), 1)
+        return shape
+
+    def track(self, entry: dict, response, bucket: Bucket, chosen: Dict[str, int]):
+        # Follows creates and deletes, so later requests aim at rows that exist.
+        if response.status_code >= 300:
+            return
+        route = entry["r"]
+        if entry["m"] == "POST" and route == "/api/tasks/":
+            task_id = response.json()["id"]
+            bucket.tasks.append(task_id)
+            bucket.subtasks[task_id] = []
+        elif entry["m"] == "DELETE" and route == "/api/tasks/{task_id}" and chosen.get("task_id") in bucket.tasks:
+            bucket.tasks.remove(chosen["task_id"])
+        elif entry["m"] == "POST" and route == "/api/tasks/{task_id}/subtasks":
+            bucket.subtasks.setdefault(chosen["task_id"], []).append(response.json()["id"])
+        elif entry["m"] == "DELETE" and route == "/api/tasks/{task_id}/subtasks/{subtask_id}":
+            subtasks = bucket.subtasks.get(chosen["task_id"], [])
+            if chosen["subtask_id"] in subtasks:
+                subtasks.remove(chosen["subtask_id"])
+
+
+async def replay(args, entries: List[dict]) -> dict:
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+            runner = Replay(client, entries, args.seed, args.tasks, args.subtasks)
+            await runner.seed()
+            started = time.perf_counter()
+            await runner.run(args.speed)
+            wall_seconds = time.perf_counter() - started
+    return {
+        "trace": os.path.abspath(args.trace),
+        "speed": args.speed,
+        "seed": args.seed,
+        "wall_seconds": round(wall_seconds, 3),
+        "skipped": runner.skipped,
+        "requests": runner.results,
+    }
+
+
+def run(args):
+    from infrastructure.tracing import read_trace
+
+    entries = read_trace(args.trace)
+    directory = tempfile.mkdtemp(prefix="trace-replay-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/replay.db"
+    os.environ["SHARED_CACHE_PATH"] = f"{directory}/shared_cache.db"
+    os.environ["TRACE_PATH"] = ""
+    os.environ["AUTO_MIGRATE"] = "1"
+    for name, value in (("RATE_LIMIT_ENABLED", "0"), ("PASSWORD_HASH_ROUNDS", "4"), ("ARCHIVE_INTERVAL_SECONDS", "0"), ("MAINTENANCE_INTERVAL_SECONDS", "0")):
+        os.environ.setdefault(name, value)
+    try:
+        result = asyncio.run(replay(args, entries))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    with open(args.output, "w", encoding="utf-8") as target:
+        json.dump(result, target)
+    errors = sum(1 for _, _, status, _ in result["requests"] if status >= 500)
+    print(f"Replayed {len(result['requests'])} requests in {result['wall_seconds']:.2f} s "
+          f"({result['skipped']} skipped, {errors} server errors) -> {args.output}")
+
+
+def _percentile(values: List[float], percentile: int) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+def _latencies(path: str) -> Dict[str, List[float]]:
+    with open(path, encoding="utf-8") as source:
+        requests = json.load(source)["requests"]
+    grouped: Dict[str, List[float]] = defaultdict(list)
+    for method, route, _, elapsed_ms in requests:
+        grouped[f"{method} {route}"].append(elapsed_ms)
+        grouped["(all)"].append(elapsed_ms)
+    return grouped
+
+
+def compare(args):
+    before, after = _latencies(args.before), _latencies(args.after)
+    header = "".join(f"  p{p} before -> after" for p in PERCENTILES)
+    print(f"{'route':<48s} {'count':>6s}{header}")
+    for name in sorted(set(before) | set(after), key=lambda name: (name != "(all)", name)):
+        if name not in before or name not in after:
+            print(f"{name:<48s} only in {'after' if name in after else 'before'}")
+            continue
+        cells = []
+        for p in PERCENTILES:
+            old, new = _percentile(before[name], p), _percentile(after[name], p)
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"  {old:7.2f} -> {new:7.2f} ms ({change:+5.1f}%)")
+        print(f"{name:<48s} {len(after[name]):>6d}{''.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded request trace against a fresh app and compare latency between builds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay TRACE_PATH output against a freshly seeded database")
+    run_parser.add_argument("trace", help="trace file written with TRACE_PATH")
+    run_parser.add_argument("--output", required=True, help="where to write the per-request latencies (JSON)")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="time scale: 1 keeps the recorded pacing, 2 replays twice as fast, 0 sends requests back to back")
+    run_parser.add_argument("--seed", type=int, default=1, help="seed for the data set and id choices")
+    run_parser.add_argument("--tasks", type=int, default=50, help="tasks seeded per user bucket")
+    run_parser.add_argument("--subtasks", type=int, default=3, help="subtasks seeded per task")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare latency percentiles of two replay results")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
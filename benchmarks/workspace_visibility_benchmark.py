@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(directory: str, workspaces: int, tasks_per_workspace: int, personal_tasks: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from infrastructure.migrations import upgrade
+    from infrastructure.repositories import TaskRepository, WorkspaceRepository
+
+    engine = create_engine(f"sqlite:///{directory}/workspaces.db")
+    upgrade(engine)
+    session = sessionmaker(bind=engine)()
+    tasks, workspace_repository = TaskRepository(session), WorkspaceRepository(session)
+    # User 1 belongs to every workspace; user 2 owns them all, so the
+    # membership index is the only thing separating the two.
+    for _ in range(personal_tasks):
+        tasks.create("Personal", 1)
+    shared = []
+    for i in range(workspaces):
+        workspace = workspace_repository.create(f"Workspace {i}", 2)
+        workspace_repository.set_member(workspace.id, 1, "editor")
+        shared.extend(tasks.create(f"Shared {j}", 2, workspace_id=workspace.id).id for j in range(tasks_per_workspace))
+    return tasks, shared
+
+
+def timed(operation, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visible-task listing and authorized update latency by workspace count")
+    parser.add_argument("--workspaces", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--tasks-per-workspace", type=int, default=20)
+    parser.add_argument("--personal-tasks", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for count in args.workspaces:
+        with tempfile.TemporaryDirectory() as directory:
+            tasks, shared = seed(directory, count, args.tasks_per_workspace, args.personal_tasks)
+            visible = len(tasks.get_visible(1))
+            list_ms = timed(lambda: tasks.get_visible(1), args.repeat)
+            update_ms = timed(lambda: tasks.update(shared[-1], 1, title="Renamed"), args.repeat)
+            tasks.db.close()
+        print(f"workspaces={count:<5d} visible={visible:<7d} list {list_ms:8.2f} ms  update {update_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
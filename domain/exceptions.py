@@ -5,3 +5,15 @@ class TaskNotFoundError(Exception):
 
     def TaskValidationError(Exception):
         pass
+
+
+class BatchOperationError(Exception):
+    def __init__(self, index: int, op: str):
+        self.index = index
+        self.op = op
+        super().__init__(f"Operation {index} ({op}) failed: target not found")
+
+
+class SplitTransactionError(Exception):
+    def __init__(self):
+        super().__init__("Personal and workspace tasks are stored apart and cannot be changed in one batch")
@@ -1,19 +1,31 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import ContextManager, Iterator, List, Optional, Tuple
 from datetime import datetime
-from .models import Task, User, Subtask
+from .models import Category, Recurrence, Task, TaskFacets, TaskProjection, User, Subtask, Workspace, WorkspaceMember
 
 class ITaskRepository(ABC):
     @abstractmethod
-    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None) -> Task:
+    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None, recurrence: Optional[Recurrence] = None, workspace_id: Optional[int] = None) -> Optional[Task]:
         pass
     
     @abstractmethod
-    def get_by_id(self, task_id: int, user_id: int) -> Optional[Task]:
+    def get_by_id(self, task_id: int, user_id: int, projection: Optional[TaskProjection] = None) -> Optional[Task]:
         pass
     
     @abstractmethod
-    def get_all_by_user(self, user_id: int) -> List[Task]:
+    def get_all_by_user(self, user_id: int, workspace_id: Optional[int] = None, projection: Optional[TaskProjection] = None) -> List[Task]:
+        pass
+    
+    @abstractmethod
+    def get_visible(self, user_id: int, projection: Optional[TaskProjection] = None) -> List[Task]:
+        pass
+    
+    @abstractmethod
+    def get_due(self, user_id: int, start: datetime, end: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        pass
+    
+    @abstractmethod
+    def get_overdue(self, user_id: int, now: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
         pass
     
     @abstractmethod
@@ -43,6 +55,57 @@ class ITaskRepository(ABC):
     @abstractmethod
     def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
         pass
+    
+    @abstractmethod
+    def add_subtasks(self, task_id: int, user_id: int, titles: List[str]) -> Optional[List[Subtask]]:
+        pass
+    
+    @abstractmethod
+    def set_subtasks_completed(self, task_id: int, user_id: int, completed: bool) -> Optional[int]:
+        pass
+    
+    @abstractmethod
+    def delete_completed_subtasks(self, task_id: int, user_id: int) -> Optional[int]:
+        pass
+    
+    @abstractmethod
+    def iter_tasks(self, user_id: int, chunk_size: int = 500) -> Iterator[Task]:
+        pass
+    
+    @abstractmethod
+    def import_tasks(self, user_id: int, tasks: List[Task]) -> int:
+        pass
+    
+    @abstractmethod
+    def get_archived(self, user_id: int, offset: int = 0, limit: int = 50) -> List[Task]:
+        pass
+    
+    @abstractmethod
+    def restore_archived(self, task_id: int, user_id: int) -> Optional[Task]:
+        pass
+    
+    @abstractmethod
+    def get_categories(self, user_id: int) -> List[Category]:
+        pass
+    
+    @abstractmethod
+    def create_category(self, user_id: int, name: str) -> Optional[Category]:
+        pass
+    
+    @abstractmethod
+    def delete_category(self, category_id: int, user_id: int) -> bool:
+        pass
+    
+    @abstractmethod
+    def get_facets(self, user_id: int) -> TaskFacets:
+        pass
+    
+    @abstractmethod
+    def transaction(self, user_id: int, allow_split: bool = False) -> ContextManager[None]:
+        pass
+    
+    def close(self) -> None:
+        pass
 
 class IUserRepository(ABC):
     @abstractmethod
@@ -60,3 +123,46 @@ class IUserRepository(ABC):
     @abstractmethod
     def get_by_id(self, user_id: int) -> Optional[User]:
         pass
+    
+    @abstractmethod
+    def find_existing(self, usernames: List[str], emails: List[str]) -> List[User]:
+        pass
+    
+    @abstractmethod
+    def create_many(self, users: List[Tuple[str, str, str]]) -> List[User]:
+        pass
+    
+    def close(self) -> None:
+        pass
+
+class IWorkspaceRepository(ABC):
+    @abstractmethod
+    def create(self, name: str, owner_id: int) -> Workspace:
+        pass
+    
+    @abstractmethod
+    def get_for_user(self, user_id: int) -> List[Workspace]:
+        pass
+    
+    @abstractmethod
+    def get_role(self, workspace_id: int, user_id: int) -> Optional[str]:
+        pass
+    
+    @abstractmethod
+    def get_members(self, workspace_id: int) -> List[WorkspaceMember]:
+        pass
+    
+    @abstractmethod
+    def set_member(self, workspace_id: int, user_id: int, role: str) -> None:
+        pass
+    
+    @abstractmethod
+    def remove_member(self, workspace_id: int, user_id: int) -> bool:
+        pass
+    
+    @abstractmethod
+    def delete(self, workspace_id: int) -> bool:
+        pass
+    
+    def close(self) -> None:
+        pass
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 from datetime import datetime
 
 @dataclass
@@ -9,6 +9,12 @@ class Subtask:
     completed: bool = False
     task_id: Optional[int] = None
 
+@dataclass
+class Recurrence:
+    frequency: str = "daily"
+    interval: int = 1
+    start: Optional[datetime] = None
+
 @dataclass
 class Task:
     id: Optional[int] = None
@@ -21,6 +27,48 @@ class Task:
     created_at: Optional[datetime] = None
     position: int = 0
     subtasks: List[Subtask] = field(default_factory=list)
+    completed_at: Optional[datetime] = None
+    archived_at: Optional[datetime] = None
+    recurrence: Optional[Recurrence] = None
+    series_id: Optional[int] = None
+    occurrence: int = 0
+    workspace_id: Optional[int] = None
+    subtask_total: int = 0
+    subtask_completed: int = 0
+
+@dataclass(frozen=True)
+class TaskProjection:
+    # Which task fields a read needs; everything else is left at its default.
+    fields: Tuple[str, ...] = ("id",)
+    subtasks: bool = False
+    subtask_counts: bool = False
+
+@dataclass
+class Category:
+    id: Optional[int] = None
+    name: str = ""
+    task_count: int = 0
+
+@dataclass
+class TaskFacets:
+    categories: List[Category] = field(default_factory=list)
+    uncategorized: int = 0
+    priorities: Dict[str, int] = field(default_factory=dict)
+    completed: int = 0
+    open: int = 0
+
+@dataclass
+class Workspace:
+    id: Optional[int] = None
+    name: str = ""
+    role: str = "owner"
+    created_at: Optional[datetime] = None
+
+@dataclass
+class WorkspaceMember:
+    user_id: Optional[int] = None
+    username: str = ""
+    role: str = "viewer"
 
 @dataclass
 class User:
@@ -0,0 +1,69 @@
+import calendar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .models import Recurrence, Task
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# Series repeat every `interval` days, weeks or months.
+STEP_DAYS = {"daily": 1, "weekly": 7}
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_at(rule: Recurrence, index: int) -> datetime:
+    # Always counted from the series start, so month-end dates do not drift.
+    if rule.frequency == "monthly":
+        return _add_months(rule.start, index * rule.interval)
+    return rule.start + timedelta(days=STEP_DAYS[rule.frequency] * rule.interval * index)
+
+
+def first_index_from(rule: Recurrence, when: datetime) -> int:
+    # Index of the first occurrence at or after `when`.
+    if when <= rule.start:
+        return 0
+    if rule.frequency == "monthly":
+        months = (when.year - rule.start.year) * 12 + when.month - rule.start.month
+        index = max(months // rule.interval, 0)
+    else:
+        index = (when - rule.start) // timedelta(days=STEP_DAYS[rule.frequency] * rule.interval)
+    while occurrence_at(rule, index) < when:
+        index += 1
+    return index
+
+
+def pending_occurrences(
+    tasks: List[Task],
+    now: datetime,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+) -> List[Tuple[Task, int, datetime]]:
+    # Occurrences that have to exist before `tasks` can be shown: the next one
+    # of every series whose materialized occurrences are all completed, plus,
+    # for a deadline window, those due in [start, end). Missed periods are
+    # skipped rather than filled in. Returns (latest occurrence, index, due).
+    series: Dict[int, List[Task]] = {}
+    for task in tasks:
+        if task.recurrence is not None and task.series_id is not None:
+            series.setdefault(task.series_id, []).append(task)
+    
+    pending = []
+    for occurrences in series.values():
+        latest = max(occurrences, key=lambda t: t.occurrence)
+        rule = latest.recurrence
+        indexes = []
+        if all(t.completed for t in occurrences):
+            indexes.append(max(latest.occurrence + 1, first_index_from(rule, now)))
+        if start is not None:
+            index = max([latest.occurrence + 1, first_index_from(rule, start)] + [i + 1 for i in indexes])
+            while len(indexes) < limit and occurrence_at(rule, index) < end:
+                indexes.append(index)
+                index += 1
+        pending += [(latest, index, occurrence_at(rule, index)) for index in indexes]
+    return pending
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .database import storage_engines
+from .metrics import register_metrics
+from .orm_models import ArchivedSubtaskModel, ArchivedTaskModel, SubtaskModel, TaskModel
+from .scheduling import PeriodicJob
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> List[int]:
+    # Moves up to `batch_size` tasks completed before `cutoff` in one
+    # transaction and returns the owners of the selected tasks, one entry per
+    # task. OR IGNORE lets two workers race on the same batch without failing.
+    # Recurring series are skipped: they already keep a single completed
+    # occurrence, which the next one is scheduled from. Workspace tasks stay
+    # too: the archive is a personal list, read and restored by the owner only.
+    rows = db.execute(
+        select(TaskModel.id, TaskModel.user_id)
+        .where(TaskModel.completed_at < cutoff, TaskModel.completed == True, TaskModel.series_id.is_(None), TaskModel.workspace_id.is_(None))
+        .order_by(TaskModel.completed_at)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return []
+
+    tasks = TaskModel.__table__.c
+    subtasks = SubtaskModel.__table__.c
+    # Re-checked in every statement: a task reopened after the select above
+    # must stay put. The first INSERT takes the write lock, so the rest agree.
+    eligible = select(tasks.id).where(tasks.id.in_([row.id for row in rows]), tasks.completed_at < cutoff, tasks.completed == True, tasks.series_id.is_(None), tasks.workspace_id.is_(None))
+    db.execute(
+        insert(ArchivedTaskModel.__table__).prefix_with("OR IGNORE").from_select(
+            [c.key for c in tasks] + ["archived_at"],
+            select(*tasks, literal(datetime.utcnow(), DateTime)).where(tasks.id.in_(eligible)),
+        )
+    )
+    db.execute(
+        insert(ArchivedSubtaskModel.__table__).prefix_with("OR IGNORE").from_select(
+            [c.key for c in subtasks],
+            select(*subtasks).where(subtasks.task_id.in_(eligible)),
+        )
+    )
+    db.execute(delete(SubtaskModel.__table__).where(subtasks.task_id.in_(eligible)))
+    db.execute(delete(TaskModel.__table__).where(tasks.id.in_(eligible)))
+    db.commit()
+    return [row.user_id for row in rows]
+
+
+class ArchiveWorker(PeriodicJob):
+    name = "archive-worker"
+
+    def __init__(self, after_days: float = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, interval_seconds: float = ARCHIVE_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.tasks_archived = 0
+        self._listeners: List[Callable[[int], None]] = []
+
+    def add_listener(self, listener: Callable[[int], None]):
+        # Called with each user id whose tasks were moved, e.g. to drop cached lists.
+        self._listeners.append(listener)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "after_days": self.after_days,
+            "batch_size": self.batch_size,
+            "tasks_archived": self.tasks_archived,
+        }
+
+    def _run(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        archived = 0
+        for engine in storage_engines():
+            with Session(bind=engine) as db:
+                while not self._stop.is_set():
+                    owners = archive_batch(db, cutoff, self.batch_size)
+                    archived += len(owners)
+                    for user_id in set(owners):
+                        for listener in self._listeners:
+                            listener(user_id)
+                    if len(owners) < self.batch_size:
+                        break
+        self.tasks_archived += archived
+        return archived
+
+
+archive_worker = ArchiveWorker()
+register_metrics("archive", archive_worker.stats)
@@ -1,14 +1,62 @@
 import os
+from typing import Dict, List
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/todolist_database.db")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///./data/todolist_shard_{}.db")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+def make_engine(url: str) -> Engine:
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+        connect_args["timeout"] = SQLITE_BUSY_TIMEOUT
+        if make_url(url).database in (None, "", ":memory:"):
+            # An in-memory database belongs to one connection, so every
+            # session and thread has to share it to see the same data.
+            return create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    return create_engine(url, connect_args=connect_args)
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
+
+
+def sharding_enabled() -> bool:
+    return SHARD_COUNT > 1
+
+
+class ShardSessionFactory:
+    def __init__(self, url_template: str = SHARD_URL_TEMPLATE):
+        self.url_template = url_template
+        self._engines: Dict[int, Engine] = {}
+        self._sessionmakers: Dict[int, sessionmaker] = {}
+
+    def engine(self, shard: int) -> Engine:
+        if shard not in self._engines:
+            self._engines[shard] = make_engine(self.url_template.format(shard))
+            self._sessionmakers[shard] = sessionmaker(bind=self._engines[shard], autocommit=False, autoflush=False)
+        return self._engines[shard]
+
+    def session(self, shard: int) -> Session:
+        self.engine(shard)
+        return self._sessionmakers[shard]()
+
+    def engines(self, shard_count: int = SHARD_COUNT) -> List[Engine]:
+        return [self.engine(shard) for shard in range(shard_count)]
+
+
+shard_sessions = ShardSessionFactory()
+
+
+def storage_engines() -> List[Engine]:
+    if sharding_enabled():
+        return [engine] + shard_sessions.engines()
+    return [engine]
@@ -0,0 +1,162 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy.engine import Connection, Engine
+
+from .database import storage_engines
+from .metrics import register_metrics
+from .scheduling import PeriodicJob
+
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "900"))
+MAINTENANCE_QUIET_SECONDS = float(os.getenv("MAINTENANCE_QUIET_SECONDS", "30"))
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "2000"))
+MAINTENANCE_WAL_TRUNCATE_MB = float(os.getenv("MAINTENANCE_WAL_TRUNCATE_MB", "64"))
+MAINTENANCE_INTEGRITY_HOURS = float(os.getenv("MAINTENANCE_INTEGRITY_HOURS", "24"))
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _pragma(connection: Connection, statement: str):
+    return connection.exec_driver_sql(f"PRAGMA {statement}").scalar()
+
+
+def _file_size(path: Optional[str]) -> int:
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def maintain_database(
+    engine: Engine,
+    analyze: bool = False,
+    vacuum_pages: int = MAINTENANCE_VACUUM_PAGES,
+    wal_truncate_bytes: int = int(MAINTENANCE_WAL_TRUNCATE_MB * 1024 * 1024),
+    integrity: Optional[str] = None,
+) -> dict:
+    # One maintenance pass over a single SQLite file. `integrity` is None,
+    # "quick" or "full"; a full check reads every page and can take a while.
+    started = time.perf_counter()
+    path = engine.url.database if engine.url.database not in (None, "", ":memory:") else None
+    report: dict = {"database": path or str(engine.url)}
+    with engine.connect() as connection:
+        page_size = _pragma(connection, "page_size")
+        pages_before = _pragma(connection, "page_count")
+
+        if analyze or connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first() is None:
+            connection.exec_driver_sql("ANALYZE")
+            report["analyze"] = "full"
+        else:
+            connection.exec_driver_sql("PRAGMA optimize")
+            report["analyze"] = "optimize"
+
+        report["freelist_pages"] = _pragma(connection, "freelist_count")
+        if _pragma(connection, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL and report["freelist_pages"]:
+            # Each step of this pragma frees one page; only executescript steps it to completion.
+            connection.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+            report["freelist_pages"] = _pragma(connection, "freelist_count")
+            report["vacuum"] = "incremental"
+        else:
+            report["vacuum"] = None
+
+        report["journal_mode"] = _pragma(connection, "journal_mode")
+        if report["journal_mode"] == "wal":
+            wal_path = f"{path}-wal" if path else None
+            report["wal_bytes_before"] = _file_size(wal_path)
+            mode = "TRUNCATE" if report["wal_bytes_before"] >= wal_truncate_bytes else "PASSIVE"
+            busy, log_frames, checkpointed = connection.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+            report["checkpoint"] = {"mode": mode.lower(), "busy": bool(busy), "log_frames": log_frames, "checkpointed_frames": checkpointed}
+            report["wal_bytes_after"] = _file_size(wal_path)
+
+        if integrity is not None:
+            pragma = "quick_check" if integrity == "quick" else "integrity_check"
+            problems = [row[0] for row in connection.exec_driver_sql(f"PRAGMA {pragma}")]
+            report["integrity"] = "ok" if problems == ["ok"] else problems
+
+        connection.commit()
+        report["reclaimed_bytes"] = max(pages_before - _pragma(connection, "page_count"), 0) * page_size
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return report
+
+
+def enable_incremental_vacuum(engine: Engine) -> int:
+    # auto_vacuum only changes after a full VACUUM, which rewrites the whole
+    # file and locks it meanwhile; returns the bytes reclaimed by that rewrite.
+    with engine.connect() as connection:
+        size_before = _pragma(connection, "page_count") * _pragma(connection, "page_size")
+        connection.exec_driver_sql(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        connection.exec_driver_sql("VACUUM")
+        return max(size_before - _pragma(connection, "page_count") * _pragma(connection, "page_size"), 0)
+
+
+# Only rows whose counters disagree with their subtasks are written.
+REPAIR_SUBTASK_COUNTS = """
+UPDATE {tasks} SET subtask_total = counts.total, subtask_completed = counts.done
+FROM (
+    SELECT t.id AS id, COUNT(s.id) AS total, COUNT(CASE WHEN s.completed THEN 1 END) AS done
+    FROM {tasks} AS t LEFT JOIN {subtasks} AS s ON s.task_id = t.id
+    GROUP BY t.id
+) AS counts
+WHERE counts.id = {tasks}.id AND ({tasks}.subtask_total != counts.total OR {tasks}.subtask_completed != counts.done)
+"""
+
+
+def repair_subtask_counts(engine: Engine) -> dict:
+    # The triggers keep the counters right from migration 9 on; this puts
+    # them back after subtasks were changed with the triggers missing, for
+    # example in a file restored from an older backup and edited by hand.
+    path = engine.url.database if engine.url.database not in (None, "", ":memory:") else None
+    report: dict = {"database": path or str(engine.url)}
+    with engine.begin() as connection:
+        for tasks, subtasks in (("tasks", "subtasks"), ("archived_tasks", "archived_subtasks")):
+            report[tasks] = connection.exec_driver_sql(REPAIR_SUBTASK_COUNTS.format(tasks=tasks, subtasks=subtasks)).rowcount
+    return report
+
+
+class MaintenanceWorker(PeriodicJob):
+    name = "maintenance-worker"
+
+    def __init__(self, interval_seconds: float = MAINTENANCE_INTERVAL_SECONDS, quiet_seconds: float = MAINTENANCE_QUIET_SECONDS, integrity_hours: float = MAINTENANCE_INTEGRITY_HOURS):
+        super().__init__(interval_seconds)
+        self.quiet_seconds = quiet_seconds
+        self.integrity_hours = integrity_hours
+        # Seconds since the process last served a request; wired up by the app.
+        self.idle_seconds: Callable[[], float] = lambda: float("inf")
+        self.reclaimed_bytes = 0
+        self.last_integrity_check_at: Optional[datetime] = None
+        self.last_reports: List[dict] = []
+
+    def should_run(self) -> bool:
+        return self.idle_seconds() >= self.quiet_seconds
+
+    def retry_seconds(self) -> float:
+        return max(min(self.quiet_seconds, self.interval_seconds), 1)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "quiet_seconds": self.quiet_seconds,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "last_integrity_check_at": self.last_integrity_check_at.isoformat() if self.last_integrity_check_at else None,
+            "databases": self.last_reports,
+        }
+
+    def _run(self, analyze: bool = False, integrity: Optional[str] = None) -> List[dict]:
+        if integrity is None and self._integrity_due():
+            integrity = "quick"
+        reports = [maintain_database(engine, analyze=analyze, integrity=integrity) for engine in storage_engines()]
+        if integrity is not None:
+            self.last_integrity_check_at = datetime.utcnow()
+        self.reclaimed_bytes += sum(report["reclaimed_bytes"] for report in reports)
+        self.last_reports = reports
+        return reports
+
+    def _integrity_due(self) -> bool:
+        if self.integrity_hours <= 0:
+            return False
+        if self.last_integrity_check_at is None:
+            return True
+        return datetime.utcnow() - self.last_integrity_check_at >= timedelta(hours=self.integrity_hours)
+
+
+maintenance_worker = MaintenanceWorker()
+register_metrics("maintenance", maintenance_worker.stats)
@@ -0,0 +1,196 @@
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import Counter, deque
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .metrics import register_metrics
+from .scheduling import PeriodicJob
+
+MEMORY_SAMPLE_INTERVAL_SECONDS = float(os.getenv("MEMORY_SAMPLE_INTERVAL_SECONDS", "0"))
+MEMORY_SAMPLE_HISTORY = int(os.getenv("MEMORY_SAMPLE_HISTORY", "1440"))
+# Also appended here as JSON lines, one per sample and worker; empty keeps them in memory only.
+MEMORY_SERIES_PATH = os.getenv("MEMORY_SERIES_PATH", "")
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_TOP_SITES = 20
+MEMORY_TOP_TYPES = 15
+
+# Sessions that have started a transaction and not been garbage collected
+# yet, with the time they were first seen.
+_live_sessions: "weakref.WeakKeyDictionary[Session, float]" = weakref.WeakKeyDictionary()
+_sessions_lock = threading.Lock()
+
+
+def _track_session(session: Session, transaction):
+    with _sessions_lock:
+        _live_sessions.setdefault(session, time.time())
+
+
+def install_session_tracking():
+    if not event.contains(Session, "after_transaction_create", _track_session):
+        event.listen(Session, "after_transaction_create", _track_session)
+
+
+def session_report(top: int = 5) -> dict:
+    now = time.time()
+    with _sessions_lock:
+        sessions = list(_live_sessions.items())
+    # Only sizes are read: the sessions may be in use on other threads.
+    sized = sorted(((len(session.identity_map), session, seen) for session, seen in sessions), key=lambda item: item[0], reverse=True)
+    return {
+        "live": len(sized),
+        "in_transaction": sum(1 for _, session, _ in sized if session.in_transaction()),
+        "identity_map_objects": sum(size for size, _, _ in sized),
+        "largest": [
+            {
+                "identity_map_objects": size,
+                "in_transaction": session.in_transaction(),
+                "age_seconds": round(now - seen, 1),
+                "database": str(session.bind.engine.url) if session.bind is not None else None,
+            }
+            for size, session, seen in sized[:top]
+        ],
+    }
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Without /proc only the peak is available.
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_report() -> dict:
+    objects = gc.get_objects()
+    top_types = Counter(type(obj).__name__ for obj in objects).most_common(MEMORY_TOP_TYPES)
+    report = {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "gc_objects": len(objects),
+        "gc_counts": list(gc.get_count()),
+        "top_types": [{"type": name, "count": count} for name, count in top_types],
+        "sessions": session_report(),
+        "tracemalloc": allocation_tracker.stats(),
+    }
+    del objects
+    return report
+
+
+def _frames(traceback: tracemalloc.Traceback) -> List[str]:
+    # Most recent call first, so the allocating line leads.
+    return [f"{frame.filename}:{frame.lineno}" for frame in reversed(traceback)]
+
+
+class AllocationTracker:
+    # tracemalloc slows every allocation down and holds a record of each
+    # live block, so it only runs from the first snapshot until stop().
+    # Each snapshot is diffed against the previous one from this worker.
+    def __init__(self, frames: int = MEMORY_TRACE_FRAMES):
+        self.frames = frames
+        self.snapshots = 0
+        self.started_at: Optional[datetime] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, top: int = MEMORY_TOP_SITES) -> dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self.started_at = datetime.utcnow()
+                self._previous = None
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ))
+            previous, self._previous = self._previous, snapshot
+            self.snapshots += 1
+        traced, peak = tracemalloc.get_traced_memory()
+        report = {
+            "pid": os.getpid(),
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "top_sites": [
+                {"size_bytes": stat.size, "blocks": stat.count, "traceback": _frames(stat.traceback)}
+                for stat in snapshot.statistics("traceback")[:top]
+            ],
+        }
+        if previous is not None:
+            report["growth"] = [
+                {"size_diff_bytes": stat.size_diff, "blocks_diff": stat.count_diff, "size_bytes": stat.size, "traceback": _frames(stat.traceback)}
+                for stat in snapshot.compare_to(previous, "traceback")[:top]
+            ]
+        return report
+
+    def stop(self):
+        with self._lock:
+            self._previous = None
+            self.started_at = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def stats(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        return {
+            "tracing": tracing,
+            "frames": self.frames,
+            "snapshots": self.snapshots,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracing else 0,
+        }
+
+
+class MemorySampler(PeriodicJob):
+    name = "memory-sampler"
+
+    def __init__(self, interval_seconds: float = MEMORY_SAMPLE_INTERVAL_SECONDS, history: int = MEMORY_SAMPLE_HISTORY, series_path: str = MEMORY_SERIES_PATH):
+        super().__init__(interval_seconds)
+        self.samples: deque = deque(maxlen=history)
+        self.series_path = series_path
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "latest": self.samples[-1] if self.samples else None,
+        }
+
+    def _run(self) -> dict:
+        # Only cheap counters: walking every object (memory_report) would
+        # stall the worker once per tick.
+        sessions = session_report(top=0)
+        sample = {
+            "at": datetime.utcnow().isoformat(),
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "gc_counts": list(gc.get_count()),
+            "sessions": sessions["live"],
+            "identity_map_objects": sessions["identity_map_objects"],
+        }
+        if tracemalloc.is_tracing():
+            sample["traced_bytes"] = tracemalloc.get_traced_memory()[0]
+        self.samples.append(sample)
+        if self.series_path:
+            fd = os.open(self.series_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, (json.dumps(sample) + "\n").encode())
+            finally:
+                os.close(fd)
+        return sample
+
+
+allocation_tracker = AllocationTracker()
+memory_sampler = MemorySampler()
+register_metrics("memory", memory_sampler.stats)
@@ -0,0 +1,15 @@
+import os
+from typing import Callable, Dict
+
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], dict]):
+    _providers[name] = provider
+
+
+def metrics_snapshot() -> dict:
+    snapshot = {"pid": os.getpid()}
+    for name, provider in _providers.items():
+        snapshot[name] = provider()
+    return snapshot
@@ -0,0 +1,319 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+
+
+class SchemaVersionError(Exception):
+    def __init__(self, current: int, expected: int):
+        self.current = current
+        self.expected = expected
+        super().__init__(
+            f"Database schema is at version {current}, application expects {expected}; "
+            f"run `python manage.py migrate`"
+        )
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: List[str]
+
+
+# Statements are plain SQLite DDL so that every worker, the CLI and the
+# tests apply exactly the same schema. Never edit a released migration;
+# append a new one instead.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", [
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            username VARCHAR NOT NULL,
+            email VARCHAR NOT NULL,
+            hashed_password VARCHAR NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (email)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+        """CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            deadline DATETIME,
+            user_id INTEGER NOT NULL,
+            priority VARCHAR,
+            category VARCHAR,
+            created_at DATETIME,
+            position INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_id ON tasks (id)",
+        """CREATE TABLE IF NOT EXISTS subtasks (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(task_id) REFERENCES tasks (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_subtasks_id ON subtasks (id)",
+    ]),
+    Migration(2, "shard routing table and non-reused task ids", [
+        """CREATE TABLE user_shards (
+            user_id INTEGER NOT NULL,
+            shard INTEGER NOT NULL,
+            PRIMARY KEY (user_id)
+        )""",
+        # AUTOINCREMENT keeps ids in the range seeded per shard, so task ids
+        # stay globally unique and rows can move between shards unchanged.
+        """CREATE TABLE tasks_new (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            deadline DATETIME,
+            user_id INTEGER NOT NULL,
+            priority VARCHAR,
+            category VARCHAR,
+            created_at DATETIME,
+            position INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        """INSERT INTO tasks_new (id, title, completed, deadline, user_id, priority, category, created_at, position)
+            SELECT id, title, completed, deadline, user_id, priority, category, created_at, position FROM tasks""",
+        "DROP TABLE tasks",
+        "ALTER TABLE tasks_new RENAME TO tasks",
+        "CREATE INDEX ix_tasks_id ON tasks (id)",
+        """CREATE TABLE subtasks_new (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            task_id INTEGER NOT NULL,
+            FOREIGN KEY(task_id) REFERENCES tasks (id)
+        )""",
+        "INSERT INTO subtasks_new (id, title, completed, task_id) SELECT id, title, completed, task_id FROM subtasks",
+        "DROP TABLE subtasks",
+        "ALTER TABLE subtasks_new RENAME TO subtasks",
+        "CREATE INDEX ix_subtasks_id ON subtasks (id)",
+    ]),
+    Migration(3, "task completion time and archive tables", [
+        "ALTER TABLE tasks ADD COLUMN completed_at DATETIME",
+        # Completion time was never recorded before. Counting from the
+        # upgrade gives already completed tasks the full retention period
+        # instead of archiving every old one on the first run.
+        "UPDATE tasks SET completed_at = CURRENT_TIMESTAMP WHERE completed = 1",
+        "CREATE INDEX ix_tasks_completed_at ON tasks (completed_at)",
+        """CREATE TABLE archived_tasks (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            deadline DATETIME,
+            user_id INTEGER NOT NULL,
+            priority VARCHAR,
+            category VARCHAR,
+            created_at DATETIME,
+            completed_at DATETIME,
+            position INTEGER,
+            archived_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX ix_archived_tasks_user_id_archived_at ON archived_tasks (user_id, archived_at)",
+        """CREATE TABLE archived_subtasks (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            completed BOOLEAN,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(task_id) REFERENCES archived_tasks (id)
+        )""",
+        "CREATE INDEX ix_archived_subtasks_task_id ON archived_subtasks (task_id)",
+    ]),
+    Migration(4, "index for deadline window queries", [
+        "CREATE INDEX ix_tasks_user_id_completed_deadline ON tasks (user_id, completed, deadline)",
+    ]),
+    Migration(5, "recurring task series", [
+        "ALTER TABLE tasks ADD COLUMN recurrence_frequency VARCHAR",
+        "ALTER TABLE tasks ADD COLUMN recurrence_interval INTEGER",
+        "ALTER TABLE tasks ADD COLUMN recurrence_start DATETIME",
+        "ALTER TABLE tasks ADD COLUMN series_id INTEGER",
+        "ALTER TABLE tasks ADD COLUMN occurrence INTEGER",
+        "ALTER TABLE archived_tasks ADD COLUMN recurrence_frequency VARCHAR",
+        "ALTER TABLE archived_tasks ADD COLUMN recurrence_interval INTEGER",
+        "ALTER TABLE archived_tasks ADD COLUMN recurrence_start DATETIME",
+        "ALTER TABLE archived_tasks ADD COLUMN series_id INTEGER",
+        "ALTER TABLE archived_tasks ADD COLUMN occurrence INTEGER",
+        # Unique so that two workers cannot materialize the same occurrence twice.
+        "CREATE UNIQUE INDEX ix_tasks_user_id_series_id_occurrence ON tasks (user_id, series_id, occurrence)",
+    ]),
+    Migration(6, "category and priority lookup tables", [
+        """CREATE TABLE priorities (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (name)
+        )""",
+        "INSERT INTO priorities (id, name) VALUES (1, 'low'), (2, 'medium'), (3, 'high')",
+        """CREATE TABLE categories (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE UNIQUE INDEX ix_categories_user_id_name ON categories (user_id, name)",
+        """INSERT INTO categories (user_id, name)
+            SELECT user_id, category FROM tasks WHERE category IS NOT NULL
+            UNION SELECT user_id, category FROM archived_tasks WHERE category IS NOT NULL""",
+        "ALTER TABLE tasks ADD COLUMN priority_id INTEGER REFERENCES priorities (id)",
+        "ALTER TABLE tasks ADD COLUMN category_id INTEGER REFERENCES categories (id)",
+        "ALTER TABLE archived_tasks ADD COLUMN priority_id INTEGER REFERENCES priorities (id)",
+        "ALTER TABLE archived_tasks ADD COLUMN category_id INTEGER REFERENCES categories (id)",
+        # Unknown priority strings were never accepted by the API; map them to medium anyway.
+        """UPDATE tasks SET
+            priority_id = coalesce((SELECT id FROM priorities WHERE name = tasks.priority), 2),
+            category_id = (SELECT id FROM categories WHERE categories.user_id = tasks.user_id AND categories.name = tasks.category)""",
+        """UPDATE archived_tasks SET
+            priority_id = coalesce((SELECT id FROM priorities WHERE name = archived_tasks.priority), 2),
+            category_id = (SELECT id FROM categories WHERE categories.user_id = archived_tasks.user_id AND categories.name = archived_tasks.category)""",
+        "ALTER TABLE tasks DROP COLUMN priority",
+        "ALTER TABLE tasks DROP COLUMN category",
+        "ALTER TABLE archived_tasks DROP COLUMN priority",
+        "ALTER TABLE archived_tasks DROP COLUMN category",
+        # Facet counts group by these and read nothing else, so they stay index-only.
+        "CREATE INDEX ix_tasks_user_id_category_id ON tasks (user_id, category_id)",
+        "CREATE INDEX ix_tasks_user_id_priority_id ON tasks (user_id, priority_id)",
+    ]),
+    Migration(7, "shared workspaces", [
+        """CREATE TABLE workspaces (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR NOT NULL,
+            created_at DATETIME
+        )""",
+        """CREATE TABLE workspace_members (
+            user_id INTEGER NOT NULL,
+            workspace_id INTEGER NOT NULL,
+            role VARCHAR NOT NULL,
+            PRIMARY KEY (user_id, workspace_id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(workspace_id) REFERENCES workspaces (id)
+        )""",
+        "CREATE INDEX ix_workspace_members_workspace_id ON workspace_members (workspace_id)",
+        "ALTER TABLE tasks ADD COLUMN workspace_id INTEGER REFERENCES workspaces (id)",
+        "ALTER TABLE archived_tasks ADD COLUMN workspace_id INTEGER REFERENCES workspaces (id)",
+        # Personal queries add "workspace_id IS NULL", an equality lookup on
+        # the second column, so the per-user indexes stay covering.
+        "DROP INDEX ix_tasks_user_id_completed_deadline",
+        "CREATE INDEX ix_tasks_user_id_workspace_id_completed_deadline ON tasks (user_id, workspace_id, completed, deadline)",
+        "DROP INDEX ix_tasks_user_id_category_id",
+        "CREATE INDEX ix_tasks_user_id_workspace_id_category_id ON tasks (user_id, workspace_id, category_id)",
+        "DROP INDEX ix_tasks_user_id_priority_id",
+        "CREATE INDEX ix_tasks_user_id_workspace_id_priority_id ON tasks (user_id, workspace_id, priority_id)",
+        "CREATE INDEX ix_tasks_workspace_id_position ON tasks (workspace_id, position) WHERE workspace_id IS NOT NULL",
+    ]),
+    Migration(8, "subtask task index", [
+        # Loading a task's subtasks, or counting them, no longer scans the table.
+        "CREATE INDEX ix_subtasks_task_id_completed ON subtasks (task_id, completed)",
+    ]),
+    Migration(9, "stored subtask counters", [
+        "ALTER TABLE tasks ADD COLUMN subtask_total INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE tasks ADD COLUMN subtask_completed INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE archived_tasks ADD COLUMN subtask_total INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE archived_tasks ADD COLUMN subtask_completed INTEGER NOT NULL DEFAULT 0",
+        "UPDATE tasks SET "
+        "subtask_total = (SELECT COUNT(*) FROM subtasks WHERE subtasks.task_id = tasks.id), "
+        "subtask_completed = (SELECT COUNT(*) FROM subtasks WHERE subtasks.task_id = tasks.id AND subtasks.completed)",
+        "UPDATE archived_tasks SET "
+        "subtask_total = (SELECT COUNT(*) FROM archived_subtasks WHERE archived_subtasks.task_id = archived_tasks.id), "
+        "subtask_completed = (SELECT COUNT(*) FROM archived_subtasks WHERE archived_subtasks.task_id = archived_tasks.id AND archived_subtasks.completed)",
+        # Every write to subtasks, including the bulk statements, cascades and
+        # archive moves, adjusts its task's counters in the same statement.
+        """CREATE TRIGGER subtasks_count_insert AFTER INSERT ON subtasks BEGIN
+            UPDATE tasks SET subtask_total = subtask_total + 1, subtask_completed = subtask_completed + NEW.completed WHERE id = NEW.task_id;
+        END""",
+        """CREATE TRIGGER subtasks_count_delete AFTER DELETE ON subtasks BEGIN
+            UPDATE tasks SET subtask_total = subtask_total - 1, subtask_completed = subtask_completed - OLD.completed WHERE id = OLD.task_id;
+        END""",
+        """CREATE TRIGGER subtasks_count_update AFTER UPDATE OF completed, task_id ON subtasks
+        WHEN OLD.completed IS NOT NEW.completed OR OLD.task_id IS NOT NEW.task_id BEGIN
+            UPDATE tasks SET subtask_total = subtask_total - 1, subtask_completed = subtask_completed - OLD.completed WHERE id = OLD.task_id;
+            UPDATE tasks SET subtask_total = subtask_total + 1, subtask_completed = subtask_completed + NEW.completed WHERE id = NEW.task_id;
+        END""",
+    ]),
+    Migration(10, "indexes for ordered reads", [
+        # Personal lists are ordered by position straight from the index.
+        "CREATE INDEX ix_tasks_user_id_workspace_id_position ON tasks (user_id, workspace_id, position)",
+        # Subtasks are read ordered by (task_id, id). SQLite appends the rowid
+        # to every index, so (task_id) serves that order without a sort;
+        # (task_id, completed) could not.
+        "DROP INDEX ix_subtasks_task_id_completed",
+        "CREATE INDEX ix_subtasks_task_id ON subtasks (task_id)",
+    ]),
+    Migration(11, "category references", [
+        # Deleting a category clears it from every task that uses it,
+        # including workspace tasks other members filed under it.
+        "CREATE INDEX ix_tasks_category_id ON tasks (category_id)",
+        "CREATE INDEX ix_archived_tasks_category_id ON archived_tasks (category_id)",
+    ]),
+    Migration(12, "custom recurrence as daily", [
+        # "custom" meant every `interval` days, which is what "daily" does.
+        "UPDATE tasks SET recurrence_frequency = 'daily' WHERE recurrence_frequency = 'custom'",
+        "UPDATE archived_tasks SET recurrence_frequency = 'daily' WHERE recurrence_frequency = 'custom'",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(connection: Connection) -> int:
+    try:
+        version = connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except OperationalError:
+        connection.rollback()
+        return 0
+    return version or 0
+
+
+def check_schema(engine: Engine) -> int:
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version != LATEST_VERSION:
+        raise SchemaVersionError(version, LATEST_VERSION)
+    return version
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    with engine.connect() as connection:
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so concurrent
+        # migrators queue here and re-read the version once they get it.
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            connection.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER NOT NULL PRIMARY KEY, "
+                "description VARCHAR NOT NULL, "
+                "applied_at DATETIME NOT NULL)"
+            )
+            current = get_schema_version(connection)
+            for migration in MIGRATIONS:
+                if current < migration.version <= target:
+                    for statement in migration.statements:
+                        connection.exec_driver_sql(statement)
+                    connection.execute(
+                        text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                        {"v": migration.version, "d": migration.description, "t": datetime.utcnow()},
+                    )
+                    applied.append(migration.version)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return applied
@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from infrastructure.database import Base
 from datetime import datetime
 
+# Stored codes for the fixed priority levels; migration 6 seeds the same rows.
+PRIORITY_IDS = {"low": 1, "medium": 2, "high": 3}
+PRIORITY_NAMES = {code: name for name, code in PRIORITY_IDS.items()}
+WRITE_ROLES = ("owner", "editor")
+
 class UserModel(Base):
     __tablename__ = "users"
     
@@ -15,26 +20,121 @@ class UserModel(Base):
 
 class TaskModel(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_workspace_id_completed_deadline", "user_id", "workspace_id", "completed", "deadline"),
+        Index("ix_tasks_user_id_series_id_occurrence", "user_id", "series_id", "occurrence", unique=True),
+        Index("ix_tasks_user_id_workspace_id_category_id", "user_id", "workspace_id", "category_id"),
+        Index("ix_tasks_user_id_workspace_id_priority_id", "user_id", "workspace_id", "priority_id"),
+        Index("ix_tasks_user_id_workspace_id_position", "user_id", "workspace_id", "position"),
+        Index("ix_tasks_workspace_id_position", "workspace_id", "position", sqlite_where=text("workspace_id IS NOT NULL")),
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, nullable=False)
     completed = Column(Boolean, default=False)
     deadline = Column(DateTime, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    priority = Column(String, default="medium")
-    category = Column(String, nullable=True)
+    priority_id = Column(Integer, ForeignKey("priorities.id"), default=PRIORITY_IDS["medium"])
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True, index=True)
     position = Column(Integer, default=0)
+    recurrence_frequency = Column(String, nullable=True)
+    recurrence_interval = Column(Integer, nullable=True)
+    recurrence_start = Column(DateTime, nullable=True)
+    series_id = Column(Integer, nullable=True)
+    occurrence = Column(Integer, nullable=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=True)
+    # Kept up to date by triggers on subtasks (migration 9).
+    subtask_total = Column(Integer, nullable=False, default=0, server_default="0")
+    subtask_completed = Column(Integer, nullable=False, default=0, server_default="0")
     
     owner = relationship("UserModel", back_populates="tasks")
-    subtasks = relationship("SubtaskModel", back_populates="task", cascade="all, delete-orphan")
+    # Id order within each task; leading with task_id lets bulk loads over
+    # many tasks read ix_subtasks_task_id in order instead of sorting.
+    subtasks = relationship("SubtaskModel", back_populates="task", cascade="all, delete-orphan", order_by="(SubtaskModel.task_id, SubtaskModel.id)")
 
 class SubtaskModel(Base):
     __tablename__ = "subtasks"
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, nullable=False)
     completed = Column(Boolean, default=False)
-    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
     
     task = relationship("TaskModel", back_populates="subtasks")
+
+class PriorityModel(Base):
+    __tablename__ = "priorities"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, unique=True, nullable=False)
+
+class CategoryModel(Base):
+    __tablename__ = "categories"
+    __table_args__ = (
+        Index("ix_categories_user_id_name", "user_id", "name", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String, nullable=False)
+
+class WorkspaceModel(Base):
+    __tablename__ = "workspaces"
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WorkspaceMemberModel(Base):
+    # Keyed by user first: this is the access index every task query joins
+    # against, so "which workspaces can U see or write" is one index range.
+    __tablename__ = "workspace_members"
+    __table_args__ = (Index("ix_workspace_members_workspace_id", "workspace_id"),)
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, autoincrement=False)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id"), primary_key=True, autoincrement=False)
+    role = Column(String, nullable=False)
+
+class UserShardModel(Base):
+    __tablename__ = "user_shards"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    shard = Column(Integer, nullable=False)
+
+class ArchivedTaskModel(Base):
+    __tablename__ = "archived_tasks"
+    __table_args__ = (Index("ix_archived_tasks_user_id_archived_at", "user_id", "archived_at"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    completed = Column(Boolean, default=True)
+    deadline = Column(DateTime, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    priority_id = Column(Integer, ForeignKey("priorities.id"), default=PRIORITY_IDS["medium"])
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+    position = Column(Integer, default=0)
+    recurrence_frequency = Column(String, nullable=True)
+    recurrence_interval = Column(Integer, nullable=True)
+    recurrence_start = Column(DateTime, nullable=True)
+    series_id = Column(Integer, nullable=True)
+    occurrence = Column(Integer, nullable=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+    subtask_total = Column(Integer, nullable=False, default=0, server_default="0")
+    subtask_completed = Column(Integer, nullable=False, default=0, server_default="0")
+
+class ArchivedSubtaskModel(Base):
+    __tablename__ = "archived_subtasks"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    completed = Column(Boolean, default=False)
+    task_id = Column(Integer, ForeignKey("archived_tasks.id"), nullable=False, index=True)
@@ -0,0 +1,153 @@
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_STATEMENTS_REPORTED = 3
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+@dataclass
+class RequestStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    sql_count: int = 0
+    sql_ms: float = 0.0
+    statements: List[Tuple[float, str]] = field(default_factory=list)
+    serialization_ms: float = 0.0
+    endpoint_returned_at: Optional[float] = None
+
+    def record_statement(self, statement: str, elapsed_ms: float):
+        self.sql_count += 1
+        self.sql_ms += elapsed_ms
+        self.statements.append((elapsed_ms, statement))
+
+    def slowest_statements(self, limit: int = SLOW_STATEMENTS_REPORTED) -> List[dict]:
+        ordered = sorted(self.statements, key=lambda s: s[0], reverse=True)[:limit]
+        return [{"ms": round(ms, 3), "sql": " ".join(sql.split())} for ms, sql in ordered]
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def response_started(self):
+        # Everything between the endpoint's return and the first response
+        # message is response_model validation, encoding and rendering.
+        if self.endpoint_returned_at is not None:
+            self.serialization_ms = (time.perf_counter() - self.endpoint_returned_at) * 1000
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.record_statement(statement, (time.perf_counter() - started) * 1000)
+
+
+def _endpoint_returned():
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.endpoint_returned_at = time.perf_counter()
+
+
+def _timed(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _endpoint_returned()
+    else:
+        @functools.wraps(endpoint)
+        def timed_endpoint(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _endpoint_returned()
+    return timed_endpoint
+
+
+class TimedRoute(APIRoute):
+    # Notes when the endpoint returns, so RequestDiagnosticsMiddleware can
+    # time serialization up to the start of the response.
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed(endpoint), **kwargs)
+
+
+def install_request_diagnostics():
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SamplingProfiler:
+    # Sync endpoints run in the threadpool, so every busy thread of the worker
+    # is sampled; concurrent requests in the same worker show up as well.
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, title: str) -> str:
+        own_time = Counter()
+        for stack, count in self.samples.items():
+            own_time[stack.rsplit(";", 1)[-1]] += count
+        lines = [title, f"samples: {self.sample_count}, interval: {self.interval * 1000:.1f}ms", "", "# top frames by own samples"]
+        lines += [f"{count:6d}  {frame}" for frame, count in own_time.most_common(25)]
+        lines += ["", "# collapsed stacks (flamegraph.pl / speedscope format)"]
+        lines += [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def save(self, title: str, directory: Optional[str] = None) -> str:
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = "".join(c if c.isalnum() else "_" for c in title).strip("_")[:80]
+        path = os.path.join(directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{name}.txt")
+        with open(path, "w") as report_file:
+            report_file.write(self.report(title))
+        return path
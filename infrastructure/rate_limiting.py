@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .metrics import register_metrics
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "64"))
+SHED_RETRY_AFTER_SECONDS = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "1"))
+MAX_TRACKED_PRINCIPALS = 10000
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float
+    burst: float
+
+
+DEFAULT_LIMITS = {
+    "read": RateLimit(float(os.getenv("RATE_LIMIT_READS_PER_SECOND", "50")), float(os.getenv("RATE_LIMIT_READS_BURST", "100"))),
+    "write": RateLimit(float(os.getenv("RATE_LIMIT_WRITES_PER_SECOND", "10")), float(os.getenv("RATE_LIMIT_WRITES_BURST", "40"))),
+    "auth": RateLimit(float(os.getenv("RATE_LIMIT_AUTH_PER_SECOND", "2")), float(os.getenv("RATE_LIMIT_AUTH_BURST", "20"))),
+    "auth_address": RateLimit(float(os.getenv("RATE_LIMIT_AUTH_ADDRESS_PER_SECOND", "10")), float(os.getenv("RATE_LIMIT_AUTH_ADDRESS_BURST", "100"))),
+}
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit, now: float):
+        self.limit = limit
+        self.tokens = limit.burst
+        self.updated_at = now
+
+    def take(self, now: float) -> float:
+        # Returns 0 when a token was taken, otherwise the seconds until one is available.
+        self.tokens = min(self.limit.burst, self.tokens + (now - self.updated_at) * self.limit.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.limit.rate
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated_at) * self.limit.rate >= self.limit.burst
+
+
+class AdmissionController:
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None, max_in_flight: int = MAX_IN_FLIGHT_REQUESTS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self.max_in_flight = max_in_flight
+        self.enabled = enabled
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.last_active_at = time.monotonic()
+        self.rejections: Counter = Counter()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.enabled and self.in_flight >= self.max_in_flight:
+                self.rejections["shed"] += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.last_active_at = time.monotonic()
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.last_active_at = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        with self._lock:
+            return 0.0 if self.in_flight else time.monotonic() - self.last_active_at
+
+    def check_rate(self, budget: str, principal: str) -> float:
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            key = (budget, principal)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_TRACKED_PRINCIPALS:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(self.limits[budget], now)
+            retry_after = bucket.take(now)
+            if retry_after:
+                self.rejections[f"rate_limited_{budget}"] += 1
+            return retry_after
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.rejections.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_in_flight": self.max_in_flight,
+                "tracked_principals": len(self._buckets),
+                "rejections": dict(self.rejections),
+            }
+
+    def _prune(self, now: float):
+        # Full buckets carry no state worth keeping; drop them before growing.
+        for key in [k for k, b in self._buckets.items() if b.is_full(now)]:
+            del self._buckets[key]
+        overflow = len(self._buckets) - MAX_TRACKED_PRINCIPALS + 1
+        for key in list(self._buckets)[:max(overflow, 0)]:
+            del self._buckets[key]
+
+
+admission_controller = AdmissionController()
+register_metrics("admission", admission_controller.stats)
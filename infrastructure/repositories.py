@@ -1,121 +1,635 @@
-from domain.models import Task, User, Subtask
-from domain.interfaces import ITaskRepository, IUserRepository
-from .database import SessionLocal
-from .orm_models import TaskModel, UserModel, SubtaskModel
-from typing import Optional, List
+from domain.models import Category, Recurrence, Task, TaskFacets, TaskProjection, User, Subtask, Workspace, WorkspaceMember
+from domain.exceptions import SplitTransactionError
+from domain.interfaces import ITaskRepository, IUserRepository, IWorkspaceRepository
+from domain.recurrence import pending_occurrences
+from .database import SessionLocal, shard_sessions
+from .orm_models import (
+    PRIORITY_IDS, PRIORITY_NAMES, WRITE_ROLES, ArchivedSubtaskModel, ArchivedTaskModel, CategoryModel, TaskModel, UserModel, SubtaskModel,
+    WorkspaceMemberModel, WorkspaceModel,
+)
+from .sharding import ShardRouter, shard_router
+from sqlalchemy import String, and_, case, delete, false, func, insert, literal, literal_column, or_, select, union_all, update
+from sqlalchemy.orm import Session, selectinload
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, Optional, List, Tuple
 from datetime import datetime
 
+STORED_TASK_COLUMNS = (
+    TaskModel.id, TaskModel.title, TaskModel.completed, TaskModel.deadline, TaskModel.user_id,
+    TaskModel.priority_id, TaskModel.category_id, TaskModel.created_at, TaskModel.completed_at, TaskModel.position,
+    TaskModel.recurrence_frequency, TaskModel.recurrence_interval, TaskModel.recurrence_start, TaskModel.series_id, TaskModel.occurrence,
+    TaskModel.workspace_id,
+)
+# Spelled out as SQL so it also works inside INSERT/UPDATE ... RETURNING,
+# where SQLAlchemy would otherwise add the tasks table to the subquery's FROM.
+CATEGORY_NAME = literal_column("(SELECT categories.name FROM categories WHERE categories.id = tasks.category_id)", String).label("category")
+ARCHIVED_CATEGORY_NAME = literal_column("(SELECT categories.name FROM categories WHERE categories.id = archived_tasks.category_id)", String).label("category")
+# The subtask counters are maintained by triggers, so they are read but never copied.
+TASK_COLUMNS = STORED_TASK_COLUMNS + (TaskModel.subtask_total, TaskModel.subtask_completed, CATEGORY_NAME)
+SUBTASK_COLUMNS = (SubtaskModel.id, SubtaskModel.title, SubtaskModel.completed, SubtaskModel.task_id)
+# What a TaskProjection field reads. "id" and "series_id" are always selected;
+# the read model uses series_id to notice materialized occurrences.
+PROJECTED_COLUMNS = {
+    "id": (),
+    "title": (TaskModel.title,),
+    "completed": (TaskModel.completed,),
+    "deadline": (TaskModel.deadline,),
+    "priority": (TaskModel.priority_id,),
+    "category": (CATEGORY_NAME,),
+    "created_at": (TaskModel.created_at,),
+    "position": (TaskModel.position,),
+    "completed_at": (TaskModel.completed_at,),
+    "recurrence": (TaskModel.recurrence_frequency, TaskModel.recurrence_interval, TaskModel.recurrence_start),
+    "series_id": (),
+    "workspace_id": (TaskModel.workspace_id,),
+}
+
+
+def _personal(user_id: int):
+    return and_(TaskModel.user_id == user_id, TaskModel.workspace_id.is_(None))
+
+
+def _member_workspaces(user_id: int, write: bool = False):
+    members = select(WorkspaceMemberModel.workspace_id).where(WorkspaceMemberModel.user_id == user_id)
+    if write:
+        members = members.where(WorkspaceMemberModel.role.in_(WRITE_ROLES))
+    return members
+
+
+def _accessible(user_id: int, write: bool = True):
+    # The user's own tasks or those of their workspaces. Memberships are
+    # keyed by user first, so this is one index range per statement rather
+    # than a permission check per task.
+    return or_(_personal(user_id), TaskModel.workspace_id.in_(_member_workspaces(user_id, write)))
+
+
+def _recurrence_of(row) -> Optional[Recurrence]:
+    if row.recurrence_frequency is None:
+        return None
+    return Recurrence(frequency=row.recurrence_frequency, interval=row.recurrence_interval, start=row.recurrence_start)
+
 
 class TaskRepository(ITaskRepository):
-    def __init__(self):
-        self.db = SessionLocal()
-    
-    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None) -> Task:
-        max_position = self.db.query(TaskModel).filter(TaskModel.user_id == user_id).count()
-        db_task = TaskModel(
-            title=title, 
-            completed=False, 
-            deadline=deadline, 
-            user_id=user_id,
-            priority=priority,
-            category=category,
-            created_at=datetime.utcnow(),
-            position=max_position
+    def __init__(self, db: Optional[Session] = None):
+        self.db = db if db is not None else SessionLocal()
+        self._transaction_depth = 0
+    
+    @contextmanager
+    def transaction(self, user_id: int, allow_split: bool = False) -> Iterator[None]:
+        self._transaction_depth += 1
+        try:
+            yield
+            if self._transaction_depth == 1:
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self._transaction_depth -= 1
+    
+    def rows_written(self) -> int:
+        # SQLite's running count of rows this connection has changed.
+        return self.db.connection().connection.dbapi_connection.total_changes
+    
+    def _commit(self):
+        # Inside transaction() writes are only flushed; the outermost block commits.
+        if self._transaction_depth:
+            self.db.flush()
+        else:
+            self.db.commit()
+    
+    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None, recurrence: Optional[Recurrence] = None, workspace_id: Optional[int] = None) -> Optional[Task]:
+        if workspace_id is None:
+            scope = _personal(user_id)
+        elif self.db.execute(_member_workspaces(user_id, write=True).where(WorkspaceMemberModel.workspace_id == workspace_id)).first() is None:
+            return None
+        else:
+            scope = TaskModel.workspace_id == workspace_id
+        next_position = select(func.count()).select_from(TaskModel).where(scope).scalar_subquery()
+        now = datetime.utcnow()
+        values = {}
+        if recurrence is not None:
+            # The first occurrence is due at the series start; later ones are materialized on demand.
+            deadline = deadline or recurrence.start or now
+            values = {
+                "recurrence_frequency": recurrence.frequency,
+                "recurrence_interval": recurrence.interval,
+                "recurrence_start": deadline,
+                "occurrence": 0,
+            }
+        stmt = (
+            insert(TaskModel)
+            .values(
+                title=title,
+                completed=False,
+                deadline=deadline,
+                user_id=user_id,
+                priority_id=PRIORITY_IDS[priority],
+                category_id=self._category_id(user_id, category),
+                created_at=now,
+                position=next_position,
+                workspace_id=workspace_id,
+                **values
+            )
+            .returning(*TASK_COLUMNS)
         )
-        self.db.add(db_task)
-        self.db.commit()
-        self.db.refresh(db_task)
-        return self._task_to_domain(db_task)
+        row = self.db.execute(stmt).one()
+        if recurrence is not None:
+            # A series is named after its first occurrence.
+            row = self.db.execute(
+                update(TaskModel).where(TaskModel.id == row.id).values(series_id=row.id).returning(*TASK_COLUMNS)
+            ).one()
+        self._commit()
+        return self._row_to_task(row, [])
     
-    def get_by_id(self, task_id: int, user_id: int) -> Optional[Task]:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if db_task:
-            return self._task_to_domain(db_task)
+    def get_by_id(self, task_id: int, user_id: int, projection: Optional[TaskProjection] = None) -> Optional[Task]:
+        where = (TaskModel.id == task_id, _accessible(user_id, write=False))
+        if projection is not None:
+            return next(iter(self._projected(where, (), projection)), None)
+        row = self.db.query(TaskModel, CATEGORY_NAME).filter(*where).first()
+        if row:
+            return self._task_to_domain(*row)
         return None
     
-    def get_all_by_user(self, user_id: int) -> List[Task]:
-        db_tasks = self.db.query(TaskModel).filter(TaskModel.user_id == user_id).order_by(TaskModel.position).all()
-        return [self._task_to_domain(t) for t in db_tasks]
+    def get_all_by_user(self, user_id: int, workspace_id: Optional[int] = None, projection: Optional[TaskProjection] = None) -> List[Task]:
+        if workspace_id is not None:
+            where = (TaskModel.workspace_id == workspace_id, TaskModel.workspace_id.in_(_member_workspaces(user_id)))
+            if projection is not None:
+                return self._projected(where, (TaskModel.position,), projection)
+            rows = (
+                self.db.query(TaskModel, CATEGORY_NAME)
+                .options(selectinload(TaskModel.subtasks))
+                .filter(*where)
+                .order_by(TaskModel.position)
+                .all()
+            )
+            return [self._task_to_domain(*row) for row in rows]
+        self._materialize(user_id, datetime.utcnow())
+        if projection is not None:
+            return self._projected((_personal(user_id),), (TaskModel.position,), projection)
+        rows = (
+            self.db.query(TaskModel, CATEGORY_NAME)
+            .options(selectinload(TaskModel.subtasks))
+            .filter(_personal(user_id))
+            .order_by(TaskModel.position)
+            .all()
+        )
+        return [self._task_to_domain(*row) for row in rows]
+    
+    def get_visible(self, user_id: int, projection: Optional[TaskProjection] = None) -> List[Task]:
+        # Personal tasks, then workspace tasks: two ranges that are already in
+        # index order, where a single OR over both would need a sort.
+        personal = self.get_all_by_user(user_id, projection=projection)
+        where = (TaskModel.workspace_id.in_(_member_workspaces(user_id)),)
+        order_by = (TaskModel.workspace_id, TaskModel.position)
+        if projection is not None:
+            return personal + self._projected(where, order_by, projection)
+        rows = (
+            self.db.query(TaskModel, CATEGORY_NAME)
+            .options(selectinload(TaskModel.subtasks))
+            .filter(*where)
+            .order_by(*order_by)
+            .all()
+        )
+        return personal + [self._task_to_domain(*row) for row in rows]
+    
+    def get_due(self, user_id: int, start: datetime, end: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        self._materialize(user_id, datetime.utcnow(), start, end, limit)
+        # Equality on (user_id, workspace_id, completed) plus a deadline range keeps this on ix_tasks_user_id_workspace_id_completed_deadline.
+        where = (_personal(user_id), TaskModel.completed == False, TaskModel.deadline >= start, TaskModel.deadline < end)
+        if projection is not None:
+            return self._projected(where, (TaskModel.deadline,), projection, limit)
+        rows = (
+            self.db.query(TaskModel, CATEGORY_NAME)
+            .options(selectinload(TaskModel.subtasks))
+            .filter(*where)
+            .order_by(TaskModel.deadline)
+            .limit(limit)
+            .all()
+        )
+        return [self._task_to_domain(*row) for row in rows]
+    
+    def get_overdue(self, user_id: int, now: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        self._materialize(user_id, now)
+        where = (_personal(user_id), TaskModel.completed == False, TaskModel.deadline < now)
+        if projection is not None:
+            return self._projected(where, (TaskModel.deadline,), projection, limit)
+        rows = (
+            self.db.query(TaskModel, CATEGORY_NAME)
+            .options(selectinload(TaskModel.subtasks))
+            .filter(*where)
+            .order_by(TaskModel.deadline)
+            .limit(limit)
+            .all()
+        )
+        return [self._task_to_domain(*row) for row in rows]
     
     def update(self, task_id: int, user_id: int, title: Optional[str] = None, completed: Optional[bool] = None, deadline: Optional[datetime] = None, priority: Optional[str] = None, category: Optional[str] = None) -> Optional[Task]:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if not db_task:
-            return None
-        
-        if title is not None:
-            db_task.title = title
-        if completed is not None:
-            db_task.completed = completed
-        if deadline is not None:
-            db_task.deadline = deadline
+        changes = {"title": title, "completed": completed, "deadline": deadline}
+        changes = {key: value for key, value in changes.items() if value is not None}
         if priority is not None:
-            db_task.priority = priority
+            changes["priority_id"] = PRIORITY_IDS[priority]
         if category is not None:
-            db_task.category = category
+            # An empty name clears the category.
+            changes["category_id"] = self._category_id(user_id, category)
+        if not changes:
+            return self.get_by_id(task_id, user_id)
+        if completed is not None:
+            changes["completed_at"] = func.coalesce(TaskModel.completed_at, datetime.utcnow()) if completed else None
         
-        self.db.commit()
-        self.db.refresh(db_task)
-        return self._task_to_domain(db_task)
+        stmt = (
+            update(TaskModel)
+            .where(TaskModel.id == task_id, _accessible(user_id))
+            .values(**changes)
+            .returning(*TASK_COLUMNS)
+        )
+        row = self.db.execute(stmt).first()
+        if row is None:
+            return None
+        if completed and row.series_id is not None:
+            self._compact_series(row.series_id, user_id, row.occurrence)
+        subtasks = self._subtasks_of(task_id)
+        self._commit()
+        return self._row_to_task(row, subtasks)
     
     def delete(self, task_id: int, user_id: int) -> bool:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if db_task:
-            self.db.delete(db_task)
-            self.db.commit()
-            return True
-        return False
+        # Deleting any occurrence of a recurring task ends the whole series.
+        series_id = select(TaskModel.series_id).where(TaskModel.id == task_id, _accessible(user_id)).scalar_subquery()
+        targets = select(TaskModel.id).where(_accessible(user_id), or_(TaskModel.id == task_id, TaskModel.series_id == series_id))
+        self.db.execute(
+            delete(SubtaskModel)
+            .where(SubtaskModel.task_id.in_(targets))
+            .execution_options(synchronize_session=False)
+        )
+        count = self.db.execute(delete(TaskModel).where(TaskModel.id.in_(targets)).execution_options(synchronize_session=False)).rowcount
+        if count:
+            self._commit()
+        return bool(count)
     
     def delete_completed(self, user_id: int) -> int:
-        count = self.db.query(TaskModel).filter(TaskModel.user_id == user_id, TaskModel.completed == True).delete()
-        self.db.commit()
+        count = self.db.query(TaskModel).filter(_personal(user_id), TaskModel.completed == True).delete()
+        self._commit()
         return count
     
     def update_positions(self, user_id: int, task_positions: List[tuple]) -> bool:
-        for task_id, position in task_positions:
-            db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-            if db_task:
-                db_task.position = position
-        self.db.commit()
+        positions = dict(task_positions)
+        if positions:
+            stmt = (
+                update(TaskModel)
+                .where(TaskModel.id.in_(list(positions)), _accessible(user_id))
+                .values(position=case(positions, value=TaskModel.id))
+                .execution_options(synchronize_session=False)
+            )
+            self.db.execute(stmt)
+        self._commit()
         return True
     
     def add_subtask(self, task_id: int, user_id: int, title: str) -> Optional[Subtask]:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if not db_task:
-            return None
-        
-        db_subtask = SubtaskModel(title=title, completed=False, task_id=task_id)
-        self.db.add(db_subtask)
-        self.db.commit()
-        self.db.refresh(db_subtask)
-        return Subtask(id=db_subtask.id, title=db_subtask.title, completed=db_subtask.completed, task_id=db_subtask.task_id)
+        subtasks = self.add_subtasks(task_id, user_id, [title])
+        return subtasks[0] if subtasks else None
     
     def toggle_subtask(self, subtask_id: int, task_id: int, user_id: int, completed: bool) -> Optional[Subtask]:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if not db_task:
+        stmt = (
+            update(SubtaskModel)
+            .where(SubtaskModel.id == subtask_id, SubtaskModel.task_id == task_id, SubtaskModel.task_id.in_(self._owned_task_ids(task_id, user_id)))
+            .values(completed=completed)
+            .returning(*SUBTASK_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        row = self.db.execute(stmt).first()
+        if row is None:
             return None
-        
-        db_subtask = self.db.query(SubtaskModel).filter(SubtaskModel.id == subtask_id, SubtaskModel.task_id == task_id).first()
-        if not db_subtask:
+        self._commit()
+        return Subtask(id=row.id, title=row.title, completed=row.completed, task_id=row.task_id)
+    
+    def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
+        stmt = (
+            delete(SubtaskModel)
+            .where(SubtaskModel.id == subtask_id, SubtaskModel.task_id == task_id, SubtaskModel.task_id.in_(self._owned_task_ids(task_id, user_id)))
+            .execution_options(synchronize_session=False)
+        )
+        count = self.db.execute(stmt).rowcount
+        if count:
+            self._commit()
+        return bool(count)
+    
+    def add_subtasks(self, task_id: int, user_id: int, titles: List[str]) -> Optional[List[Subtask]]:
+        rows = union_all(*[
+            select(literal(title), false(), TaskModel.id).where(TaskModel.id == task_id, _accessible(user_id))
+            for title in titles
+        ])
+        stmt = (
+            insert(SubtaskModel)
+            .from_select(["title", "completed", "task_id"], rows)
+            .returning(*SUBTASK_COLUMNS)
+        )
+        created = sorted(self.db.execute(stmt).all())
+        if not created:
+            return None
+        self._commit()
+        return [Subtask(id=row.id, title=row.title, completed=row.completed, task_id=row.task_id) for row in created]
+    
+    def set_subtasks_completed(self, task_id: int, user_id: int, completed: bool) -> Optional[int]:
+        stmt = (
+            update(SubtaskModel)
+            .where(SubtaskModel.task_id == task_id, SubtaskModel.task_id.in_(self._owned_task_ids(task_id, user_id)))
+            .values(completed=completed)
+            .execution_options(synchronize_session=False)
+        )
+        count = self.db.execute(stmt).rowcount
+        return self._bulk_result(count, task_id, user_id)
+    
+    def delete_completed_subtasks(self, task_id: int, user_id: int) -> Optional[int]:
+        stmt = (
+            delete(SubtaskModel)
+            .where(SubtaskModel.task_id == task_id, SubtaskModel.completed == True, SubtaskModel.task_id.in_(self._owned_task_ids(task_id, user_id)))
+            .execution_options(synchronize_session=False)
+        )
+        count = self.db.execute(stmt).rowcount
+        return self._bulk_result(count, task_id, user_id)
+    
+    def iter_tasks(self, user_id: int, chunk_size: int = 500) -> Iterator[Task]:
+        # Streams rows from a server-side cursor; subtasks are fetched per chunk,
+        # so memory stays bounded by chunk_size whatever the list length.
+        result = self.db.execute(
+            select(*TASK_COLUMNS)
+            .where(_personal(user_id))
+            .order_by(TaskModel.position, TaskModel.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for rows in result.partitions():
+            subtasks: Dict[int, List[Subtask]] = {row.id: [] for row in rows}
+            for sub in self.db.execute(select(*SUBTASK_COLUMNS).where(SubtaskModel.task_id.in_(subtasks)).order_by(SubtaskModel.task_id, SubtaskModel.id)):
+                subtasks[sub.task_id].append(Subtask(id=sub.id, title=sub.title, completed=sub.completed, task_id=sub.task_id))
+            for row in rows:
+                yield self._row_to_task(row, subtasks[row.id])
+    
+    def import_tasks(self, user_id: int, tasks: List[Task]) -> int:
+        if not tasks:
+            return 0
+        first_position = self.db.execute(select(func.count()).select_from(TaskModel).where(_personal(user_id))).scalar()
+        names = {task.category for task in tasks if task.category}
+        category_ids = {}
+        if names:
+            self.db.execute(insert(CategoryModel).prefix_with("OR IGNORE"), [{"user_id": user_id, "name": name} for name in names])
+            category_ids = dict(self.db.execute(
+                select(CategoryModel.name, CategoryModel.id).where(CategoryModel.user_id == user_id, CategoryModel.name.in_(names))
+            ).all())
+        rows = [
+            {
+                "title": task.title,
+                "completed": task.completed,
+                "deadline": task.deadline,
+                "user_id": user_id,
+                "priority_id": PRIORITY_IDS.get(task.priority, PRIORITY_IDS["medium"]),
+                "category_id": category_ids.get(task.category),
+                "created_at": task.created_at or datetime.utcnow(),
+                "completed_at": task.completed_at,
+                "position": first_position + offset,
+            }
+            for offset, task in enumerate(tasks)
+        ]
+        task_ids = self.db.execute(insert(TaskModel).returning(TaskModel.id, sort_by_parameter_order=True), rows).scalars().all()
+        subtask_rows = [
+            {"title": subtask.title, "completed": subtask.completed, "task_id": task_id}
+            for task_id, task in zip(task_ids, tasks)
+            for subtask in task.subtasks
+        ]
+        if subtask_rows:
+            self.db.execute(insert(SubtaskModel), subtask_rows)
+        self._commit()
+        return len(task_ids)
+    
+    def get_archived(self, user_id: int, offset: int = 0, limit: int = 50) -> List[Task]:
+        rows = self.db.execute(
+            select(ArchivedTaskModel.__table__, ARCHIVED_CATEGORY_NAME)
+            .where(ArchivedTaskModel.user_id == user_id, ArchivedTaskModel.workspace_id.is_(None))
+            .order_by(ArchivedTaskModel.archived_at.desc(), ArchivedTaskModel.id.desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+        subtasks: Dict[int, List[Subtask]] = {row.id: [] for row in rows}
+        if subtasks:
+            for sub in self.db.execute(select(ArchivedSubtaskModel.__table__).where(ArchivedSubtaskModel.task_id.in_(subtasks)).order_by(ArchivedSubtaskModel.task_id, ArchivedSubtaskModel.id)):
+                subtasks[sub.task_id].append(Subtask(id=sub.id, title=sub.title, completed=sub.completed, task_id=sub.task_id))
+        tasks = []
+        for row in rows:
+            task = self._row_to_task(row, subtasks[row.id])
+            task.archived_at = row.archived_at
+            tasks.append(task)
+        return tasks
+    
+    def restore_archived(self, task_id: int, user_id: int) -> Optional[Task]:
+        next_position = select(func.count()).select_from(TaskModel).where(_personal(user_id)).scalar_subquery()
+        archived = ArchivedTaskModel.__table__.c
+        # The retention period starts over, so the next archive run does not take it straight back.
+        restored = select(
+            archived.id, archived.title, archived.completed, archived.deadline, archived.user_id, archived.priority_id,
+            archived.category_id, archived.created_at, literal(datetime.utcnow()), next_position,
+            archived.recurrence_frequency, archived.recurrence_interval, archived.recurrence_start, archived.series_id, archived.occurrence,
+            archived.workspace_id,
+        ).where(archived.id == task_id, archived.user_id == user_id, archived.workspace_id.is_(None))
+        row = self.db.execute(
+            insert(TaskModel.__table__)
+            .from_select([c.key for c in STORED_TASK_COLUMNS], restored)
+            .returning(*TASK_COLUMNS)
+        ).first()
+        if row is None:
             return None
         
-        db_subtask.completed = completed
-        self.db.commit()
-        self.db.refresh(db_subtask)
-        return Subtask(id=db_subtask.id, title=db_subtask.title, completed=db_subtask.completed, task_id=db_subtask.task_id)
+        archived_subtasks = ArchivedSubtaskModel.__table__.c
+        subtask_rows = self.db.execute(
+            insert(SubtaskModel.__table__)
+            .from_select([c.key for c in SUBTASK_COLUMNS], select(*archived_subtasks).where(archived_subtasks.task_id == task_id))
+            .returning(*SUBTASK_COLUMNS)
+        ).all()
+        self.db.execute(delete(ArchivedSubtaskModel.__table__).where(archived_subtasks.task_id == task_id))
+        self.db.execute(delete(ArchivedTaskModel.__table__).where(archived.id == task_id))
+        self._commit()
+        subtasks = [Subtask(id=r.id, title=r.title, completed=r.completed, task_id=r.task_id) for r in sorted(subtask_rows)]
+        task = self._row_to_task(row, subtasks)
+        # The task row was returned before its subtasks were counted back in.
+        task.subtask_total, task.subtask_completed = len(subtasks), sum(s.completed for s in subtasks)
+        return task
     
-    def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
-        db_task = self.db.query(TaskModel).filter(TaskModel.id == task_id, TaskModel.user_id == user_id).first()
-        if not db_task:
+    def get_categories(self, user_id: int) -> List[Category]:
+        rows = self.db.execute(
+            select(CategoryModel.id, CategoryModel.name).where(CategoryModel.user_id == user_id).order_by(CategoryModel.name)
+        )
+        return [Category(id=row.id, name=row.name) for row in rows]
+    
+    def create_category(self, user_id: int, name: str) -> Optional[Category]:
+        row = self.db.execute(
+            insert(CategoryModel).prefix_with("OR IGNORE").values(user_id=user_id, name=name).returning(CategoryModel.id, CategoryModel.name)
+        ).first()
+        if row is None:
+            return None
+        self._commit()
+        return Category(id=row.id, name=row.name)
+    
+    def delete_category(self, category_id: int, user_id: int) -> bool:
+        count = self.db.execute(delete(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.user_id == user_id)).rowcount
+        if not count:
             return False
-        
-        db_subtask = self.db.query(SubtaskModel).filter(SubtaskModel.id == subtask_id, SubtaskModel.task_id == task_id).first()
-        if db_subtask:
-            self.db.delete(db_subtask)
-            self.db.commit()
-            return True
-        return False
+        # Workspace tasks of other users may be filed under it too.
+        for model in (TaskModel, ArchivedTaskModel):
+            self.db.execute(
+                update(model)
+                .where(model.category_id == category_id)
+                .values(category_id=None)
+                .execution_options(synchronize_session=False)
+            )
+        self._commit()
+        return True
+    
+    def get_facets(self, user_id: int) -> TaskFacets:
+        # Each branch groups on the column after (user_id, workspace_id) in an index,
+        # so SQLite answers all three from the indexes without reading rows.
+        counts = union_all(*[
+            select(literal(facet), column, func.count()).where(_personal(user_id)).group_by(column)
+            for facet, column in (("category", TaskModel.category_id), ("priority", TaskModel.priority_id), ("completed", TaskModel.completed))
+        ])
+        grouped: Dict[str, Dict[Optional[int], int]] = {"category": {}, "priority": {}, "completed": {}}
+        for facet, value, count in self.db.execute(counts):
+            grouped[facet][value] = count
+        categories = [
+            Category(id=category.id, name=category.name, task_count=grouped["category"].get(category.id, 0))
+            for category in self.get_categories(user_id)
+        ]
+        return TaskFacets(
+            categories=categories,
+            uncategorized=grouped["category"].get(None, 0),
+            priorities={name: grouped["priority"].get(code, 0) for code, name in PRIORITY_NAMES.items()},
+            completed=grouped["completed"].get(1, 0),
+            open=grouped["completed"].get(0, 0),
+        )
+    
+    def close(self) -> None:
+        self.db.close()
+    
+    def _category_id(self, user_id: int, name: Optional[str]):
+        # Categories are created on first use; the task statement then looks
+        # the id up by name, so naming a category costs one extra statement.
+        if not name:
+            return None
+        self.db.execute(insert(CategoryModel).prefix_with("OR IGNORE").values(user_id=user_id, name=name))
+        return select(CategoryModel.id).where(CategoryModel.user_id == user_id, CategoryModel.name == name).scalar_subquery()
+    
+    def _materialize(self, user_id: int, now: datetime, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = 100) -> int:
+        # Recurring series keep only their latest completed occurrence and the
+        # open ones, so this lookup stays small however old the series are.
+        rows = self.db.execute(select(*TASK_COLUMNS).where(TaskModel.user_id == user_id, TaskModel.series_id.is_not(None))).all()
+        if not rows:
+            return 0
+        category_ids = {row.id: row.category_id for row in rows}
+        pending = pending_occurrences([self._row_to_task(row, []) for row in rows], now, start, end, limit)
+        if not pending:
+            return 0
+        created = self.db.execute(
+            insert(TaskModel).prefix_with("OR IGNORE").returning(TaskModel.id, TaskModel.series_id, TaskModel.occurrence),
+            [
+                {
+                    "title": latest.title,
+                    "completed": False,
+                    "deadline": due,
+                    "user_id": user_id,
+                    "priority_id": PRIORITY_IDS[latest.priority],
+                    "category_id": category_ids[latest.id],
+                    "created_at": now,
+                    "position": latest.position,
+                    "recurrence_frequency": latest.recurrence.frequency,
+                    "recurrence_interval": latest.recurrence.interval,
+                    "recurrence_start": latest.recurrence.start,
+                    "series_id": latest.series_id,
+                    "occurrence": index,
+                }
+                for latest, index, due in pending
+            ],
+        ).all()
+        # OR IGNORE skips occurrences another worker has just materialized.
+        sources = {(latest.series_id, index): latest.id for latest, index, _ in pending}
+        copies = [
+            select(SubtaskModel.title, false(), literal(row.id)).where(SubtaskModel.task_id == sources[(row.series_id, row.occurrence)])
+            for row in created
+        ]
+        if copies:
+            self.db.execute(insert(SubtaskModel).from_select(["title", "completed", "task_id"], union_all(*copies)))
+        self._commit()
+        return len(created)
+    
+    def _compact_series(self, series_id: int, user_id: int, occurrence: int):
+        # Completing an occurrence replaces the series' earlier completed ones.
+        compacted = select(TaskModel.id).where(
+            TaskModel.user_id == user_id, TaskModel.series_id == series_id, TaskModel.completed == True, TaskModel.occurrence < occurrence
+        )
+        self.db.execute(delete(SubtaskModel).where(SubtaskModel.task_id.in_(compacted)).execution_options(synchronize_session=False))
+        self.db.execute(delete(TaskModel).where(TaskModel.id.in_(compacted)).execution_options(synchronize_session=False))
+    
+    def _projected(self, where: tuple, order_by: tuple, projection: TaskProjection, limit: Optional[int] = None) -> List[Task]:
+        # Reads only the requested columns, and subtasks only when asked for,
+        # with one IN query for the whole page.
+        columns = [TaskModel.id, TaskModel.series_id] + [column for name in projection.fields for column in PROJECTED_COLUMNS[name]]
+        if projection.subtask_counts:
+            columns.extend((TaskModel.subtask_total, TaskModel.subtask_completed))
+        stmt = select(*columns).where(*where).order_by(*order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        tasks = []
+        for row in self.db.execute(stmt):
+            task = Task(id=row.id, series_id=row.series_id)
+            for name in projection.fields:
+                if name == "priority":
+                    task.priority = PRIORITY_NAMES[row.priority_id]
+                elif name == "recurrence":
+                    task.recurrence = _recurrence_of(row)
+                elif name not in ("id", "series_id"):
+                    setattr(task, name, getattr(row, name))
+            if projection.subtask_counts:
+                task.subtask_total, task.subtask_completed = row.subtask_total, row.subtask_completed
+            tasks.append(task)
+        if projection.subtasks and tasks:
+            by_id = {task.id: task for task in tasks}
+            rows = self.db.execute(select(*SUBTASK_COLUMNS).where(SubtaskModel.task_id.in_(list(by_id))).order_by(SubtaskModel.task_id, SubtaskModel.id))
+            for row in rows:
+                by_id[row.task_id].subtasks.append(Subtask(id=row.id, title=row.title, completed=row.completed, task_id=row.task_id))
+        return tasks
+    
+    def _owned_task_ids(self, task_id: int, user_id: int):
+        return select(TaskModel.id).where(TaskModel.id == task_id, _accessible(user_id))
+    
+    def _bulk_result(self, count: int, task_id: int, user_id: int) -> Optional[int]:
+        # Only an empty result needs a second look, to tell "nothing matched" from "not your task".
+        if count == 0 and self.db.execute(self._owned_task_ids(task_id, user_id)).first() is None:
+            return None
+        self._commit()
+        return count
+    
+    def _subtasks_of(self, task_id: int) -> List[Subtask]:
+        rows = self.db.execute(select(*SUBTASK_COLUMNS).where(SubtaskModel.task_id == task_id).order_by(SubtaskModel.id))
+        return [Subtask(id=row.id, title=row.title, completed=row.completed, task_id=row.task_id) for row in rows]
+    
+    def _row_to_task(self, row, subtasks: List[Subtask]) -> Task:
+        return Task(
+            id=row.id,
+            title=row.title,
+            completed=row.completed,
+            deadline=row.deadline,
+            user_id=row.user_id,
+            priority=PRIORITY_NAMES.get(row.priority_id, "medium"),
+            category=row.category,
+            created_at=row.created_at,
+            position=row.position,
+            subtasks=subtasks,
+            completed_at=row.completed_at,
+            recurrence=_recurrence_of(row),
+            series_id=row.series_id,
+            occurrence=row.occurrence or 0,
+            workspace_id=row.workspace_id,
+            subtask_total=row.subtask_total,
+            subtask_completed=row.subtask_completed,
+        )
     
-    def _task_to_domain(self, db_task: TaskModel) -> Task:
+    def _task_to_domain(self, db_task: TaskModel, category: Optional[str]) -> Task:
         subtasks = [Subtask(id=s.id, title=s.title, completed=s.completed, task_id=s.task_id) for s in db_task.subtasks]
         return Task(
             id=db_task.id,
@@ -123,24 +637,161 @@ class TaskRepository(ITaskRepository):
             completed=db_task.completed,
             deadline=db_task.deadline,
             user_id=db_task.user_id,
-            priority=db_task.priority,
-            category=db_task.category,
+            priority=PRIORITY_NAMES.get(db_task.priority_id, "medium"),
+            category=category,
             created_at=db_task.created_at,
             position=db_task.position,
-            subtasks=subtasks
+            subtasks=subtasks,
+            completed_at=db_task.completed_at,
+            recurrence=_recurrence_of(db_task),
+            series_id=db_task.series_id,
+            occurrence=db_task.occurrence or 0,
+            workspace_id=db_task.workspace_id,
+            subtask_total=db_task.subtask_total,
+            subtask_completed=db_task.subtask_completed,
         )
 
 
+class ShardedTaskRepository(ITaskRepository):
+    # Personal tasks live on their owner's shard; workspace tasks live in the
+    # main database next to the memberships, since members may sit on
+    # different shards. Calls by task id try the user's shard first.
+    def __init__(self, router: Optional[ShardRouter] = None):
+        self.router = router or shard_router
+        self._shards: Dict[Optional[int], TaskRepository] = {}
+    
+    def _repository(self, shard: Optional[int]) -> TaskRepository:
+        if shard not in self._shards:
+            self._shards[shard] = TaskRepository(SessionLocal() if shard is None else shard_sessions.session(shard))
+        return self._shards[shard]
+    
+    def _for_user(self, user_id: int) -> TaskRepository:
+        return self._repository(self.router.shard_for(user_id))
+    
+    def _shared(self) -> TaskRepository:
+        return self._repository(None)
+    
+    def _by_task(self, user_id: int, call):
+        result = call(self._for_user(user_id))
+        # `is` rather than `in`: a count of 0 is a found task, not a miss.
+        if (result is None or result is False) and self.router.shard_for(user_id) is not None:
+            return call(self._shared())
+        return result
+    
+    def create(self, title: str, user_id: int, deadline: Optional[datetime] = None, priority: str = "medium", category: Optional[str] = None, recurrence: Optional[Recurrence] = None, workspace_id: Optional[int] = None) -> Optional[Task]:
+        repository = self._for_user(user_id) if workspace_id is None else self._shared()
+        return repository.create(title, user_id, deadline, priority, category, recurrence, workspace_id)
+    
+    def get_by_id(self, task_id: int, user_id: int, projection: Optional[TaskProjection] = None) -> Optional[Task]:
+        return self._by_task(user_id, lambda repository: repository.get_by_id(task_id, user_id, projection))
+    
+    def get_all_by_user(self, user_id: int, workspace_id: Optional[int] = None, projection: Optional[TaskProjection] = None) -> List[Task]:
+        if workspace_id is not None:
+            return self._shared().get_all_by_user(user_id, workspace_id, projection)
+        return self._for_user(user_id).get_all_by_user(user_id, projection=projection)
+    
+    def get_visible(self, user_id: int, projection: Optional[TaskProjection] = None) -> List[Task]:
+        if self.router.shard_for(user_id) is None:
+            return self._shared().get_visible(user_id, projection)
+        return self._for_user(user_id).get_all_by_user(user_id, projection=projection) + self._shared().get_visible(user_id, projection)
+    
+    def update(self, task_id: int, user_id: int, title: Optional[str] = None, completed: Optional[bool] = None, deadline: Optional[datetime] = None, priority: Optional[str] = None, category: Optional[str] = None) -> Optional[Task]:
+        return self._by_task(user_id, lambda repository: repository.update(task_id, user_id, title, completed, deadline, priority, category))
+    
+    def delete(self, task_id: int, user_id: int) -> bool:
+        return self._by_task(user_id, lambda repository: repository.delete(task_id, user_id))
+    
+    def delete_completed(self, user_id: int) -> int:
+        return self._for_user(user_id).delete_completed(user_id)
+    
+    def update_positions(self, user_id: int, task_positions: List[tuple]) -> bool:
+        result = self._for_user(user_id).update_positions(user_id, task_positions)
+        if self.router.shard_for(user_id) is not None:
+            self._shared().update_positions(user_id, task_positions)
+        return result
+    
+    def add_subtask(self, task_id: int, user_id: int, title: str) -> Optional[Subtask]:
+        return self._by_task(user_id, lambda repository: repository.add_subtask(task_id, user_id, title))
+    
+    def toggle_subtask(self, subtask_id: int, task_id: int, user_id: int, completed: bool) -> Optional[Subtask]:
+        return self._by_task(user_id, lambda repository: repository.toggle_subtask(subtask_id, task_id, user_id, completed))
+    
+    def delete_subtask(self, subtask_id: int, task_id: int, user_id: int) -> bool:
+        return self._by_task(user_id, lambda repository: repository.delete_subtask(subtask_id, task_id, user_id))
+    
+    def add_subtasks(self, task_id: int, user_id: int, titles: List[str]) -> Optional[List[Subtask]]:
+        return self._by_task(user_id, lambda repository: repository.add_subtasks(task_id, user_id, titles))
+    
+    def set_subtasks_completed(self, task_id: int, user_id: int, completed: bool) -> Optional[int]:
+        return self._by_task(user_id, lambda repository: repository.set_subtasks_completed(task_id, user_id, completed))
+    
+    def delete_completed_subtasks(self, task_id: int, user_id: int) -> Optional[int]:
+        return self._by_task(user_id, lambda repository: repository.delete_completed_subtasks(task_id, user_id))
+    
+    def get_due(self, user_id: int, start: datetime, end: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self._for_user(user_id).get_due(user_id, start, end, limit, projection)
+    
+    def get_overdue(self, user_id: int, now: datetime, limit: int = 100, projection: Optional[TaskProjection] = None) -> List[Task]:
+        return self._for_user(user_id).get_overdue(user_id, now, limit, projection)
+    
+    def iter_tasks(self, user_id: int, chunk_size: int = 500) -> Iterator[Task]:
+        return self._for_user(user_id).iter_tasks(user_id, chunk_size)
+    
+    def import_tasks(self, user_id: int, tasks: List[Task]) -> int:
+        return self._for_user(user_id).import_tasks(user_id, tasks)
+    
+    def get_archived(self, user_id: int, offset: int = 0, limit: int = 50) -> List[Task]:
+        return self._for_user(user_id).get_archived(user_id, offset, limit)
+    
+    def restore_archived(self, task_id: int, user_id: int) -> Optional[Task]:
+        return self._for_user(user_id).restore_archived(task_id, user_id)
+    
+    def get_categories(self, user_id: int) -> List[Category]:
+        return self._for_user(user_id).get_categories(user_id)
+    
+    def create_category(self, user_id: int, name: str) -> Optional[Category]:
+        return self._for_user(user_id).create_category(user_id, name)
+    
+    def delete_category(self, category_id: int, user_id: int) -> bool:
+        return self._for_user(user_id).delete_category(category_id, user_id)
+    
+    def get_facets(self, user_id: int) -> TaskFacets:
+        return self._for_user(user_id).get_facets(user_id)
+    
+    @contextmanager
+    def transaction(self, user_id: int, allow_split: bool = False) -> Iterator[None]:
+        # Personal and workspace tasks of a sharded user sit in two files,
+        # which commit one after the other. Unless the caller allows that,
+        # writes to both roll back together instead.
+        with ExitStack() as stack:
+            personal = self._for_user(user_id)
+            stack.enter_context(personal.transaction(user_id))
+            if self.router.shard_for(user_id) is None:
+                yield
+                return
+            shared = self._shared()
+            stack.enter_context(shared.transaction(user_id))
+            before = personal.rows_written(), shared.rows_written()
+            yield
+            if not allow_split and personal.rows_written() != before[0] and shared.rows_written() != before[1]:
+                raise SplitTransactionError()
+    
+    def close(self) -> None:
+        for repository in self._shards.values():
+            repository.close()
+
+
 class UserRepository(IUserRepository):
-    def __init__(self):
-        self.db = SessionLocal()
+    def __init__(self, db: Optional[Session] = None):
+        self.db = db if db is not None else SessionLocal()
     
     def create(self, username: str, email: str, hashed_password: str) -> User:
         db_user = UserModel(username=username, email=email, hashed_password=hashed_password)
         self.db.add(db_user)
+        self.db.flush()
+        user = User(id=db_user.id, username=username, email=email, hashed_password=hashed_password)
         self.db.commit()
-        self.db.refresh(db_user)
-        return User(id=db_user.id, username=db_user.username, email=db_user.email, hashed_password=db_user.hashed_password)
+        return user
     
     def get_by_username(self, username: str) -> Optional[User]:
         db_user = self.db.query(UserModel).filter(UserModel.username == username).first()
@@ -159,3 +810,114 @@ class UserRepository(IUserRepository):
         if db_user:
             return User(id=db_user.id, username=db_user.username, email=db_user.email, hashed_password=db_user.hashed_password)
         return None
+    
+    def find_existing(self, usernames: List[str], emails: List[str]) -> List[User]:
+        rows = self.db.execute(
+            select(UserModel.id, UserModel.username, UserModel.email, UserModel.hashed_password)
+            .where(UserModel.username.in_(usernames) | UserModel.email.in_(emails))
+        )
+        return [User(id=row.id, username=row.username, email=row.email, hashed_password=row.hashed_password) for row in rows]
+    
+    def create_many(self, users: List[Tuple[str, str, str]]) -> List[User]:
+        created = self._insert_many(users)
+        self.db.commit()
+        return created
+    
+    def _insert_many(self, users: List[Tuple[str, str, str]]) -> List[User]:
+        # OR IGNORE lets the unique constraints drop rows that a concurrent
+        # registration claimed after the duplicate check; only inserted rows come back.
+        if not users:
+            return []
+        stmt = (
+            insert(UserModel)
+            .prefix_with("OR IGNORE")
+            .returning(UserModel.id, UserModel.username, UserModel.email, UserModel.hashed_password)
+        )
+        rows = self.db.execute(stmt, [{"username": u, "email": e, "hashed_password": h} for u, e, h in users])
+        return [User(id=row.id, username=row.username, email=row.email, hashed_password=row.hashed_password) for row in rows]
+    
+    def close(self) -> None:
+        self.db.close()
+
+
+class ShardedUserRepository(UserRepository):
+    def __init__(self, db: Optional[Session] = None, router: Optional[ShardRouter] = None):
+        super().__init__(db)
+        self.router = router or shard_router
+    
+    def create(self, username: str, email: str, hashed_password: str) -> User:
+        db_user = UserModel(username=username, email=email, hashed_password=hashed_password)
+        self.db.add(db_user)
+        self.db.flush()
+        self.router.assign(self.db, db_user.id)
+        user = User(id=db_user.id, username=username, email=email, hashed_password=hashed_password)
+        self.db.commit()
+        return user
+    
+    def create_many(self, users: List[Tuple[str, str, str]]) -> List[User]:
+        created = self._insert_many(users)
+        for user in created:
+            self.router.assign(self.db, user.id)
+        self.db.commit()
+        return created
+
+
+class WorkspaceRepository(IWorkspaceRepository):
+    # Workspaces and their tasks always live in the main database.
+    def __init__(self, db: Optional[Session] = None):
+        self.db = db if db is not None else SessionLocal()
+    
+    def create(self, name: str, owner_id: int) -> Workspace:
+        row = self.db.execute(
+            insert(WorkspaceModel).values(name=name, created_at=datetime.utcnow()).returning(WorkspaceModel.id, WorkspaceModel.created_at)
+        ).one()
+        self.db.execute(insert(WorkspaceMemberModel).values(user_id=owner_id, workspace_id=row.id, role="owner"))
+        self.db.commit()
+        return Workspace(id=row.id, name=name, role="owner", created_at=row.created_at)
+    
+    def get_for_user(self, user_id: int) -> List[Workspace]:
+        rows = self.db.execute(
+            select(WorkspaceModel.id, WorkspaceModel.name, WorkspaceModel.created_at, WorkspaceMemberModel.role)
+            .join(WorkspaceMemberModel, WorkspaceMemberModel.workspace_id == WorkspaceModel.id)
+            .where(WorkspaceMemberModel.user_id == user_id)
+            .order_by(WorkspaceModel.name, WorkspaceModel.id)
+        )
+        return [Workspace(id=row.id, name=row.name, role=row.role, created_at=row.created_at) for row in rows]
+    
+    def get_role(self, workspace_id: int, user_id: int) -> Optional[str]:
+        return self.db.execute(
+            select(WorkspaceMemberModel.role).where(WorkspaceMemberModel.user_id == user_id, WorkspaceMemberModel.workspace_id == workspace_id)
+        ).scalar()
+    
+    def get_members(self, workspace_id: int) -> List[WorkspaceMember]:
+        rows = self.db.execute(
+            select(WorkspaceMemberModel.user_id, UserModel.username, WorkspaceMemberModel.role)
+            .join(UserModel, UserModel.id == WorkspaceMemberModel.user_id)
+            .where(WorkspaceMemberModel.workspace_id == workspace_id)
+            .order_by(UserModel.username)
+        )
+        return [WorkspaceMember(user_id=row.user_id, username=row.username, role=row.role) for row in rows]
+    
+    def set_member(self, workspace_id: int, user_id: int, role: str) -> None:
+        self.db.execute(insert(WorkspaceMemberModel).prefix_with("OR REPLACE").values(user_id=user_id, workspace_id=workspace_id, role=role))
+        self.db.commit()
+    
+    def remove_member(self, workspace_id: int, user_id: int) -> bool:
+        count = self.db.execute(
+            delete(WorkspaceMemberModel).where(WorkspaceMemberModel.user_id == user_id, WorkspaceMemberModel.workspace_id == workspace_id)
+        ).rowcount
+        self.db.commit()
+        return bool(count)
+    
+    def delete(self, workspace_id: int) -> bool:
+        for tasks_model, subtasks_model in ((TaskModel, SubtaskModel), (ArchivedTaskModel, ArchivedSubtaskModel)):
+            task_ids = select(tasks_model.id).where(tasks_model.workspace_id == workspace_id)
+            self.db.execute(delete(subtasks_model).where(subtasks_model.task_id.in_(task_ids)).execution_options(synchronize_session=False))
+            self.db.execute(delete(tasks_model).where(tasks_model.workspace_id == workspace_id).execution_options(synchronize_session=False))
+        self.db.execute(delete(WorkspaceMemberModel).where(WorkspaceMemberModel.workspace_id == workspace_id))
+        count = self.db.execute(delete(WorkspaceModel).where(WorkspaceModel.id == workspace_id)).rowcount
+        self.db.commit()
+        return bool(count)
+    
+    def close(self) -> None:
+        self.db.close()
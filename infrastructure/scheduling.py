@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger("todolist.jobs")
+
+
+class PeriodicJob(ABC):
+    name = "job"
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.runs = 0
+        self.skipped = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, **options):
+        started = time.perf_counter()
+        try:
+            return self._run(**options)
+        finally:
+            self.runs += 1
+            self.last_run_at = datetime.utcnow()
+            self.last_run_ms = (time.perf_counter() - started) * 1000
+
+    def should_run(self) -> bool:
+        return True
+
+    def retry_seconds(self) -> float:
+        # Delay before asking should_run() again after it said no.
+        return self.interval_seconds
+
+    def start(self):
+        # Cleared even when no thread starts, so run_once() works after a restart.
+        self._stop.clear()
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "last_error": self.last_error,
+        }
+
+    @abstractmethod
+    def _run(self, **options):
+        pass
+
+    def _loop(self):
+        delay = self.interval_seconds
+        while not self._stop.wait(delay):
+            if not self.should_run():
+                self.skipped += 1
+                delay = self.retry_seconds()
+                continue
+            delay = self.interval_seconds
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as error:
+                self.last_error = repr(error)
+                logger.exception("%s run failed", self.name)
@@ -0,0 +1,112 @@
+import importlib.util
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+
+from .database import DATABASE_URL, SHARD_COUNT
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+# 0 sizes the pool from the CPU count and the storage backend.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+SQLITE_MAX_WORKERS = int(os.getenv("SQLITE_MAX_WORKERS", "4"))
+# Recycle a worker after this many requests (plus up to the jitter); 0 never recycles.
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+
+
+@dataclass
+class ServerConfig:
+    host: str
+    port: int
+    workers: int
+    workers_reason: str
+    loop: str
+    http: str
+    preload: bool
+    max_requests: int
+    max_requests_jitter: int
+    graceful_timeout: int
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def autotune_workers(cpu_count: int, database_url: str = DATABASE_URL, shard_count: int = SHARD_COUNT) -> Tuple[int, str]:
+    cpu_count = max(cpu_count, 1)
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return 2 * cpu_count + 1, "2 x CPUs + 1 for a client/server database"
+    if url.database in (None, "", ":memory:"):
+        return 1, "in-memory SQLite is private to one process"
+    if shard_count > 1:
+        return cpu_count, f"one per CPU; {shard_count} SQLite shards take writes in parallel"
+    # Every write queues on the file's single write lock, so workers beyond
+    # the CPU count (or the cap) only add busy-timeout waits.
+    workers = min(cpu_count, SQLITE_MAX_WORKERS)
+    return workers, f"one per CPU, at most SQLITE_MAX_WORKERS={SQLITE_MAX_WORKERS}; a single SQLite file has one writer"
+
+
+def resolve_server_config(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: Optional[int] = None,
+    preload: bool = True,
+    cpu_count: Optional[int] = None,
+) -> ServerConfig:
+    workers = workers or WEB_WORKERS
+    if workers:
+        workers_reason = "set explicitly"
+    else:
+        workers, workers_reason = autotune_workers(cpu_count or os.cpu_count() or 1)
+    return ServerConfig(
+        host=host or WEB_HOST,
+        port=port or WEB_PORT,
+        workers=workers,
+        workers_reason=workers_reason,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        preload=preload,
+        max_requests=WEB_MAX_REQUESTS,
+        max_requests_jitter=WEB_MAX_REQUESTS_JITTER,
+        graceful_timeout=WEB_GRACEFUL_TIMEOUT,
+    )
+
+
+def describe_server_config(config: ServerConfig) -> List[str]:
+    lines = [
+        f"listen:           {config.host}:{config.port}",
+        f"workers:          {config.workers} ({config.workers_reason})",
+        f"event loop:       {config.loop}",
+        f"http parser:      {config.http}",
+        f"preload app:      {'yes' if config.preload else 'no'}",
+        f"max requests:     {config.max_requests if config.max_requests and config.workers > 1 else 'unlimited'}"
+        + (f" (+ up to {config.max_requests_jitter})" if config.max_requests and config.workers > 1 and config.max_requests_jitter else ""),
+        f"graceful timeout: {config.graceful_timeout}s",
+        f"database:         {make_url(DATABASE_URL).render_as_string(hide_password=True)}"
+        + (f" ({SHARD_COUNT} shards)" if SHARD_COUNT > 1 else ""),
+    ]
+    if config.workers > 1:
+        lines.append(f"rolling restart:  kill -HUP {os.getpid()}")
+    return lines
+
+
+def uvicorn_options(config: ServerConfig) -> dict:
+    options = {
+        "host": config.host,
+        "port": config.port,
+        "workers": config.workers,
+        "loop": config.loop,
+        "http": config.http,
+        "timeout_graceful_shutdown": config.graceful_timeout,
+    }
+    # A lone worker that hits its request limit just exits, with no supervisor to replace it.
+    if config.max_requests and config.workers > 1:
+        options["limit_max_requests"] = config.max_requests
+        if config.max_requests_jitter:
+            options["limit_max_requests_jitter"] = config.max_requests_jitter
+    return options
@@ -0,0 +1,199 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .database import SHARD_COUNT, SessionLocal, engine, shard_sessions, sharding_enabled
+from .migrations import check_schema, upgrade
+from .orm_models import ArchivedSubtaskModel, ArchivedTaskModel, CategoryModel, SubtaskModel, TaskModel, UserModel, UserShardModel
+
+# Each shard hands out ids from its own range (main database ids stay below
+# the first range), so task, subtask and category ids are unique across all files.
+SHARD_ID_RANGE = 1 << 40
+SHARD_ROUTE_CACHE_SIZE = int(os.getenv("SHARD_ROUTE_CACHE_SIZE", "10000"))
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    # Jump consistent hash: growing from N to N+1 shards moves only ~1/(N+1) of users.
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * (1 << 31) / ((key >> 33) + 1))
+    return bucket
+
+
+class ShardRouter:
+    def __init__(self, shard_count: int = SHARD_COUNT, session_factory=SessionLocal, cache_size: int = SHARD_ROUTE_CACHE_SIZE):
+        self.shard_count = shard_count
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        # Least recently routed users are forgotten first.
+        self._routes: "OrderedDict[int, Optional[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def home_shard(self, user_id: int) -> int:
+        return jump_hash(user_id, self.shard_count)
+
+    def shard_for(self, user_id: int) -> Optional[int]:
+        # None means the user has not been moved out of the main database yet.
+        with self._lock:
+            if user_id in self._routes:
+                self._routes.move_to_end(user_id)
+                return self._routes[user_id]
+        with self.session_factory() as db:
+            shard = db.execute(select(UserShardModel.shard).where(UserShardModel.user_id == user_id)).scalar()
+        self._remember(user_id, shard)
+        return shard
+
+    def assign(self, db: Session, user_id: int) -> int:
+        shard = self.home_shard(user_id)
+        db.add(UserShardModel(user_id=user_id, shard=shard))
+        self._remember(user_id, shard)
+        return shard
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._routes.pop(user_id, None)
+
+    def _remember(self, user_id: int, shard: Optional[int]):
+        with self._lock:
+            self._routes[user_id] = shard
+            self._routes.move_to_end(user_id)
+            while len(self._routes) > self.cache_size:
+                self._routes.popitem(last=False)
+
+
+shard_router = ShardRouter()
+
+
+def seed_id_range(shard_engine: Engine, shard: int):
+    floor = (shard + 1) * SHARD_ID_RANGE
+    with shard_engine.begin() as connection:
+        for table in ("tasks", "subtasks", "categories"):
+            connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :t AND seq < :floor"), {"t": table, "floor": floor})
+            connection.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) SELECT :t, :floor WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :t)"),
+                {"t": table, "floor": floor},
+            )
+
+
+def migrate_storage(target: Optional[int] = None) -> Dict[str, list]:
+    applied = {"main": upgrade(engine, target)}
+    if sharding_enabled():
+        for shard, shard_engine in enumerate(shard_sessions.engines()):
+            applied[f"shard {shard}"] = upgrade(shard_engine, target)
+            seed_id_range(shard_engine, shard)
+    return applied
+
+
+def check_storage():
+    check_schema(engine)
+    if sharding_enabled():
+        for shard_engine in shard_sessions.engines():
+            check_schema(shard_engine)
+
+
+# Live and archived tasks move together; each pair is (tasks table, subtasks table).
+TASK_TABLES = ((TaskModel.__table__, SubtaskModel.__table__), (ArchivedTaskModel.__table__, ArchivedSubtaskModel.__table__))
+
+
+def _personal(tasks_table, user_id: int):
+    # Workspace tasks stay in the main database whichever shard their author is on.
+    return tasks_table.c.user_id == user_id, tasks_table.c.workspace_id.is_(None)
+
+
+def _copy_user_tasks(source: Session, target: Session, user_id: int) -> int:
+    _delete_user_tasks(target, user_id)
+    copied = 0
+    # Categories go first and keep their ids, which tasks refer to. The main
+    # database may still hold some for workspace tasks; tasks filed under a
+    # category of the same name are pointed at that one instead.
+    existing = dict(target.execute(select(CategoryModel.name, CategoryModel.id).where(CategoryModel.user_id == user_id)).all())
+    renamed = {}
+    categories = []
+    for row in source.execute(select(CategoryModel.__table__).where(CategoryModel.user_id == user_id)):
+        if row.name in existing:
+            renamed[row.id] = existing[row.name]
+        else:
+            categories.append(dict(row._mapping))
+    if categories:
+        target.execute(insert(CategoryModel.__table__), categories)
+    for tasks_table, subtasks_table in TASK_TABLES:
+        task_ids = select(tasks_table.c.id).where(*_personal(tasks_table, user_id))
+        tasks = [dict(row._mapping) for row in source.execute(select(tasks_table).where(*_personal(tasks_table, user_id)))]
+        subtasks = [dict(row._mapping) for row in source.execute(select(subtasks_table).where(subtasks_table.c.task_id.in_(task_ids)))]
+        tasks = [{**task, "category_id": renamed.get(task["category_id"], task["category_id"])} for task in tasks]
+        if tasks_table is TaskModel.__table__:
+            # The subtask triggers count the copied subtasks back in.
+            tasks = [{**task, "subtask_total": 0, "subtask_completed": 0} for task in tasks]
+        if tasks:
+            target.execute(insert(tasks_table), tasks)
+        if subtasks:
+            target.execute(insert(subtasks_table), subtasks)
+        copied += len(tasks)
+    return copied
+
+
+def _delete_user_tasks(db: Session, user_id: int):
+    for tasks_table, subtasks_table in TASK_TABLES:
+        task_ids = select(tasks_table.c.id).where(*_personal(tasks_table, user_id))
+        db.execute(delete(subtasks_table).where(subtasks_table.c.task_id.in_(task_ids)))
+        db.execute(delete(tasks_table).where(*_personal(tasks_table, user_id)))
+    # Workspace tasks stay in the main database, and so do their categories.
+    in_use = [
+        select(tasks_table.c.category_id).where(tasks_table.c.workspace_id.is_not(None), tasks_table.c.category_id.is_not(None))
+        for tasks_table, _ in TASK_TABLES
+    ]
+    db.execute(
+        delete(CategoryModel.__table__)
+        .where(CategoryModel.user_id == user_id, CategoryModel.id.not_in(in_use[0]), CategoryModel.id.not_in(in_use[1]))
+    )
+
+
+def rebalance_shards(shard_count: int = SHARD_COUNT) -> Dict[str, int]:
+    # Moves each user whose recorded shard differs from its home shard for
+    # `shard_count`. Users without a routing row live in the main database
+    # (unsharded mode); a shard count of 1 moves everyone back there. Each
+    # user is copied, re-routed and only then deleted at the source, so an
+    # interrupted run can simply be repeated. Run it while the API is stopped.
+    router = ShardRouter(shard_count)
+    for shard in range(shard_count if shard_count > 1 else 0):
+        upgrade(shard_sessions.engine(shard))
+        seed_id_range(shard_sessions.engine(shard), shard)
+
+    summary = {"users_checked": 0, "users_moved": 0, "tasks_moved": 0}
+    with SessionLocal() as directory:
+        routes = dict(directory.execute(select(UserShardModel.user_id, UserShardModel.shard)).all())
+        for user_id in directory.execute(select(UserModel.id)).scalars().all():
+            summary["users_checked"] += 1
+            current = routes.get(user_id)
+            target_shard = router.home_shard(user_id) if shard_count > 1 else None
+            if current == target_shard:
+                continue
+
+            source = SessionLocal() if current is None else shard_sessions.session(current)
+            target = SessionLocal() if target_shard is None else shard_sessions.session(target_shard)
+            try:
+                moved = _copy_user_tasks(source, target, user_id)
+                target.commit()
+
+                if target_shard is None:
+                    directory.execute(delete(UserShardModel).where(UserShardModel.user_id == user_id))
+                else:
+                    directory.merge(UserShardModel(user_id=user_id, shard=target_shard))
+                directory.commit()
+                shard_router.invalidate(user_id)
+
+                _delete_user_tasks(source, user_id)
+                source.commit()
+            finally:
+                source.close()
+                target.close()
+            summary["users_moved"] += 1
+            summary["tasks_moved"] += moved
+    return summary
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from .metrics import register_metrics
+
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "1") == "1"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "./data/shared_cache.db")
+SHARED_CACHE_TTL_SECONDS = float(os.getenv("SHARED_CACHE_TTL_SECONDS", "300"))
+
+# Expired entries and old invalidation records are swept at most this often.
+PURGE_INTERVAL_SECONDS = 60
+INVALIDATION_RETENTION_SECONDS = 600
+CLEAR_ALL = "*"
+
+logger = logging.getLogger("todolist.shared_cache")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    origin INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_cache_invalidations_key_id ON cache_invalidations (key, id);
+"""
+
+
+class SharedCache:
+    # A cache shared by every worker process on this machine, kept in a small
+    # SQLite file next to the data. Invalidations are also appended to a log
+    # that each process polls, so in-process caches layered on top can drop
+    # entries another worker has written to. Values must be JSON-serializable.
+    def __init__(self, path: str = SHARED_CACHE_PATH, ttl_seconds: float = SHARED_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._data_version: Optional[int] = None
+        self._last_seen = 0
+        self._last_purge = 0.0
+        self._listeners: List[Callable[[str], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.invalidations_sent = 0
+        self.invalidations_received = 0
+        self.errors = 0
+
+    def add_listener(self, listener: Callable[[str], None]):
+        # Called with each key invalidated by another process, or CLEAR_ALL.
+        self._listeners.append(listener)
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._execute(
+            lambda db: db.execute("SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        )
+        if row is not None:
+            try:
+                value = json.loads(row[0])
+            except ValueError:
+                # Left by a release that stored values in another format.
+                self.errors += 1
+                row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def version(self) -> int:
+        # Pass this to set() as `since` to refuse values loaded before a later invalidation.
+        return self._execute(lambda db: db.execute("SELECT coalesce(max(id), 0) FROM cache_invalidations").fetchone()[0]) or 0
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None, since: Optional[int] = None) -> bool:
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        payload = json.dumps(value, separators=(",", ":"))
+
+        def store(db: sqlite3.Connection) -> bool:
+            if since is None:
+                db.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)", (key, payload, expires_at))
+                return True
+            cursor = db.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) SELECT ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM cache_invalidations WHERE key IN (?, ?) AND id > ?)",
+                (key, payload, expires_at, key, CLEAR_ALL, since),
+            )
+            return cursor.rowcount > 0
+
+        stored = self._execute(store, write=True)
+        if stored:
+            self.sets += 1
+        return bool(stored)
+
+    def invalidate(self, key: str):
+        def drop(db: sqlite3.Connection):
+            if key == CLEAR_ALL:
+                db.execute("DELETE FROM cache_entries")
+            else:
+                db.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            db.execute("INSERT INTO cache_invalidations (key, origin, created_at) VALUES (?, ?, ?)", (key, os.getpid(), time.time()))
+
+        self._execute(drop, write=True)
+        self.invalidations_sent += 1
+
+    def clear(self):
+        self.invalidate(CLEAR_ALL)
+
+    def poll(self) -> List[str]:
+        # Cheap when nothing changed: PRAGMA data_version only moves after
+        # another connection commits to the file.
+        def changes(db: sqlite3.Connection) -> List[str]:
+            data_version = db.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            rows = db.execute("SELECT id, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id", (self._last_seen,)).fetchall()
+            if rows:
+                self._last_seen = rows[-1][0]
+            return [key for _, key, origin in rows if origin != os.getpid()]
+
+        keys = self._execute(changes) or []
+        self.invalidations_received += len(keys)
+        for key in keys:
+            for listener in self._listeners:
+                listener(key)
+        return keys
+
+    def purge(self) -> int:
+        now = time.time()
+
+        def sweep(db: sqlite3.Connection) -> int:
+            removed = db.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+            db.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (now - max(INVALIDATION_RETENTION_SECONDS, self.ttl_seconds),))
+            return removed
+
+        self._last_purge = time.monotonic()
+        return self._execute(sweep, write=True) or 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "invalidations_sent": self.invalidations_sent,
+            "invalidations_received": self.invalidations_received,
+            "errors": self.errors,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each process opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Safe against corruption in WAL mode. A power loss may drop the
+            # last invalidations, but `manage.py serve` empties the file on start.
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+            # Invalidations from before this process started cannot affect it.
+            self._last_seen = connection.execute("SELECT coalesce(max(id), 0) FROM cache_invalidations").fetchone()[0]
+            self._data_version = None
+        return self._connection
+
+    def _execute(self, operation: Callable[[sqlite3.Connection], Any], write: bool = False) -> Any:
+        # The cache is an optimisation: a locked or broken file turns into misses.
+        with self._lock:
+            try:
+                db = self._connect()
+                if not write:
+                    return operation(db)
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    result = operation(db)
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                self.errors += 1
+                logger.exception("shared cache operation failed")
+                return None
+        if time.monotonic() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+            self.purge()
+        return result
+
+
+shared_cache = SharedCache()
+register_metrics("shared_cache", shared_cache.stats)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+from urllib.parse import parse_qsl
+
+from .metrics import register_metrics
+
+# Empty turns recording off. Every worker appends to the same file.
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+TRACE_USER_BUCKETS = int(os.getenv("TRACE_USER_BUCKETS", "16"))
+TRACE_MAX_BODY_BYTES = 64 * 1024
+TRACE_FLUSH_RECORDS = 100
+
+# String values are kept only for these enumerated or paging fields; any
+# other string is replaced by its length, and ids by a placeholder naming
+# their kind.
+VOCABULARY_FIELDS = frozenset({"priority", "frequency", "op", "role", "format", "fields", "include", "limit", "offset"})
+# Only these are read as dates; a title such as "2024-01-01" is just text.
+# Nested fields are named after their parent.
+DATE_FIELDS = frozenset({"deadline", "completed_at", "from", "to", "recurrence.start"})
+
+
+def _is_id(key: Optional[str]) -> bool:
+    return key is not None and (key == "id" or key.endswith("_id"))
+
+
+def _as_offset(value: str, now: datetime) -> Optional[str]:
+    # Dates are kept relative to the request, so "due this week" replays as
+    # "due this week" whenever the trace is run.
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return f"@{round((moment - now).total_seconds())}"
+
+
+def anonymize(value: Any, now: datetime, key: Optional[str] = None, parent: Optional[str] = None) -> Any:
+    if isinstance(value, dict):
+        # Numeric keys are ids too (task positions); they become #0, #1, ...
+        numbered = iter(range(len(value)))
+        return {(f"#{next(numbered)}" if k.isdigit() else k): anonymize(v, now, k, key) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item, now, key, parent) for item in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    # Query strings carry ids as digits; anywhere else digits are content.
+    if _is_id(key) and (isinstance(value, (int, float)) or value.isdigit()):
+        return f"#{key}"
+    if isinstance(value, (int, float)):
+        return value
+    if key in VOCABULARY_FIELDS or value in ("true", "false"):
+        return value
+    if key in DATE_FIELDS or f"{parent}.{key}" in DATE_FIELDS:
+        return _as_offset(value, now) or f"~{len(value)}"
+    return f"~{len(value)}"
+
+
+def _content_kind(content_type: str) -> Optional[str]:
+    for marker, kind in (("json", "json"), ("x-www-form-urlencoded", "form"), ("multipart/", "multipart")):
+        if marker in content_type:
+            return kind
+    return None
+
+
+class TraceRecorder:
+    # Appends one compact JSON line per sampled API request: start time (t),
+    # method (m), route template (r), anonymized query (q) and JSON body (b),
+    # body bytes (n), content kind (c), status (s), duration in ms (d) and
+    # the caller's user bucket (u). Lines are buffered and written in one
+    # append each, so several workers can share the file.
+    def __init__(self, path: str = TRACE_PATH, sample_rate: float = TRACE_SAMPLE_RATE, buckets: int = TRACE_USER_BUCKETS):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buckets = buckets
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        # Keeps appends in order when flushes overlap.
+        self._write_lock = threading.Lock()
+        self.recorded = 0
+        self.flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def user_bucket(self, username: Optional[str]) -> Optional[int]:
+        if username is None:
+            return None
+        return int.from_bytes(hashlib.sha256(username.encode()).digest()[:8], "big") % self.buckets
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        query_string: bytes,
+        content_type: str,
+        body: Optional[bytes],
+        body_bytes: int,
+        status: int,
+        started_at: float,
+        duration_ms: float,
+        username: Optional[str],
+    ):
+        now = datetime.utcfromtimestamp(started_at)
+        entry = {"t": round(started_at, 3), "m": method, "r": route}
+        query = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+        if query:
+            entry["q"] = anonymize(dict(query), now)
+        kind = _content_kind(content_type)
+        if kind is not None:
+            entry["c"] = kind
+        # Credentials never leave the request, not even their shape.
+        if kind == "json" and body and not route.startswith("/api/auth/"):
+            try:
+                entry["b"] = anonymize(json.loads(body), now)
+            except ValueError:
+                pass
+        entry.update({"n": body_bytes, "s": status, "d": round(duration_ms, 3), "u": self.user_bucket(username)})
+        self.record(entry)
+
+    def record(self, entry: dict):
+        with self._lock:
+            self._buffer.append(json.dumps(entry, separators=(",", ":")))
+            self.recorded += 1
+            full = len(self._buffer) >= TRACE_FLUSH_RECORDS
+        if full:
+            # Requests are recorded on the event loop; the file write is not.
+            threading.Thread(target=self.flush, name="trace-flush", daemon=True).start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            data = ("\n".join(lines) + "\n").encode()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self.flushes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "path": self.path or None,
+                "sample_rate": self.sample_rate,
+                "recorded": self.recorded,
+                "buffered": len(self._buffer),
+                "flushes": self.flushes,
+            }
+
+
+def read_trace(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as source:
+        entries = [json.loads(line) for line in source if line.strip()]
+    return sorted(entries, key=lambda entry: entry["t"])
+
+
+trace_recorder = TraceRecorder()
+register_metrics("tracing", trace_recorder.stats)
@@ -1,16 +1,57 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from presentation.routers import router as task_router
 from presentation.auth_routers import router as auth_router
-from infrastructure.database import Base, engine
+from presentation.admin_routers import router as admin_router
+from presentation.workspace_routers import router as workspace_router
+from presentation.middleware import AdmissionControlMiddleware, RequestDiagnosticsMiddleware, TraceRecordingMiddleware
+from application.read_model import task_read_model
+from infrastructure.archiving import archive_worker
+from infrastructure.maintenance import maintenance_worker
+from infrastructure.memory import install_session_tracking, memory_sampler
+from infrastructure.migrations import AUTO_MIGRATE
+from infrastructure.sharding import check_storage, migrate_storage
+from infrastructure.profiling import install_request_diagnostics
+from infrastructure.rate_limiting import admission_controller
+from infrastructure.tracing import trace_recorder
 
-Base.metadata.create_all(bind=engine)
+install_request_diagnostics()
+install_session_tracking()
+archive_worker.add_listener(task_read_model.invalidate)
+maintenance_worker.idle_seconds = admission_controller.idle_seconds
 
-app = FastAPI(title="TodoList API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        migrate_storage()
+    check_storage()
+    # Only this worker's memory: the shared file is emptied once by
+    # `manage.py serve`, not again by every worker that starts or restarts.
+    task_read_model.clear(shared=False)
+    archive_worker.start()
+    maintenance_worker.start()
+    memory_sampler.start()
+    yield
+    memory_sampler.stop()
+    maintenance_worker.stop()
+    archive_worker.stop()
+    if trace_recorder.enabled:
+        trace_recorder.flush()
+
+
+app = FastAPI(title="TodoList API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(RequestDiagnosticsMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+if trace_recorder.enabled:
+    app.add_middleware(TraceRecordingMiddleware)
 
 app.include_router(auth_router)
 app.include_router(task_router)
+app.include_router(admin_router)
+app.include_router(workspace_router)
 
 app.mount("/static", StaticFiles(directory="presentation/static"), name="static")
 
@@ -0,0 +1,160 @@
+import argparse
+import csv
+import json
+import sys
+
+from pydantic import ValidationError
+
+from application.read_model import task_read_model
+from application.schemas import UserCreate
+from application.services import AuthService
+from infrastructure.archiving import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ArchiveWorker
+from infrastructure.database import SHARD_COUNT, engine, sharding_enabled, storage_engines
+from infrastructure.maintenance import MaintenanceWorker, enable_incremental_vacuum, repair_subtask_counts
+from infrastructure.migrations import AUTO_MIGRATE, LATEST_VERSION, get_schema_version
+from infrastructure.repositories import ShardedUserRepository, UserRepository
+from infrastructure.server import describe_server_config, resolve_server_config, uvicorn_options
+from infrastructure.shared_cache import SHARED_CACHE_ENABLED, shared_cache
+from infrastructure.sharding import migrate_storage, rebalance_shards
+
+
+def migrate(args):
+    for database, applied in migrate_storage(target=args.target).items():
+        if applied:
+            print(f"{database}: applied migrations {', '.join(map(str, applied))}")
+        else:
+            print(f"{database}: schema is up to date")
+
+
+def schema_version(args):
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    print(f"Schema version: {version} (latest: {LATEST_VERSION})")
+    return 0 if version == LATEST_VERSION else 1
+
+
+def rebalance(args):
+    summary = rebalance_shards(args.shards)
+    task_read_model.clear()
+    print(f"Checked {summary['users_checked']} users, moved {summary['users_moved']} users "
+          f"and {summary['tasks_moved']} tasks across {args.shards} shards")
+
+
+def archive(args):
+    worker = ArchiveWorker(after_days=args.after_days, batch_size=args.batch_size)
+    worker.add_listener(task_read_model.invalidate)
+    archived = worker.run_once()
+    print(f"Archived {archived} tasks completed more than {args.after_days:g} days ago")
+
+
+def maintenance(args):
+    if args.enable_incremental_vacuum:
+        for storage_engine in storage_engines():
+            reclaimed = enable_incremental_vacuum(storage_engine)
+            print(f"{storage_engine.url.database}: incremental vacuum enabled, reclaimed {reclaimed} bytes")
+    integrity = None if args.integrity == "none" else args.integrity
+    reports = MaintenanceWorker(integrity_hours=0).run_once(analyze=args.analyze, integrity=integrity)
+    failed = False
+    for report in reports:
+        print(json.dumps(report))
+        failed = failed or report.get("integrity", "ok") != "ok"
+    return 1 if failed else 0
+
+
+def repair_counts(args):
+    for storage_engine in storage_engines():
+        report = repair_subtask_counts(storage_engine)
+        print(json.dumps(report))
+    task_read_model.clear()
+
+
+def provision_users(args):
+    with (sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")) as source:
+        try:
+            users = [UserCreate(**row) for row in csv.DictReader(source)]
+        except (TypeError, ValidationError) as error:
+            print(f"Invalid user list: {error}", file=sys.stderr)
+            return 2
+    repository = ShardedUserRepository() if sharding_enabled() else UserRepository()
+    try:
+        result = AuthService(repository).provision_users(users)
+    finally:
+        repository.close()
+    for user in result.created:
+        print(f"created {user.username} <{user.email}> (id {user.id})")
+    for user in result.skipped:
+        print(f"skipped {user.username} <{user.email}>: {user.reason}")
+    print(f"Created {len(result.created)} users, skipped {len(result.skipped)}")
+
+
+def serve(args):
+    import uvicorn
+
+    config = resolve_server_config(host=args.host, port=args.port, workers=args.workers, preload=not args.no_preload)
+    if AUTO_MIGRATE:
+        # Migrate once here instead of in every worker at the same time.
+        migrate_storage()
+    if SHARED_CACHE_ENABLED:
+        # Entries left from before this start may predate restores or offline
+        # commands that wrote to the database directly.
+        shared_cache.clear()
+    app = "main:app"
+    if config.preload:
+        # Import errors surface once, before any worker starts; a single
+        # worker then serves this already-imported app.
+        from main import app as loaded_app
+        if config.workers == 1:
+            app = loaded_app
+    print("Starting TodoList API")
+    for line in describe_server_config(config):
+        print(f"  {line}")
+    sys.stdout.flush()
+    uvicorn.run(app, **uvicorn_options(config))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TodoList management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="apply pending schema migrations to every database file")
+    migrate_parser.add_argument("--target", type=int, default=None, help="stop at this schema version")
+    migrate_parser.set_defaults(handler=migrate)
+
+    version_parser = commands.add_parser("schema-version", help="show the current schema version")
+    version_parser.set_defaults(handler=schema_version)
+
+    rebalance_parser = commands.add_parser("rebalance-shards", help="move users to their home shard (run with the API stopped)")
+    rebalance_parser.add_argument("--shards", type=int, default=SHARD_COUNT, help="target shard count (default: SHARD_COUNT)")
+    rebalance_parser.set_defaults(handler=rebalance)
+
+    archive_parser = commands.add_parser("archive", help="move old completed tasks to the archive tables once")
+    archive_parser.add_argument("--after-days", type=float, default=ARCHIVE_AFTER_DAYS, help="archive tasks completed this many days ago (default: ARCHIVE_AFTER_DAYS)")
+    archive_parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="tasks moved per transaction (default: ARCHIVE_BATCH_SIZE)")
+    archive_parser.set_defaults(handler=archive)
+
+    maintenance_parser = commands.add_parser("maintenance", help="analyze, vacuum, checkpoint and check every database file once")
+    maintenance_parser.add_argument("--analyze", action="store_true", help="run a full ANALYZE instead of PRAGMA optimize")
+    maintenance_parser.add_argument("--integrity", choices=("none", "quick", "full"), default="quick", help="integrity check to run (default: quick)")
+    maintenance_parser.add_argument("--enable-incremental-vacuum", action="store_true", help="switch files to auto_vacuum=INCREMENTAL with a one-off full VACUUM (run with the API stopped)")
+    maintenance_parser.set_defaults(handler=maintenance)
+
+    repair_parser = commands.add_parser("repair-subtask-counts", help="recompute the stored subtask counters of every task from its subtasks")
+    repair_parser.set_defaults(handler=repair_counts)
+
+    provision_parser = commands.add_parser("provision-users", help="create users from a CSV file with username,email,password columns")
+    provision_parser.add_argument("file", help="CSV file to read, or - for stdin")
+    provision_parser.set_defaults(handler=provision_users)
+
+    serve_parser = commands.add_parser("serve", help="run the API with a worker pool sized for this machine and storage backend")
+    serve_parser.add_argument("--host", default=None, help="bind address (default: WEB_HOST or 0.0.0.0)")
+    serve_parser.add_argument("--port", type=int, default=None, help="bind port (default: WEB_PORT or 8000)")
+    serve_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: WEB_WORKERS, or autotuned)")
+    serve_parser.add_argument("--no-preload", action="store_true", help="skip importing the app in the supervisor before starting workers")
+    serve_parser.set_defaults(handler=serve)
+
+    args = parser.parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
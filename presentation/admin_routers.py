@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import JSONResponse
+from application.schemas import ProvisionResult, UserProvisionBatch
+from application.services import AuthService
+from infrastructure.memory import allocation_tracker, memory_report, memory_sampler
+from infrastructure.metrics import metrics_snapshot
+from infrastructure.profiling import TimedRoute
+from .dependencies import get_auth_service, is_admin
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], route_class=TimedRoute)
+
+
+@router.get("/metrics")
+def get_metrics(admin: bool = Depends(is_admin)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    return metrics_snapshot()
+
+
+# Memory diagnostics describe the worker process that answers the request;
+# the pid in each answer tells workers apart.
+@router.get("/memory")
+def get_memory(admin: bool = Depends(is_admin)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    return memory_report()
+
+
+@router.get("/memory/series")
+def get_memory_series(limit: int = Query(100, ge=1, le=10000), admin: bool = Depends(is_admin)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    return list(memory_sampler.samples)[-limit:]
+
+
+@router.post("/memory/snapshots")
+def take_memory_snapshot(top: int = Query(20, ge=1, le=200), admin: bool = Depends(is_admin)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    return allocation_tracker.snapshot(top)
+
+
+@router.delete("/memory/snapshots", status_code=204)
+def stop_memory_snapshots(admin: bool = Depends(is_admin)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    allocation_tracker.stop()
+    return Response(status_code=204)
+
+
+@router.post("/users", response_model=ProvisionResult)
+def provision_users(batch: UserProvisionBatch, admin: bool = Depends(is_admin), auth_service: AuthService = Depends(get_auth_service)):
+    if not admin:
+        return JSONResponse(status_code=403, content={"detail": "Admin token required"})
+    
+    return auth_service.provision_users(batch.users)
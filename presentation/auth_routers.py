@@ -1,15 +1,33 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
 from application.services import AuthService
 from application.schemas import UserCreate, UserResponse, Token
+from infrastructure.profiling import TimedRoute
+from infrastructure.rate_limiting import admission_controller
 from .dependencies import get_auth_service
+from .middleware import reject_response
+
+router = APIRouter(prefix="/api/auth", tags=["authentication"], route_class=TimedRoute)
+
 
-router = APIRouter(prefix="/api/auth", tags=["authentication"])
+def _rate_limited(request: Request, username: str) -> Optional[JSONResponse]:
+    # Each username behind an address gets its own budget, and the address a
+    # wider one on top, so cycling through usernames doesn't reset the limit.
+    client_host = request.client.host if request.client else "unknown"
+    retry_after = admission_controller.check_rate("auth_address", f"ip:{client_host}") or admission_controller.check_rate("auth", f"ip:{client_host}:user:{username.lower()}")
+    if retry_after:
+        return reject_response(429, "Rate limit exceeded", retry_after)
+    return None
 
 
 @router.post("/register", status_code=201)
-def register(user_data: UserCreate, auth_service: AuthService = Depends(get_auth_service)):
+def register(request: Request, user_data: UserCreate, auth_service: AuthService = Depends(get_auth_service)):
+    limited = _rate_limited(request, user_data.username)
+    if limited is not None:
+        return limited
     user = auth_service.register_user(user_data)
     if user is None:
         return JSONResponse(status_code=400, content={"detail": "Username or email already exists"})
@@ -17,7 +35,10 @@ def register(user_data: UserCreate, auth_service: AuthService = Depends(get_auth
 
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), auth_service: AuthService = Depends(get_auth_service)):
+def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), auth_service: AuthService = Depends(get_auth_service)):
+    limited = _rate_limited(request, form_data.username)
+    if limited is not None:
+        return limited
     user = auth_service.authenticate_user(form_data.username, form_data.password)
     if not user:
         return JSONResponse(status_code=401, content={"detail": "Incorrect username or password"})
@@ -1,28 +1,58 @@
-from fastapi import Depends, status
+from fastapi import Depends, Header, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
-from application.services import TaskService, AuthService
-from infrastructure.repositories import TaskRepository, UserRepository
-from infrastructure.auth import decode_access_token
-from typing import Optional
+from application.services import TaskService, AuthService, WorkspaceService
+from application.read_model import READ_MODEL_ENABLED, USER_CACHE_TTL_SECONDS, CachedTaskRepository, CachedUserRepository
+from application.write_coalescing import write_coalescer
+from infrastructure.database import sharding_enabled
+from infrastructure.repositories import TaskRepository, UserRepository, ShardedTaskRepository, ShardedUserRepository, WorkspaceRepository
+from infrastructure.auth import decode_access_token, is_admin_token
+from infrastructure.shared_cache import SHARED_CACHE_ENABLED
+from typing import Iterator, Optional
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def get_task_service() -> TaskService:
-    repository = TaskRepository()
-    return TaskService(repository)
+def get_task_service() -> Iterator[TaskService]:
+    repository = ShardedTaskRepository() if sharding_enabled() else TaskRepository()
+    if READ_MODEL_ENABLED:
+        repository = CachedTaskRepository(repository)
+    try:
+        yield TaskService(repository, write_coalescer if write_coalescer.enabled else None)
+    finally:
+        repository.close()
 
 
-def get_auth_service() -> AuthService:
-    repository = UserRepository()
-    return AuthService(repository)
+def get_auth_service() -> Iterator[AuthService]:
+    repository = ShardedUserRepository() if sharding_enabled() else UserRepository()
+    if SHARED_CACHE_ENABLED and USER_CACHE_TTL_SECONDS > 0:
+        repository = CachedUserRepository(repository)
+    try:
+        yield AuthService(repository)
+    finally:
+        repository.close()
 
 
-def get_current_user_or_none(token: str = Depends(oauth2_scheme), auth_service: AuthService = Depends(get_auth_service)):
-    username = decode_access_token(token)
+def get_workspace_service() -> Iterator[WorkspaceService]:
+    repository = WorkspaceRepository()
+    user_repository = ShardedUserRepository() if sharding_enabled() else UserRepository()
+    try:
+        yield WorkspaceService(repository, user_repository)
+    finally:
+        repository.close()
+        user_repository.close()
+
+
+def get_current_user_or_none(request: Request, token: str = Depends(oauth2_scheme), auth_service: AuthService = Depends(get_auth_service)):
+    # AdmissionControlMiddleware has usually decoded the token already.
+    state = request.scope.get("state", {})
+    username = state["token_subject"] if "token_subject" in state else decode_access_token(token)
     if username is None:
         return None
     
     user = auth_service.get_user_by_username(username)
     return user
+
+
+def is_admin(x_admin_token: Optional[str] = Header(default=None)) -> bool:
+    return is_admin_token(x_admin_token)
@@ -0,0 +1,201 @@
+import json
+import logging
+import math
+import time
+
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from infrastructure.auth import decode_access_token, is_admin_token
+from infrastructure.profiling import (
+    PROFILE_REQUESTS,
+    SLOW_REQUEST_MS,
+    RequestStats,
+    SamplingProfiler,
+    current_request_stats,
+)
+from infrastructure.rate_limiting import SHED_RETRY_AFTER_SECONDS, AdmissionController, admission_controller
+from infrastructure.tracing import TRACE_MAX_BODY_BYTES, TraceRecorder, trace_recorder
+
+slow_request_logger = logging.getLogger("todolist.slow_requests")
+
+
+def reject_response(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RequestDiagnosticsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                stats.response_started()
+            await send(message)
+
+        profiler = SamplingProfiler() if self._profiling_requested(scope) else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", scope["path"])
+            title = f"{scope['method']} {route_path}"
+            if profiler is not None:
+                # Joining the sampler and writing the report block; keep them off the event loop.
+                report_path = await run_in_threadpool(self._finish_profile, profiler, title)
+                slow_request_logger.info("profile for %s saved to %s", title, report_path)
+            self._log_if_slow(scope["method"], route_path, status_code, stats)
+
+    def _finish_profile(self, profiler: SamplingProfiler, title: str) -> str:
+        profiler.stop()
+        return profiler.save(title)
+
+    def _profiling_requested(self, scope) -> bool:
+        if PROFILE_REQUESTS:
+            return True
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") != b"1":
+            return False
+        return is_admin_token(headers.get(b"x-admin-token", b"").decode("latin-1"))
+
+    def _log_if_slow(self, method: str, route_path: str, status_code: int, stats: RequestStats):
+        total_ms = stats.elapsed_ms()
+        if total_ms < SLOW_REQUEST_MS:
+            return
+        slow_request_logger.warning(
+            "slow request %s",
+            json.dumps({
+                "method": method,
+                "route": route_path,
+                "status": status_code,
+                "total_ms": round(total_ms, 3),
+                "sql_count": stats.sql_count,
+                "sql_ms": round(stats.sql_ms, 3),
+                "slowest_sql": stats.slowest_statements(),
+                "serialization_ms": round(stats.serialization_ms, 3),
+            }),
+        )
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        if not self.controller.try_enter():
+            response = reject_response(503, "Server is overloaded, retry later", SHED_RETRY_AFTER_SECONDS)
+            await response(scope, receive, send)
+            return
+        try:
+            budget, principal = self._classify(scope)
+            # Auth endpoints check their budget themselves, once the username is parsed.
+            retry_after = self.controller.check_rate(budget, principal) if budget != "auth" else 0
+            if retry_after:
+                response = reject_response(429, "Rate limit exceeded", retry_after)
+                await response(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave()
+
+    def _classify(self, scope):
+        client = scope.get("client")
+        client_host = client[0] if client else "unknown"
+        if scope["path"].startswith("/api/auth/"):
+            return "auth", f"ip:{client_host}"
+
+        budget = "read" if scope["method"] in ("GET", "HEAD", "OPTIONS") else "write"
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            username = decode_access_token(token)
+            # Handed on to get_current_user_or_none and the trace recorder.
+            scope.setdefault("state", {})["token_subject"] = username
+            if username is not None:
+                return budget, f"user:{username}"
+        return budget, f"ip:{client_host}"
+
+
+class TraceRecordingMiddleware:
+    # Outermost, so the trace also has the requests admission control turned away.
+    def __init__(self, app, recorder: TraceRecorder = trace_recorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or not self.recorder.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.time()
+        started = time.perf_counter()
+        chunks = []
+        body_bytes = 0
+        status_code = 500
+
+        async def receive_wrapper():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_bytes += len(chunk)
+                if body_bytes <= TRACE_MAX_BODY_BYTES:
+                    chunks.append(chunk)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Paths that matched no route carry nothing worth replaying.
+            if route is not None:
+                headers = dict(scope["headers"])
+                self.recorder.record_request(
+                    scope["method"],
+                    route.path,
+                    scope.get("query_string", b""),
+                    headers.get(b"content-type", b"").decode("latin-1"),
+                    b"".join(chunks) if body_bytes <= TRACE_MAX_BODY_BYTES else None,
+                    body_bytes,
+                    status_code,
+                    started_at,
+                    (time.perf_counter() - started) * 1000,
+                    self._username(scope, headers),
+                )
+
+    def _username(self, scope, headers: dict):
+        state = scope.get("state", {})
+        if "token_subject" in state:
+            return state["token_subject"]
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        return decode_access_token(token)
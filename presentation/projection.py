@@ -0,0 +1,45 @@
+from fastapi import Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from application.schemas import TaskResponse
+from domain.models import Task, TaskProjection
+from typing import List, Optional
+
+TASK_FIELDS = ("id", "title", "completed", "deadline", "priority", "category", "created_at", "position", "completed_at", "recurrence", "series_id", "workspace_id")
+TASK_INCLUDES = ("subtasks", "subtask_counts")
+
+
+def _list_pattern(names) -> str:
+    name = "(" + "|".join(names) + ")"
+    return f"^{name}(,{name})*$"
+
+
+def get_task_projection(
+    fields: Optional[str] = Query(None, pattern=_list_pattern(TASK_FIELDS)),
+    include: Optional[str] = Query(None, pattern=_list_pattern(TASK_INCLUDES)),
+) -> Optional[TaskProjection]:
+    # Without either parameter the endpoints keep returning full tasks with
+    # their subtasks. Once one is given, subtasks are only read and returned
+    # when asked for, and "id" is always part of the answer.
+    if fields is None and include is None:
+        return None
+    names = TASK_FIELDS if fields is None else tuple(dict.fromkeys(["id"] + fields.split(",")))
+    includes = set(include.split(",")) if include else set()
+    return TaskProjection(fields=names, subtasks="subtasks" in includes, subtask_counts="subtask_counts" in includes)
+
+
+def _content(task: Task, projection: TaskProjection) -> dict:
+    keys = set(projection.fields)
+    if projection.subtasks:
+        keys.add("subtasks")
+    if projection.subtask_counts:
+        keys.update(("subtask_total", "subtask_completed"))
+    return TaskResponse.model_validate(task, from_attributes=True).model_dump(include=keys)
+
+
+def render_task(task: Task, projection: TaskProjection) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder(_content(task, projection)))
+
+
+def render_tasks(tasks: List[Task], projection: TaskProjection) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder([_content(task, projection) for task in tasks]))
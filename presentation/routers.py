@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, Response
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from application.services import TaskService
-from application.schemas import TaskCreate, TaskUpdate, TaskResponse, SubtaskCreate, SubtaskResponse, TaskPositionUpdate
-from domain.models import User
+from application.task_transfer import EXPORT_FORMATS
+from application.schemas import ArchivedTaskResponse, CategoryCreate, CategoryResponse, ImportSummary, TaskFacetsResponse, TaskCreate, TaskUpdate, TaskResponse, SubtaskCreate, SubtaskResponse, SubtaskBulkCreate, SubtaskBulkToggle, TaskPositionUpdate, TaskOperationBatch, TaskOperationResult
+from domain.exceptions import BatchOperationError, SplitTransactionError
+from domain.models import TaskProjection, User
+from infrastructure.profiling import TimedRoute
 from .dependencies import get_task_service, get_current_user_or_none
+from .projection import get_task_projection, render_task, render_tasks
+from datetime import datetime
 from typing import List, Optional
 
 
-router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+router = APIRouter(prefix="/api/tasks", tags=["tasks"], route_class=TimedRoute)
 
 
 @router.post("/", response_model=TaskResponse, status_code=201)
@@ -19,23 +24,144 @@ def create_task(task: TaskCreate, current_user: Optional[User] = Depends(get_cur
     return result
 
 
+@router.post("/ops", response_model=List[TaskOperationResult], response_model_exclude_none=True)
+def apply_task_operations(batch: TaskOperationBatch, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    try:
+        return service.apply_operations(current_user.id, batch.operations)
+    except BatchOperationError as error:
+        return JSONResponse(status_code=404, content={"detail": str(error), "index": error.index})
+    except SplitTransactionError as error:
+        return JSONResponse(status_code=400, content={"detail": str(error)})
+
+
 @router.get("/", response_model=List[TaskResponse])
-def get_all_tasks(current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+def get_all_tasks(projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    tasks = service.get_all_tasks(current_user.id, projection=projection)
+    return tasks if projection is None else render_tasks(tasks, projection)
+
+
+@router.get("/visible", response_model=List[TaskResponse])
+def get_visible_tasks(projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    tasks = service.get_visible_tasks(current_user.id, projection)
+    return tasks if projection is None else render_tasks(tasks, projection)
+
+
+@router.get("/export")
+def export_tasks(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
     if current_user is None:
         return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
     
-    return service.get_all_tasks(current_user.id)
+    return StreamingResponse(
+        service.export_tasks(current_user.id, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'}
+    )
+
+
+@router.post("/import", response_model=ImportSummary)
+def import_tasks(file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    if format is None:
+        format = "csv" if (file.filename or "").lower().endswith(".csv") else "ndjson"
+    return service.import_tasks(current_user.id, file.file, format)
+
+
+@router.get("/due", response_model=List[TaskResponse])
+def get_due_tasks(start: datetime = Query(..., alias="from"), end: datetime = Query(..., alias="to"), limit: int = Query(100, ge=1, le=500), projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    if end <= start:
+        return JSONResponse(status_code=400, content={"detail": "'to' must be after 'from'"})
+    
+    tasks = service.get_due_tasks(current_user.id, start, end, limit, projection)
+    return tasks if projection is None else render_tasks(tasks, projection)
+
+
+@router.get("/overdue", response_model=List[TaskResponse])
+def get_overdue_tasks(limit: int = Query(100, ge=1, le=500), projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    tasks = service.get_overdue_tasks(current_user.id, limit, projection)
+    return tasks if projection is None else render_tasks(tasks, projection)
+
+
+@router.get("/archive", response_model=List[ArchivedTaskResponse])
+def get_archived_tasks(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=100), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    return service.get_archived_tasks(current_user.id, offset, limit)
+
+
+@router.post("/archive/{task_id}/restore", response_model=TaskResponse)
+def restore_archived_task(task_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    task = service.restore_archived_task(task_id, current_user.id)
+    if task is None:
+        return JSONResponse(status_code=404, content={"detail": "Archived task not found"})
+    return task
+
+
+@router.get("/facets", response_model=TaskFacetsResponse)
+def get_task_facets(current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    return service.get_facets(current_user.id)
+
+
+@router.get("/categories", response_model=List[CategoryResponse])
+def get_categories(current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    return service.get_categories(current_user.id)
+
+
+@router.post("/categories", response_model=CategoryResponse, status_code=201)
+def create_category(category: CategoryCreate, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    created = service.create_category(current_user.id, category.name)
+    if created is None:
+        return JSONResponse(status_code=409, content={"detail": "Category already exists"})
+    return created
+
+
+@router.delete("/categories/{category_id}", status_code=204)
+def delete_category(category_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    if not service.delete_category(category_id, current_user.id):
+        return JSONResponse(status_code=404, content={"detail": "Category not found"})
+    return Response(status_code=204)
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
-def get_task(task_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+def get_task(task_id: int, projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
     if current_user is None:
         return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
     
-    task = service.get_task(task_id, current_user.id)
+    task = service.get_task(task_id, current_user.id, projection)
     if task is None:
         return JSONResponse(status_code=404, content={"detail": "Task not found"})
-    return task
+    return task if projection is None else render_task(task, projection)
 
 
 @router.put("/{task_id}", response_model=TaskResponse)
@@ -90,6 +216,39 @@ def add_subtask(task_id: int, subtask: SubtaskCreate, current_user: Optional[Use
     return result
 
 
+@router.post("/{task_id}/subtasks/bulk", response_model=List[SubtaskResponse], status_code=201)
+def add_subtasks(task_id: int, data: SubtaskBulkCreate, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    result = service.add_subtasks(task_id, current_user.id, data.titles)
+    if result is None:
+        return JSONResponse(status_code=404, content={"detail": "Task not found"})
+    return result
+
+
+@router.put("/{task_id}/subtasks", status_code=200)
+def set_subtasks_completed(task_id: int, data: SubtaskBulkToggle, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    count = service.set_subtasks_completed(task_id, current_user.id, data.completed)
+    if count is None:
+        return JSONResponse(status_code=404, content={"detail": "Task not found"})
+    return {"updated": count}
+
+
+@router.delete("/{task_id}/subtasks/completed", status_code=200)
+def delete_completed_subtasks(task_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    
+    count = service.delete_completed_subtasks(task_id, current_user.id)
+    if count is None:
+        return JSONResponse(status_code=404, content={"detail": "Task not found"})
+    return {"deleted": count}
+
+
 @router.put("/{task_id}/subtasks/{subtask_id}", response_model=SubtaskResponse)
 def toggle_subtask(task_id: int, subtask_id: int, data: dict, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service)):
     if current_user is None:
@@ -9,6 +9,14 @@ let editingTaskId = null;
 let subtaskTaskId = null;
 let draggedElement = null;
 
+const DEFAULT_CATEGORIES = ['work', 'personal', 'study', 'sport'];
+const CATEGORY_ICONS = {
+    work: '💼',
+    personal: '🏠',
+    study: '📚',
+    sport: '⚽'
+};
+
 document.addEventListener('DOMContentLoaded', () => {
     checkAuth();
     loadTheme();
@@ -198,12 +206,142 @@ async function loadTasks() {
         updateStats();
         updateExtendedStats();
         applySorting();
+        loadFacets();
     } catch (error) {
         console.error('Error loading tasks:', error);
         alert('Failed to load tasks');
     }
 }
 
+async function loadFacets() {
+    try {
+        const response = await fetch(`${API_URL}/tasks/facets`, {
+            headers: {
+                'Authorization': `Bearer ${currentToken}`
+            }
+        });
+        
+        if (response.ok) {
+            renderFacets(await response.json());
+        }
+    } catch (error) {
+        console.error('Error loading facets:', error);
+    }
+}
+
+function categoryLabel(name) {
+    return `${CATEGORY_ICONS[name] || '🏷️'} ${name}`;
+}
+
+function facetButton(label, count, onclick) {
+    const button = document.createElement('button');
+    button.className = 'category-btn';
+    button.textContent = label + ' ';
+    const badge = document.createElement('span');
+    badge.className = 'facet-count';
+    badge.textContent = count;
+    button.appendChild(badge);
+    button.onclick = onclick;
+    return button;
+}
+
+function renderFacets(facets) {
+    document.getElementById('allCount').textContent = facets.open + facets.completed;
+    document.getElementById('activeCount').textContent = facets.open;
+    document.getElementById('completedCount').textContent = facets.completed;
+    
+    const counts = new Map(facets.categories.map(c => [c.name, c]));
+    const names = [...new Set([...DEFAULT_CATEGORIES, ...facets.categories.map(c => c.name)])];
+    if (currentCategory !== 'all' && !names.includes(currentCategory)) {
+        currentCategory = 'all';
+    }
+    
+    const container = document.getElementById('categoryFilter');
+    container.replaceChildren();
+    const allButton = facetButton('All', facets.open + facets.completed, () => setCategory('all'));
+    allButton.dataset.category = 'all';
+    container.appendChild(allButton);
+    names.forEach(name => {
+        const category = counts.get(name);
+        const button = facetButton(categoryLabel(name), category ? category.task_count : 0, () => setCategory(name));
+        button.dataset.category = name;
+        if (category && category.task_count === 0) {
+            button.title = 'Right-click to delete this category';
+            button.oncontextmenu = (event) => {
+                event.preventDefault();
+                deleteCategory(category);
+            };
+        }
+        container.appendChild(button);
+    });
+    const addButton = document.createElement('button');
+    addButton.className = 'category-btn add-category-btn';
+    addButton.textContent = '＋';
+    addButton.title = 'New category';
+    addButton.onclick = createCategory;
+    container.appendChild(addButton);
+    container.querySelectorAll('.category-btn').forEach(btn => {
+        btn.classList.toggle('active', btn.dataset.category === currentCategory);
+    });
+    
+    document.getElementById('priorityFacets').textContent = ['high', 'medium', 'low']
+        .map(priority => `${priority}: ${facets.priorities[priority] || 0}`)
+        .join(' · ');
+    
+    ['categorySelect', 'editCategorySelect'].forEach(id => {
+        const select = document.getElementById(id);
+        const selected = select.value;
+        select.replaceChildren(new Option('No Category', ''));
+        names.forEach(name => select.appendChild(new Option(categoryLabel(name), name)));
+        select.value = names.includes(selected) ? selected : '';
+    });
+}
+
+async function createCategory() {
+    const name = prompt('New category name');
+    if (!name || !name.trim()) return;
+    
+    try {
+        const response = await fetch(`${API_URL}/tasks/categories`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${currentToken}`
+            },
+            body: JSON.stringify({ name: name.trim() })
+        });
+        
+        if (response.status === 409) {
+            alert('That category already exists');
+            return;
+        }
+        if (response.ok) {
+            loadFacets();
+        }
+    } catch (error) {
+        console.error('Error creating category:', error);
+    }
+}
+
+async function deleteCategory(category) {
+    if (!confirm(`Delete the "${category.name}" category?`)) return;
+    
+    try {
+        const response = await fetch(`${API_URL}/tasks/categories/${category.id}`, {
+            method: 'DELETE',
+            headers: {
+                'Authorization': `Bearer ${currentToken}`
+            }
+        });
+        
+        if (response.ok) {
+            loadFacets();
+        }
+    } catch (error) {
+        console.error('Error deleting category:', error);
+    }
+}
+
 function updateStats() {
     const total = allTasks.length;
     const completed = allTasks.filter(t => t.completed).length;
@@ -260,11 +398,9 @@ function setCategory(category) {
     currentCategory = category;
     
     document.querySelectorAll('.category-btn').forEach(btn => {
-        btn.classList.remove('active');
+        btn.classList.toggle('active', btn.dataset.category === category);
     });
     
-    document.querySelector(`[data-category="${category}"]`).classList.add('active');
-    
     filterTasks();
 }
 
@@ -371,13 +507,8 @@ function createTaskElement(task) {
     
     let categoryHtml = '';
     if (task.category) {
-        const categoryIcons = {
-            work: '💼',
-            personal: '🏠',
-            study: '📚',
-            sport: '⚽'
-        };
-        categoryHtml = `<span class="task-category ${task.category}">${categoryIcons[task.category]} ${task.category}</span>`;
+        const categoryClass = DEFAULT_CATEGORIES.includes(task.category) ? task.category : '';
+        categoryHtml = `<span class="task-category ${categoryClass}">${escapeHtml(categoryLabel(task.category))}</span>`;
     }
     
     let priorityHtml = `<span class="task-priority priority-${task.priority}">${task.priority}</span>`;
@@ -715,7 +846,8 @@ function closeEditModal() {
 async function saveEdit() {
     const title = document.getElementById('editTaskInput').value.trim();
     const priority = document.getElementById('editPrioritySelect').value;
-    const category = document.getElementById('editCategorySelect').value || null;
+    // An empty category clears it on the server.
+    const category = document.getElementById('editCategorySelect').value;
     const deadline = document.getElementById('editDeadlineInput').value || null;
     
     if (!title) {
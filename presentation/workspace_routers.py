@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import JSONResponse
+from application.schemas import TaskCreate, TaskResponse, WorkspaceCreate, WorkspaceMemberResponse, WorkspaceMemberUpdate, WorkspaceResponse
+from application.services import TaskService, WorkspaceService
+from domain.models import TaskProjection, User
+from infrastructure.profiling import TimedRoute
+from .dependencies import get_current_user_or_none, get_task_service, get_workspace_service
+from .projection import get_task_projection, render_tasks
+from typing import List, Optional
+
+
+router = APIRouter(prefix="/api/workspaces", tags=["workspaces"], route_class=TimedRoute)
+
+
+@router.post("/", response_model=WorkspaceResponse, status_code=201)
+def create_workspace(workspace: WorkspaceCreate, current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    return service.create_workspace(workspace.name, current_user.id)
+
+
+@router.get("/", response_model=List[WorkspaceResponse])
+def get_workspaces(current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    return service.get_workspaces(current_user.id)
+
+
+@router.delete("/{workspace_id}", status_code=204)
+def delete_workspace(workspace_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    role = service.get_role(workspace_id, current_user.id)
+    if role is None:
+        return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+    if role != "owner":
+        return JSONResponse(status_code=403, content={"detail": "Only owners can delete a workspace"})
+    service.delete_workspace(workspace_id)
+    return Response(status_code=204)
+
+
+@router.get("/{workspace_id}/members", response_model=List[WorkspaceMemberResponse])
+def get_members(workspace_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    if service.get_role(workspace_id, current_user.id) is None:
+        return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+    return service.get_members(workspace_id)
+
+
+@router.put("/{workspace_id}/members", response_model=WorkspaceMemberResponse)
+def set_member(workspace_id: int, member: WorkspaceMemberUpdate, current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    role = service.get_role(workspace_id, current_user.id)
+    if role is None:
+        return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+    if role != "owner":
+        return JSONResponse(status_code=403, content={"detail": "Only owners can manage members"})
+    if member.username == current_user.username and member.role != "owner" and service.is_last_owner(workspace_id, current_user.id):
+        return JSONResponse(status_code=400, content={"detail": "A workspace needs at least one owner"})
+    result = service.set_member(workspace_id, member.username, member.role)
+    if result is None:
+        return JSONResponse(status_code=404, content={"detail": "User not found"})
+    return result
+
+
+@router.delete("/{workspace_id}/members/{user_id}", status_code=204)
+def remove_member(workspace_id: int, user_id: int, current_user: Optional[User] = Depends(get_current_user_or_none), service: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    role = service.get_role(workspace_id, current_user.id)
+    if role is None:
+        return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+    # Anyone may leave; only owners may remove others.
+    if role != "owner" and user_id != current_user.id:
+        return JSONResponse(status_code=403, content={"detail": "Only owners can manage members"})
+    if service.is_last_owner(workspace_id, user_id):
+        return JSONResponse(status_code=400, content={"detail": "A workspace needs at least one owner"})
+    if not service.remove_member(workspace_id, user_id):
+        return JSONResponse(status_code=404, content={"detail": "Member not found"})
+    return Response(status_code=204)
+
+
+@router.get("/{workspace_id}/tasks", response_model=List[TaskResponse])
+def get_workspace_tasks(workspace_id: int, projection: Optional[TaskProjection] = Depends(get_task_projection), current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service), workspaces: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    tasks = service.get_all_tasks(current_user.id, workspace_id, projection)
+    if not tasks and workspaces.get_role(workspace_id, current_user.id) is None:
+        return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+    return tasks if projection is None else render_tasks(tasks, projection)
+
+
+@router.post("/{workspace_id}/tasks", response_model=TaskResponse, status_code=201)
+def create_workspace_task(workspace_id: int, task: TaskCreate, current_user: Optional[User] = Depends(get_current_user_or_none), service: TaskService = Depends(get_task_service), workspaces: WorkspaceService = Depends(get_workspace_service)):
+    if current_user is None:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    if task.recurrence is not None:
+        return JSONResponse(status_code=400, content={"detail": "Recurring tasks cannot be shared"})
+    created = service.create_task(task, current_user.id, workspace_id)
+    if created is None:
+        if workspaces.get_role(workspace_id, current_user.id) is None:
+            return JSONResponse(status_code=404, content={"detail": "Workspace not found"})
+        return JSONResponse(status_code=403, content={"detail": "Viewers cannot add tasks"})
+    return created
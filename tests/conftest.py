@@ -1,43 +1,71 @@
 import pytest
 import os
+import shutil
+import tempfile
+
+# Each test process (one per xdist worker) gets private in-memory databases
+# and its own cache file, so workers can run side by side.
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix="todolist-tests-")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AUTO_MIGRATE", "1")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("ARCHIVE_INTERVAL_SECONDS", "0")
+os.environ.setdefault("MAINTENANCE_INTERVAL_SECONDS", "0")
+os.environ.setdefault("MEMORY_SAMPLE_INTERVAL_SECONDS", "0")
+os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(TEST_CACHE_DIR, "shared_cache.db"))
+
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from infrastructure.database import Base
-from infrastructure.repositories import TaskRepository, UserRepository
-from application.services import TaskService, AuthService
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from infrastructure.database import make_engine
+from infrastructure.migrations import upgrade
+from infrastructure.repositories import TaskRepository, UserRepository, WorkspaceRepository
+from application.services import TaskService, AuthService, WorkspaceService
+from presentation.dependencies import get_auth_service, get_task_service, get_workspace_service
 from main import app
 
-TEST_DATABASE_URL = "sqlite:///./test_database.db"
+TEST_DATABASE_URL = "sqlite://"
 
 @pytest.fixture(scope="session")
 def test_engine():
-    engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    engine = make_engine(TEST_DATABASE_URL)
+
+    # pysqlite only sends BEGIN before the first write, so a savepoint taken
+    # earlier would open (and on release, commit) a transaction of its own.
+    # Hand transaction control to SQLAlchemy instead.
+    @event.listens_for(engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    upgrade(engine)
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
     yield engine
-    Base.metadata.drop_all(bind=engine)
-    if os.path.exists("./test_database.db"):
-        os.remove("./test_database.db")
+    engine.dispose()
 
 @pytest.fixture(scope="function")
 def test_db_session(test_engine):
-    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
-    session = TestSessionLocal()
+    # Every test runs in one transaction that is rolled back afterwards;
+    # commits made by the code under test only release savepoints.
+    connection = test_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
     yield session
-    session.rollback()
     session.close()
+    transaction.rollback()
+    connection.close()
 
 @pytest.fixture(scope="function")
 def task_repository(test_db_session):
-    repo = TaskRepository()
-    repo.db = test_db_session
-    return repo
+    return TaskRepository(test_db_session)
 
 @pytest.fixture(scope="function")
 def user_repository(test_db_session):
-    repo = UserRepository()
-    repo.db = test_db_session
-    return repo
+    return UserRepository(test_db_session)
 
 @pytest.fixture(scope="function")
 def task_service(task_repository):
@@ -48,9 +76,58 @@ def auth_service(user_repository):
     return AuthService(user_repository)
 
 @pytest.fixture(scope="function")
-def client():
-    with TestClient(app) as test_client:
-        yield test_client
+def client(test_db_session):
+    # Requests use the test's session, so they see fixture data and are rolled
+    # back with it. The read model and user cache outlive a test, so they are
+    # left out.
+    app.dependency_overrides[get_task_service] = lambda: TaskService(TaskRepository(test_db_session))
+    app.dependency_overrides[get_auth_service] = lambda: AuthService(UserRepository(test_db_session))
+    app.dependency_overrides[get_workspace_service] = lambda: WorkspaceService(WorkspaceRepository(test_db_session), UserRepository(test_db_session))
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function", params=["single", "sharded"])
+def stack_client(request, tmp_path, monkeypatch):
+    # Services are built by the production dependencies, so requests go
+    # through the read model and its shared-cache mirror, the write coalescer
+    # and, in the sharded run, ShardedTaskRepository. Only where sessions come
+    # from is replaced: every request gets its own sessions and commits, as
+    # in production, so the databases are files thrown away with tmp_path.
+    # Users must be registered through the API.
+    from sqlalchemy.orm import sessionmaker
+    from application.read_model import task_read_model
+    from application.write_coalescing import write_coalescer
+    from infrastructure import repositories, sharding
+    from infrastructure.database import ShardSessionFactory
+    from presentation import dependencies
+
+    main_engine = make_engine(f"sqlite:///{tmp_path}/main.db")
+    upgrade(main_engine)
+    sessions = sessionmaker(bind=main_engine, autoflush=False)
+    for module in (sharding, repositories):
+        monkeypatch.setattr(module, "SessionLocal", sessions)
+    if request.param == "sharded":
+        shards = ShardSessionFactory(f"sqlite:///{tmp_path}/shard_{{}}.db")
+        for shard in range(2):
+            upgrade(shards.engine(shard))
+            sharding.seed_id_range(shards.engine(shard), shard)
+        router = sharding.ShardRouter(shard_count=2, session_factory=sessions)
+        for module in (sharding, repositories):
+            monkeypatch.setattr(module, "shard_sessions", shards)
+            monkeypatch.setattr(module, "shard_router", router)
+        monkeypatch.setattr(dependencies, "sharding_enabled", lambda: True)
+    monkeypatch.setattr(write_coalescer, "window_ms", 5)
+    # User ids repeat across tests, so nothing cached may carry over.
+    task_read_model.clear()
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        task_read_model.clear()
+        main_engine.dispose()
 
 @pytest.fixture(scope="function")
 def test_user(auth_service):
@@ -74,7 +151,7 @@ def auth_headers(auth_token):
 
 def pytest_configure(config):
     debug_level = os.environ.get("DEBUG", "0")
-    
+
     if debug_level == "1":
         config.option.markexpr = "unit"
         print("\n🧪 DEBUG=1: Running UNIT tests (Business Logic)")
@@ -88,3 +165,6 @@ def pytest_configure(config):
         print("\n🚀 DEBUG=all: Running ALL tests")
     else:
         print("\n✨ Running tests based on pytest arguments")
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_CACHE_DIR, ignore_errors=True)
@@ -10,7 +10,7 @@ class TestEndToEndFlow:
             "/api/auth/register",
             json={"username": "e2euser", "email": "e2e@example.com", "password": "password123"}
         )
-        assert register_response.status_code == 200
+        assert register_response.status_code == 201
         
         login_response = client.post(
             "/api/auth/login",
@@ -11,7 +11,7 @@ class TestAuthAPI:
             json={"username": "apiuser", "email": "api@example.com", "password": "password123"}
         )
         
-        assert response.status_code == 200
+        assert response.status_code == 201
         data = response.json()
         assert data["username"] == "apiuser"
         assert data["email"] == "api@example.com"
@@ -217,3 +217,873 @@ class TestSubtaskAPI:
         )
         
         assert response.status_code == 204
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestBulkSubtaskAPI:
+    
+    @pytest.fixture
+    def task_id(self, client, auth_headers):
+        return client.post("/api/tasks/", json={"title": "Checklist", "priority": "medium"}, headers=auth_headers).json()["id"]
+    
+    def test_add_subtasks_bulk(self, client, auth_headers, task_id):
+        response = client.post(
+            f"/api/tasks/{task_id}/subtasks/bulk",
+            json={"titles": ["One", "Two", "Three"]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert [s["title"] for s in data] == ["One", "Two", "Three"]
+        assert all(s["task_id"] == task_id and s["completed"] is False for s in data)
+        task = client.get(f"/api/tasks/{task_id}", headers=auth_headers).json()
+        assert len(task["subtasks"]) == 3
+    
+    def test_complete_all_and_delete_completed(self, client, auth_headers, task_id):
+        client.post(f"/api/tasks/{task_id}/subtasks/bulk", json={"titles": ["A", "B"]}, headers=auth_headers)
+        
+        response = client.put(f"/api/tasks/{task_id}/subtasks", json={"completed": True}, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json() == {"updated": 2}
+        client.post(f"/api/tasks/{task_id}/subtasks", json={"title": "C"}, headers=auth_headers)
+        
+        response = client.delete(f"/api/tasks/{task_id}/subtasks/completed", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json() == {"deleted": 2}
+        task = client.get(f"/api/tasks/{task_id}", headers=auth_headers).json()
+        assert [s["title"] for s in task["subtasks"]] == ["C"]
+    
+    def test_bulk_operations_on_missing_task(self, client, auth_headers):
+        assert client.post("/api/tasks/999999999/subtasks/bulk", json={"titles": ["X"]}, headers=auth_headers).status_code == 404
+        assert client.put("/api/tasks/999999999/subtasks", json={"completed": True}, headers=auth_headers).status_code == 404
+        assert client.delete("/api/tasks/999999999/subtasks/completed", headers=auth_headers).status_code == 404
+    
+    def test_bulk_operations_on_task_without_subtasks(self, client, auth_headers, task_id):
+        assert client.put(f"/api/tasks/{task_id}/subtasks", json={"completed": True}, headers=auth_headers).json() == {"updated": 0}
+        assert client.delete(f"/api/tasks/{task_id}/subtasks/completed", headers=auth_headers).json() == {"deleted": 0}
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestTaskOperationsAPI:
+    
+    def test_batch_applies_all_operations(self, client, auth_headers):
+        task_id = client.post("/api/tasks/", json={"title": "Existing", "priority": "low"}, headers=auth_headers).json()["id"]
+        
+        response = client.post(
+            "/api/tasks/ops",
+            json={"operations": [
+                {"op": "create", "title": "Batched", "priority": "high"},
+                {"op": "update", "task_id": task_id, "completed": True},
+                {"op": "subtask_add", "task_id": task_id, "title": "Step"},
+                {"op": "move", "positions": {str(task_id): 5}},
+            ]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["op"] for r in results] == ["create", "update", "subtask_add", "move"]
+        assert results[0]["task"]["title"] == "Batched"
+        assert results[1]["task"]["completed"] is True
+        assert results[2]["subtask"]["task_id"] == task_id
+        task = client.get(f"/api/tasks/{task_id}", headers=auth_headers).json()
+        assert task["position"] == 5
+        assert [s["title"] for s in task["subtasks"]] == ["Step"]
+    
+    def test_failed_operation_rolls_back_batch(self, client, auth_headers):
+        before = len(client.get("/api/tasks/", headers=auth_headers).json())
+        
+        response = client.post(
+            "/api/tasks/ops",
+            json={"operations": [
+                {"op": "create", "title": "Rolled back", "priority": "low"},
+                {"op": "delete", "task_id": 999999999},
+            ]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 404
+        assert response.json()["index"] == 1
+        tasks = client.get("/api/tasks/", headers=auth_headers).json()
+        assert len(tasks) == before
+        assert all(t["title"] != "Rolled back" for t in tasks)
+    
+    def test_unknown_operation_rejected(self, client, auth_headers):
+        response = client.post("/api/tasks/ops", json={"operations": [{"op": "explode"}]}, headers=auth_headers)
+        
+        assert response.status_code == 422
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestExportImportAPI:
+    
+    def test_ndjson_round_trip(self, client, auth_headers):
+        import json
+        task_id = client.post("/api/tasks/", json={"title": "Exported", "priority": "high", "category": "work"}, headers=auth_headers).json()["id"]
+        client.post(f"/api/tasks/{task_id}/subtasks/bulk", json={"titles": ["a", "b"]}, headers=auth_headers)
+        
+        response = client.get("/api/tasks/export", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        exported = next(line for line in lines if line["id"] == task_id)
+        assert [s["title"] for s in exported["subtasks"]] == ["a", "b"]
+        
+        upload = "\n".join(json.dumps(line) for line in lines if line["id"] == task_id)
+        summary = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", upload)}, headers=auth_headers).json()
+        
+        assert summary["imported"] == 1 and summary["subtasks"] == 2 and summary["failed"] == 0
+        titles = [t["title"] for t in client.get("/api/tasks/", headers=auth_headers).json()]
+        assert titles.count("Exported") >= 2
+    
+    def test_csv_round_trip(self, client, auth_headers):
+        client.post("/api/tasks/", json={"title": "Comma, \"quoted\"", "priority": "low"}, headers=auth_headers)
+        
+        response = client.get("/api/tasks/export", params={"format": "csv"}, headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.text.splitlines()[0].startswith("id,title,completed")
+        rows = [line for line in response.text.splitlines() if "Comma" in line]
+        upload = response.text.splitlines()[0] + "\n" + rows[-1] + "\n"
+        summary = client.post("/api/tasks/import", files={"file": ("tasks.csv", upload)}, headers=auth_headers).json()
+        
+        assert summary["imported"] == 1 and summary["failed"] == 0
+    
+    def test_import_reports_invalid_records(self, client, auth_headers):
+        upload = '{"title": "Good"}\nnot json\n{"title": ""}\n{"title": "Also good", "completed": true}\n{"title": "Weekly", "recurrence": {"frequency": "weekly"}}\n'
+        
+        summary = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", upload)}, headers=auth_headers).json()
+        
+        assert summary["imported"] == 2
+        assert summary["failed"] == 3
+        assert [e["line"] for e in summary["errors"]] == [2, 3, 5]
+        assert summary["errors"][1]["detail"].startswith("title:")
+        assert summary["errors"][2]["detail"].startswith("recurrence:")
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestDeadlineAPI:
+    
+    def test_due_window_and_overdue(self, client, auth_headers):
+        now = datetime.utcnow()
+        deadlines = {"Yesterday": now - timedelta(days=1), "Tomorrow": now + timedelta(days=1), "Next month": now + timedelta(days=30)}
+        ids = {}
+        for title, deadline in deadlines.items():
+            ids[title] = client.post("/api/tasks/", json={"title": title, "priority": "low", "deadline": deadline.isoformat() + "Z"}, headers=auth_headers).json()["id"]
+        done = client.post("/api/tasks/", json={"title": "Done", "priority": "low", "deadline": (now - timedelta(days=2)).isoformat()}, headers=auth_headers).json()["id"]
+        client.put(f"/api/tasks/{done}", json={"completed": True}, headers=auth_headers)
+        
+        response = client.get("/api/tasks/due", params={"from": (now - timedelta(days=2)).isoformat() + "Z", "to": (now + timedelta(days=2)).isoformat() + "Z"}, headers=auth_headers)
+        
+        assert response.status_code == 200
+        due = [t["id"] for t in response.json()]
+        assert ids["Yesterday"] in due and ids["Tomorrow"] in due
+        assert ids["Next month"] not in due and done not in due
+        assert due.index(ids["Yesterday"]) < due.index(ids["Tomorrow"])
+        
+        overdue = [t["id"] for t in client.get("/api/tasks/overdue", headers=auth_headers).json()]
+        assert ids["Yesterday"] in overdue
+        assert ids["Tomorrow"] not in overdue and done not in overdue
+    
+    def test_due_window_is_validated(self, client, auth_headers):
+        assert client.get("/api/tasks/due", params={"from": "2024-02-01T00:00:00", "to": "2024-01-01T00:00:00"}, headers=auth_headers).status_code == 400
+        assert client.get("/api/tasks/due", params={"from": "2024-01-01T00:00:00"}, headers=auth_headers).status_code == 422
+        assert client.get("/api/tasks/overdue", params={"limit": 501}, headers=auth_headers).status_code == 422
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestRecurringTaskAPI:
+    
+    def test_recurring_task_lifecycle(self, client, auth_headers):
+        start = datetime.utcnow() + timedelta(hours=1)
+        response = client.post("/api/tasks/", json={
+            "title": "Take out bins", "priority": "low", "deadline": start.isoformat(),
+            "recurrence": {"frequency": "weekly"},
+        }, headers=auth_headers)
+        assert response.status_code == 201
+        first = response.json()
+        assert first["recurrence"]["frequency"] == "weekly" and first["series_id"] == first["id"]
+        
+        window = {"from": datetime.utcnow().isoformat(), "to": (start + timedelta(days=14, minutes=1)).isoformat()}
+        due = [t for t in client.get("/api/tasks/due", params=window, headers=auth_headers).json() if t["series_id"] == first["id"]]
+        assert len(due) == 3
+        
+        client.put(f"/api/tasks/{first['id']}", json={"completed": True}, headers=auth_headers)
+        series = sorted((t for t in client.get("/api/tasks/", headers=auth_headers).json() if t["series_id"] == first["id"]), key=lambda t: t["id"])
+        assert [t["completed"] for t in series] == [True, False, False]
+        
+        assert client.delete(f"/api/tasks/{series[1]['id']}", headers=auth_headers).status_code == 204
+        assert not [t for t in client.get("/api/tasks/", headers=auth_headers).json() if t["series_id"] == first["id"]]
+    
+    def test_recurrence_rule_is_validated(self, client, auth_headers):
+        for rule in ({"frequency": "hourly"}, {"frequency": "custom"}, {"frequency": "daily", "interval": 0}):
+            response = client.post("/api/tasks/", json={"title": "Bad rule", "recurrence": rule}, headers=auth_headers)
+            assert response.status_code == 422
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestFacetsAPI:
+    
+    def test_facets_and_user_defined_categories(self, client, auth_headers):
+        before = client.get("/api/tasks/facets", headers=auth_headers).json()
+        response = client.post("/api/tasks/categories", json={"name": "Reading"}, headers=auth_headers)
+        assert response.status_code == 201
+        reading = response.json()
+        assert client.post("/api/tasks/categories", json={"name": "Reading"}, headers=auth_headers).status_code == 409
+        assert client.post("/api/tasks/categories", json={"name": "  Reading "}, headers=auth_headers).status_code == 409
+        assert client.post("/api/tasks/categories", json={"name": "   "}, headers=auth_headers).status_code == 422
+        book = client.post("/api/tasks/", json={"title": "Book", "category": "Reading", "priority": "low"}, headers=auth_headers).json()
+        client.post("/api/tasks/", json={"title": "Loose end"}, headers=auth_headers)
+        
+        facets = client.get("/api/tasks/facets", headers=auth_headers).json()
+        
+        assert {c["name"]: c["task_count"] for c in facets["categories"]}["Reading"] == 1
+        assert facets["uncategorized"] == before["uncategorized"] + 1
+        assert facets["priorities"]["low"] == before["priorities"]["low"] + 1
+        assert facets["priorities"]["medium"] == before["priorities"]["medium"] + 1
+        assert facets["open"] == before["open"] + 2
+        
+        assert client.delete(f"/api/tasks/categories/{reading['id']}", headers=auth_headers).status_code == 204
+        assert client.delete(f"/api/tasks/categories/{reading['id']}", headers=auth_headers).status_code == 404
+        assert client.get(f"/api/tasks/{book['id']}", headers=auth_headers).json()["category"] is None
+        assert "Reading" not in [c["name"] for c in client.get("/api/tasks/categories", headers=auth_headers).json()]
+    
+    def test_task_categories_follow_the_category_rules(self, client, auth_headers):
+        task = client.post("/api/tasks/", json={"title": "Padded", "category": " Errands "}, headers=auth_headers).json()
+        
+        assert task["category"] == "Errands"
+        for name in ("   ", "x" * 300):
+            assert client.post("/api/tasks/", json={"title": "Bad", "category": name}, headers=auth_headers).status_code == 422
+            assert client.put(f"/api/tasks/{task['id']}", json={"category": name}, headers=auth_headers).status_code == 422
+        upload = b'{"title": "Blank", "category": "   "}\n{"title": "Kept", "category": "Errands  "}\n'
+        summary = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", upload)}, headers=auth_headers).json()
+        assert (summary["imported"], summary["failed"]) == (1, 1)
+        assert [c["name"] for c in client.get("/api/tasks/categories", headers=auth_headers).json()].count("Errands") == 1
+        assert client.put(f"/api/tasks/{task['id']}", json={"category": ""}, headers=auth_headers).json()["category"] is None
+    
+    def test_facets_require_authentication(self, client):
+        assert client.get("/api/tasks/facets").status_code == 401
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestWorkspacesAPI:
+    
+    def test_shared_workspace_flow(self, client, auth_headers):
+        from uuid import uuid4
+        
+        username = f"member-{uuid4().hex[:8]}"
+        client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pass123"})
+        token = client.post("/api/auth/login", data={"username": username, "password": "pass123"}).json()["access_token"]
+        member_headers = {"Authorization": f"Bearer {token}"}
+        
+        response = client.post("/api/workspaces/", json={"name": "Household"}, headers=auth_headers)
+        assert response.status_code == 201
+        workspace = response.json()
+        assert workspace["role"] == "owner"
+        assert client.get(f"/api/workspaces/{workspace['id']}/tasks", headers=member_headers).status_code == 404
+        
+        member = client.put(f"/api/workspaces/{workspace['id']}/members", json={"username": username, "role": "viewer"}, headers=auth_headers).json()
+        assert client.put(f"/api/workspaces/{workspace['id']}/members", json={"username": "nobody-at-all", "role": "viewer"}, headers=auth_headers).status_code == 404
+        assert client.put(f"/api/workspaces/{workspace['id']}/members", json={"username": "testuser", "role": "editor"}, headers=auth_headers).status_code == 400
+        
+        task = client.post(f"/api/workspaces/{workspace['id']}/tasks", json={"title": "Groceries"}, headers=auth_headers).json()
+        assert task["workspace_id"] == workspace["id"]
+        assert client.post(f"/api/workspaces/{workspace['id']}/tasks", json={"title": "Nope"}, headers=member_headers).status_code == 403
+        assert client.put(f"/api/tasks/{task['id']}", json={"completed": True}, headers=member_headers).status_code == 404
+        assert task["id"] in [t["id"] for t in client.get("/api/tasks/visible", headers=member_headers).json()]
+        assert task["id"] not in [t["id"] for t in client.get("/api/tasks/", headers=auth_headers).json()]
+        
+        assert client.delete(f"/api/workspaces/{workspace['id']}", headers=member_headers).status_code == 403
+        assert client.delete(f"/api/workspaces/{workspace['id']}/members/{member['user_id']}", headers=member_headers).status_code == 204
+        assert client.get(f"/api/tasks/{task['id']}", headers=member_headers).status_code == 404
+        assert client.delete(f"/api/workspaces/{workspace['id']}", headers=auth_headers).status_code == 204
+        assert workspace["id"] not in [w["id"] for w in client.get("/api/workspaces/", headers=auth_headers).json()]
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestProductionStackAPI:
+    # Runs once on a single database and once sharded; see `stack_client`.
+    
+    @staticmethod
+    def register(client, username):
+        client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pass123"})
+        token = client.post("/api/auth/login", data={"username": username, "password": "pass123"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    
+    def test_personal_list_stays_in_step_with_writes(self, stack_client):
+        from application.read_model import task_read_model
+        from application.write_coalescing import write_coalescer
+        
+        client = stack_client
+        headers = self.register(client, "stacked")
+        
+        def titles():
+            return [(t["title"], t["completed"], t["subtask_completed"]) for t in client.get("/api/tasks/", headers=headers).json()]
+        
+        ids = [client.post("/api/tasks/", json={"title": f"Task {i}", "category": "work"}, headers=headers).json()["id"] for i in range(3)]
+        assert titles() == [("Task 0", False, 0), ("Task 1", False, 0), ("Task 2", False, 0)]
+        hits = task_read_model.stats()["hits"]
+        transactions = write_coalescer.stats()["transactions"]
+        
+        client.put(f"/api/tasks/{ids[0]}", json={"title": "Renamed", "completed": True}, headers=headers)
+        assert titles() == [("Renamed", True, 0), ("Task 1", False, 0), ("Task 2", False, 0)]
+        client.delete(f"/api/tasks/{ids[1]}", headers=headers)
+        assert titles() == [("Renamed", True, 0), ("Task 2", False, 0)]
+        client.put("/api/tasks/positions/update", json={str(ids[2]): 0, str(ids[0]): 1}, headers=headers)
+        assert titles() == [("Task 2", False, 0), ("Renamed", True, 0)]
+        subtask = client.post(f"/api/tasks/{ids[2]}/subtasks", json={"title": "Step"}, headers=headers).json()
+        client.put(f"/api/tasks/{ids[2]}/subtasks/{subtask['id']}", json={"completed": True}, headers=headers)
+        assert titles() == [("Task 2", False, 1), ("Renamed", True, 0)]
+        client.post("/api/tasks/ops", json={"operations": [{"op": "create", "title": "Batched", "priority": "high"}]}, headers=headers)
+        assert titles() == [("Task 2", False, 1), ("Renamed", True, 0), ("Batched", False, 0)]
+        
+        assert client.get(f"/api/tasks/{ids[0]}", headers=headers).json()["title"] == "Renamed"
+        assert task_read_model.stats()["hits"] > hits
+        assert write_coalescer.stats()["transactions"] == transactions + 2
+        assert [c["name"] for c in client.get("/api/tasks/categories", headers=headers).json()] == ["work"]
+    
+    def test_workspace_tasks_reach_every_member(self, stack_client):
+        client = stack_client
+        owner = self.register(client, "stack-owner")
+        editor = self.register(client, "stack-editor")
+        workspace = client.post("/api/workspaces/", json={"name": "Shared"}, headers=owner).json()
+        client.put(f"/api/workspaces/{workspace['id']}/members", json={"username": "stack-editor", "role": "editor"}, headers=owner)
+        personal = client.post("/api/tasks/", json={"title": "Mine"}, headers=owner).json()
+        client.get("/api/tasks/", headers=owner)
+        
+        shared = client.post(f"/api/workspaces/{workspace['id']}/tasks", json={"title": "Ours"}, headers=owner).json()
+        client.put(f"/api/tasks/{shared['id']}", json={"completed": True}, headers=editor)
+        
+        assert [t["id"] for t in client.get("/api/tasks/", headers=owner).json()] == [personal["id"]]
+        assert [t["completed"] for t in client.get(f"/api/workspaces/{workspace['id']}/tasks", headers=owner).json()] == [True]
+        assert [t["title"] for t in client.get("/api/tasks/visible", headers=editor).json()] == ["Ours"]
+        assert client.get(f"/api/tasks/{personal['id']}", headers=editor).status_code == 404
+
+    def test_batch_spanning_personal_and_workspace_tasks(self, stack_client):
+        from presentation.dependencies import sharding_enabled
+        
+        client = stack_client
+        headers = self.register(client, "stack-batcher")
+        workspace = client.post("/api/workspaces/", json={"name": "Shared"}, headers=headers).json()
+        personal = client.post("/api/tasks/", json={"title": "Mine"}, headers=headers).json()
+        shared = client.post(f"/api/workspaces/{workspace['id']}/tasks", json={"title": "Ours"}, headers=headers).json()
+        operations = [{"op": "update", "task_id": task["id"], "completed": True} for task in (personal, shared)]
+        
+        response = client.post("/api/tasks/ops", json={"operations": operations}, headers=headers)
+        
+        completed = [t["completed"] for t in client.get("/api/tasks/visible", headers=headers).json()]
+        if sharding_enabled():
+            assert response.status_code == 400
+            assert completed == [False, False]
+            assert client.post("/api/tasks/ops", json={"operations": operations[1:]}, headers=headers).status_code == 200
+        else:
+            assert response.status_code == 200
+            assert completed == [True, True]
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestTaskProjectionAPI:
+    
+    def test_fields_and_includes(self, client, auth_headers):
+        task = client.post("/api/tasks/", json={"title": "Pack", "deadline": "2030-01-01T09:00:00"}, headers=auth_headers).json()
+        client.post(f"/api/tasks/{task['id']}/subtasks/bulk", json={"titles": ["Passport", "Charger"]}, headers=auth_headers)
+        
+        full = client.get("/api/tasks/", headers=auth_headers).json()
+        assert len(full[0]["subtasks"]) == 2
+        
+        sparse = client.get("/api/tasks/?fields=title,completed", headers=auth_headers).json()
+        assert sparse == [{"id": task["id"], "title": "Pack", "completed": False}]
+        
+        counted = client.get(f"/api/tasks/{task['id']}?fields=deadline&include=subtask_counts", headers=auth_headers).json()
+        assert counted == {"id": task["id"], "deadline": "2030-01-01T09:00:00", "subtask_total": 2, "subtask_completed": 0}
+        
+        embedded = client.get("/api/tasks/visible?include=subtasks", headers=auth_headers).json()
+        assert embedded[0]["title"] == "Pack"
+        assert [s["title"] for s in embedded[0]["subtasks"]] == ["Passport", "Charger"]
+        
+        assert client.get("/api/tasks/?fields=title,password", headers=auth_headers).status_code == 422
+        assert client.get("/api/tasks/?include=everything", headers=auth_headers).status_code == 422
+
+@pytest.mark.integration
+class TestTraceRecording:
+    
+    def test_recorded_trace_is_anonymized(self, client, auth_headers, tmp_path):
+        from fastapi.testclient import TestClient
+        from infrastructure.tracing import TraceRecorder, read_trace
+        from main import app
+        from presentation.middleware import TraceRecordingMiddleware
+        
+        recorder = TraceRecorder(str(tmp_path / "trace.ndjson"))
+        with TestClient(TraceRecordingMiddleware(app, recorder)) as traced:
+            task = traced.post("/api/tasks/", json={"title": "Call the dentist", "priority": "high", "deadline": "2030-01-01T09:00:00"}, headers=auth_headers).json()
+            traced.put("/api/tasks/positions/update", json={str(task["id"]): 0}, headers=auth_headers)
+            traced.get("/api/tasks/", params={"fields": "title", "limit": 5}, headers=auth_headers)
+            traced.post("/api/auth/login", data={"username": "testuser", "password": "password123"})
+            traced.get("/api/unknown", headers=auth_headers)
+        recorder.flush()
+        
+        entries = read_trace(recorder.path)
+        assert [(e["m"], e["r"], e["s"]) for e in entries] == [
+            ("POST", "/api/tasks/", 201),
+            ("PUT", "/api/tasks/positions/update", 200),
+            ("GET", "/api/tasks/", 200),
+            ("POST", "/api/auth/login", 200),
+        ]
+        assert entries[0]["b"]["title"] == "~16"
+        assert entries[0]["b"]["priority"] == "high"
+        assert entries[0]["b"]["deadline"].startswith("@")
+        assert entries[1]["b"] == {"#0": 0}
+        assert entries[2]["q"] == {"fields": "title", "limit": "5"}
+        assert entries[0]["u"] == entries[2]["u"] is not None
+        assert "b" not in entries[3] and entries[3]["u"] is None
+        raw = (tmp_path / "trace.ndjson").read_text()
+        assert "dentist" not in raw and "password" not in raw and "testuser" not in raw
+    
+    def test_digits_are_ids_only_in_id_fields(self):
+        from datetime import datetime
+        from infrastructure.tracing import anonymize
+        
+        shape = anonymize({"title": "2024", "task_id": "17", "interval": 3, "subtask_id": 9}, datetime.utcnow())
+        
+        assert shape == {"title": "~4", "task_id": "#task_id", "interval": 3, "subtask_id": "#subtask_id"}
+    
+    def test_dates_are_offsets_only_in_date_fields(self):
+        from datetime import datetime
+        from infrastructure.tracing import anonymize
+        
+        now = datetime(2024, 1, 1)
+        shape = anonymize({
+            "title": "20240101", "category": "2024-01-01", "deadline": "2024-01-02T00:00:00",
+            "recurrence": {"frequency": "daily", "start": "2024-01-01T01:00:00"}, "start": "2024-01-01",
+        }, now)
+        
+        assert shape == {
+            "title": "~8", "category": "~10", "deadline": "@86400",
+            "recurrence": {"frequency": "daily", "start": "@3600"}, "start": "~10",
+        }
+        assert anonymize({"from": "2023-12-31T00:00:00", "to": "soon"}, now) == {"from": "@-86400", "to": "~4"}
+
+@pytest.mark.integration
+@pytest.mark.tasks
+class TestArchiveAPI:
+    
+    def test_archive_listing_and_restore(self, client, auth_headers, monkeypatch, test_db_session):
+        from infrastructure.archiving import archive_worker
+        
+        # The worker opens its own sessions; point it at the test's transaction.
+        monkeypatch.setattr("infrastructure.archiving.storage_engines", lambda: [test_db_session.connection()])
+        task_id = client.post("/api/tasks/", json={"title": "Done long ago", "priority": "low"}, headers=auth_headers).json()["id"]
+        client.post(f"/api/tasks/{task_id}/subtasks", json={"title": "Step"}, headers=auth_headers)
+        client.put(f"/api/tasks/{task_id}", json={"completed": True}, headers=auth_headers)
+        
+        client.get("/api/tasks/", headers=auth_headers)
+        monkeypatch.setattr(archive_worker, "after_days", -1)
+        assert archive_worker.run_once() >= 1
+        
+        assert task_id not in [t["id"] for t in client.get("/api/tasks/", headers=auth_headers).json()]
+        archived = client.get("/api/tasks/archive", params={"limit": 100}, headers=auth_headers).json()
+        assert task_id in [t["id"] for t in archived]
+        assert all(t["archived_at"] for t in archived)
+        assert next(t for t in archived if t["id"] == task_id)["subtask_total"] == 1
+        
+        response = client.post(f"/api/tasks/archive/{task_id}/restore", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json()["id"] == task_id
+        assert response.json()["subtask_total"] == 1
+        restored = client.get(f"/api/tasks/{task_id}", headers=auth_headers)
+        assert restored.status_code == 200
+        assert restored.json()["subtask_total"] == 1
+        assert client.post(f"/api/tasks/archive/{task_id}/restore", headers=auth_headers).status_code == 404
+    
+    def test_archive_pagination_is_validated(self, client, auth_headers):
+        assert client.get("/api/tasks/archive", params={"limit": 0}, headers=auth_headers).status_code == 422
+        assert client.get("/api/tasks/archive", params={"offset": -1}, headers=auth_headers).status_code == 422
+
+@pytest.mark.integration
+class TestWriteStatementCounts:
+    
+    @pytest.fixture
+    def sql_count(self, client, auth_headers, monkeypatch, caplog):
+        import json
+        monkeypatch.setattr("presentation.middleware.SLOW_REQUEST_MS", 0)
+        
+        from infrastructure.profiling import RequestStats
+        
+        # Commits inside the test transaction become SAVEPOINT/RELEASE pairs, which the app does not send.
+        record = RequestStats.record_statement
+        monkeypatch.setattr(RequestStats, "record_statement", lambda stats, statement, ms: None if statement.startswith(("SAVEPOINT", "RELEASE")) else record(stats, statement, ms))
+        
+        def run(method, url, **kwargs):
+            caplog.clear()
+            with caplog.at_level("WARNING", logger="todolist.slow_requests"):
+                response = client.request(method, url, headers=auth_headers, **kwargs)
+            assert response.status_code < 300
+            entry = json.loads(caplog.records[-1].getMessage().split(" ", 2)[2])
+            # One statement of every request is the bearer token's user lookup.
+            return entry["sql_count"] - 1, response
+        return run
+    
+    def test_task_writes(self, sql_count):
+        count, response = sql_count("POST", "/api/tasks/", json={"title": "Counted", "priority": "low"})
+        assert count == 1
+        task_id = response.json()["id"]
+        
+        count, response = sql_count("PUT", f"/api/tasks/{task_id}", json={"title": "Counted again", "completed": True})
+        assert count == 2
+        assert response.json()["title"] == "Counted again"
+        
+        count, _ = sql_count("DELETE", f"/api/tasks/{task_id}")
+        assert count == 2
+    
+    def test_subtask_writes(self, sql_count):
+        _, response = sql_count("POST", "/api/tasks/", json={"title": "Parent", "priority": "low"})
+        task_id = response.json()["id"]
+        
+        count, response = sql_count("POST", f"/api/tasks/{task_id}/subtasks", json={"title": "Child"})
+        assert count == 1
+        subtask_id = response.json()["id"]
+        
+        count, response = sql_count("PUT", f"/api/tasks/{task_id}/subtasks/{subtask_id}", json={"completed": True})
+        assert count == 1
+        assert response.json()["completed"] is True
+        
+        count, _ = sql_count("DELETE", f"/api/tasks/{task_id}/subtasks/{subtask_id}")
+        assert count == 1
+        
+        count, response = sql_count("POST", f"/api/tasks/{task_id}/subtasks/bulk", json={"titles": ["A", "B", "C"]})
+        assert count == 1
+        assert [s["title"] for s in response.json()] == ["A", "B", "C"]
+    
+    def test_bulk_task_writes(self, sql_count):
+        task_ids = [sql_count("POST", "/api/tasks/", json={"title": f"Bulk {i}", "priority": "low"})[1].json()["id"] for i in range(3)]
+        
+        count, _ = sql_count("PUT", "/api/tasks/positions/update", json={str(task_id): 3 - i for i, task_id in enumerate(task_ids)})
+        assert count == 1
+        
+        count, response = sql_count("POST", "/api/tasks/ops", json={"operations": [
+            {"op": "create", "title": "Batched", "priority": "high"},
+            {"op": "update", "task_id": task_ids[0], "completed": True},
+            {"op": "subtask_add", "task_id": task_ids[1], "title": "Step"},
+            {"op": "move", "positions": {str(task_ids[2]): 0}},
+        ]})
+        assert count == 5
+        assert [r["op"] for r in response.json()] == ["create", "update", "subtask_add", "move"]
+        
+        count, response = sql_count("DELETE", "/api/tasks/completed/all")
+        assert count == 1
+        assert response.json()["deleted"] == 1
+
+@pytest.mark.integration
+class TestRequestDiagnostics:
+    
+    def test_slow_request_log(self, client, auth_headers, monkeypatch, caplog):
+        import json
+        monkeypatch.setattr("presentation.middleware.SLOW_REQUEST_MS", 0)
+        client.post("/api/tasks/", json={"title": "Logged Task", "priority": "low"}, headers=auth_headers)
+        
+        with caplog.at_level("WARNING", logger="todolist.slow_requests"):
+            response = client.get("/api/tasks/", headers=auth_headers)
+        
+        assert response.status_code == 200
+        entries = [json.loads(r.getMessage().split(" ", 2)[2]) for r in caplog.records]
+        entry = next(e for e in entries if e["route"] == "/api/tasks/" and e["method"] == "GET")
+        assert entry["status"] == 200
+        assert entry["sql_count"] >= 1
+        assert len(entry["slowest_sql"]) >= 1
+        assert entry["serialization_ms"] > 0
+    
+    def test_profile_header_requires_admin_token(self, client, auth_headers, monkeypatch, tmp_path):
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        monkeypatch.setattr("infrastructure.profiling.PROFILE_DIR", str(tmp_path))
+        
+        client.get("/api/tasks/", headers={**auth_headers, "X-Profile": "1", "X-Admin-Token": "wrong"})
+        assert list(tmp_path.iterdir()) == []
+        
+        response = client.get("/api/tasks/", headers={**auth_headers, "X-Profile": "1", "X-Admin-Token": "admin-secret"})
+        
+        assert response.status_code == 200
+        reports = list(tmp_path.iterdir())
+        assert len(reports) == 1
+        assert reports[0].read_text().startswith("GET /api/tasks/")
+
+@pytest.mark.integration
+class TestAdminAPI:
+    
+    def test_metrics_require_admin_token(self, client, monkeypatch):
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        
+        assert client.get("/api/admin/metrics").status_code == 403
+        assert client.get("/api/admin/metrics", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    
+    def test_metrics_report_read_model_hits(self, client, auth_headers, monkeypatch, test_db_session):
+        from application.read_model import CachedTaskRepository, task_read_model
+        from application.services import TaskService
+        from infrastructure.repositories import TaskRepository
+        from main import app
+        from presentation.dependencies import get_task_service
+        
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        monkeypatch.setitem(app.dependency_overrides, get_task_service, lambda: TaskService(CachedTaskRepository(TaskRepository(test_db_session))))
+        task_read_model.clear()
+        admin_headers = {"X-Admin-Token": "admin-secret"}
+        before = client.get("/api/admin/metrics", headers=admin_headers).json()["read_model"]["hits"]
+        
+        client.get("/api/tasks/", headers=auth_headers)
+        client.get("/api/tasks/", headers=auth_headers)
+        
+        after = client.get("/api/admin/metrics", headers=admin_headers).json()["read_model"]["hits"]
+        assert after >= before + 1
+    
+    def test_memory_diagnostics(self, client, auth_headers, monkeypatch, test_db_session):
+        from infrastructure.orm_models import UserModel
+        from infrastructure.memory import memory_sampler
+        
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        admin_headers = {"X-Admin-Token": "admin-secret"}
+        assert client.get("/api/admin/memory").status_code == 403
+        assert client.post("/api/admin/memory/snapshots").status_code == 403
+        
+        users = test_db_session.query(UserModel).all()
+        report = client.get("/api/admin/memory", headers=admin_headers).json()
+        assert report["rss_bytes"] > 0
+        assert report["sessions"]["live"] >= 1
+        assert report["sessions"]["identity_map_objects"] >= len(users) > 0
+        assert report["tracemalloc"]["tracing"] is False
+        
+        try:
+            first = client.post("/api/admin/memory/snapshots", headers=admin_headers).json()
+            assert "growth" not in first
+            kept = [bytearray(1024) for _ in range(64)]
+            second = client.post("/api/admin/memory/snapshots?top=50", headers=admin_headers).json()
+            assert second["top_sites"][0]["traceback"]
+            assert any("test_integration_api.py" in site["traceback"][0] and site["size_diff_bytes"] >= 64 * 1024 for site in second["growth"])
+            assert client.get("/api/admin/memory", headers=admin_headers).json()["tracemalloc"]["snapshots"] >= 2
+        finally:
+            assert client.delete("/api/admin/memory/snapshots", headers=admin_headers).status_code == 204
+        assert client.get("/api/admin/memory", headers=admin_headers).json()["tracemalloc"]["tracing"] is False
+        del kept
+        
+        memory_sampler.run_once()
+        series = client.get("/api/admin/memory/series?limit=1", headers=admin_headers).json()
+        assert len(series) == 1
+        assert series[0]["rss_bytes"] > 0 and len(series[0]["gc_counts"]) == 3
+    
+    def test_provision_users(self, client, monkeypatch):
+        from uuid import uuid4
+        
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        prefix = uuid4().hex[:8]
+        users = [{"username": f"{prefix}-{i}", "email": f"{prefix}-{i}@example.com", "password": "pass123"} for i in range(3)]
+        
+        assert client.post("/api/admin/users", json={"users": users}).status_code == 403
+        
+        response = client.post("/api/admin/users", json={"users": users}, headers={"X-Admin-Token": "admin-secret"})
+        assert response.status_code == 200
+        assert [user["username"] for user in response.json()["created"]] == [user["username"] for user in users]
+        
+        again = client.post("/api/admin/users", json={"users": users}, headers={"X-Admin-Token": "admin-secret"}).json()
+        assert again["created"] == []
+        assert {user["reason"] for user in again["skipped"]} == {"already exists"}
+        
+        login = client.post("/api/auth/login", data={"username": users[0]["username"], "password": "pass123"})
+        assert login.status_code == 200
+
+@pytest.mark.integration
+class TestAdmissionControlAPI:
+    
+    @pytest.fixture
+    def controller(self, monkeypatch):
+        from infrastructure.rate_limiting import RateLimit, admission_controller
+        
+        monkeypatch.setattr(admission_controller, "enabled", True)
+        limits = {kind: RateLimit(rate=0.01, burst=2) for kind in ("read", "write", "auth")}
+        monkeypatch.setattr(admission_controller, "limits", {**limits, "auth_address": RateLimit(rate=0.01, burst=4)})
+        admission_controller.reset()
+        yield admission_controller
+        admission_controller.reset()
+    
+    def test_writes_are_rate_limited_per_user(self, client, auth_headers, controller):
+        statuses = [
+            client.post("/api/tasks/", json={"title": f"Burst {i}", "priority": "low"}, headers=auth_headers).status_code
+            for i in range(3)
+        ]
+        
+        assert statuses[:2] == [201, 201]
+        assert statuses[2] == 429
+        assert client.get("/api/tasks/", headers=auth_headers).status_code == 200
+    
+    def test_logins_are_rate_limited_per_address_and_username(self, client, test_user, controller):
+        def login(username):
+            return client.post("/api/auth/login", data={"username": username, "password": "wrong"}).status_code
+        
+        statuses = [login("testuser") for _ in range(3)]
+        
+        assert statuses == [401, 401, 429]
+        assert login("someone-else") == 401
+    
+    def test_cycling_usernames_hits_the_address_limit(self, client, controller):
+        statuses = [
+            client.post("/api/auth/login", data={"username": f"guess-{i}", "password": "wrong"}).status_code
+            for i in range(5)
+        ]
+        
+        assert statuses == [401, 401, 401, 401, 429]
+        assert controller.stats()["rejections"] == {"rate_limited_auth_address": 1}
+    
+    def test_load_shedding_returns_503_with_retry_after(self, client, auth_headers, controller, monkeypatch):
+        monkeypatch.setattr(controller, "max_in_flight", 0)
+        
+        response = client.get("/api/tasks/", headers=auth_headers)
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert controller.stats()["rejections"]["shed"] == 1
+
+@pytest.mark.integration
+class TestQueryPlans:
+    # Every statement the task and user repositories send while the API is
+    # exercised is explained against the test schema. Reading all of tasks,
+    # subtasks or users, or sorting their rows in a temp B-tree, fails.
+    
+    WATCHED_TABLES = ("tasks", "subtasks", "users")
+    
+    @pytest.fixture
+    def repository_statements(self, test_db_session):
+        import sys
+        from sqlalchemy import event
+        from infrastructure.repositories import TaskRepository, UserRepository
+        
+        connection = test_db_session.connection()
+        statements = {}
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            frame = sys._getframe()
+            while frame is not None:
+                owner = frame.f_locals.get("self")
+                if isinstance(owner, (TaskRepository, UserRepository)):
+                    if executemany and parameters and isinstance(parameters[0], (tuple, list)):
+                        parameters = parameters[0]
+                    statements.setdefault(statement, (f"{type(owner).__name__}.{frame.f_code.co_name}", tuple(parameters or ())))
+                    return
+                frame = frame.f_back
+        
+        event.listen(connection, "before_cursor_execute", record)
+        yield statements
+        event.remove(connection, "before_cursor_execute", record)
+    
+    def _exercise_api(self, client, headers, monkeypatch, test_db_session):
+        from infrastructure.archiving import archive_worker
+        
+        window = {"from": "2029-01-01T00:00:00", "to": "2031-01-01T00:00:00"}
+        task_ids = [
+            client.post("/api/tasks/", json={"title": f"Task {i}", "category": f"Category {i % 2}", "deadline": "2030-01-01T00:00:00"}, headers=headers).json()["id"]
+            for i in range(5)
+        ]
+        client.post("/api/tasks/", json={"title": "Daily", "recurrence": {"frequency": "daily"}}, headers=headers)
+        task_id = task_ids[0]
+        subtask_id = client.post(f"/api/tasks/{task_id}/subtasks", json={"title": "Step"}, headers=headers).json()["id"]
+        client.post(f"/api/tasks/{task_id}/subtasks/bulk", json={"titles": ["A", "B"]}, headers=headers)
+        client.put(f"/api/tasks/{task_id}/subtasks/{subtask_id}", json={"completed": True}, headers=headers)
+        client.delete(f"/api/tasks/{task_id}/subtasks/completed", headers=headers)
+        client.put(f"/api/tasks/{task_id}/subtasks", json={"completed": True}, headers=headers)
+        client.delete(f"/api/tasks/{task_id}/subtasks/{subtask_id + 1}", headers=headers)
+        
+        for query in ({}, {"fields": "title"}, {"fields": "title", "include": "subtasks,subtask_counts"}):
+            for path in ("/api/tasks/", "/api/tasks/visible", "/api/tasks/overdue", f"/api/tasks/{task_id}"):
+                client.get(path, params=query, headers=headers)
+            client.get("/api/tasks/due", params={**window, **query}, headers=headers)
+        client.get("/api/tasks/export", headers=headers)
+        client.post("/api/tasks/import", files={"file": ("tasks.ndjson", b'{"title": "Imported", "subtasks": [{"title": "Step"}]}\n')}, headers=headers)
+        client.get("/api/tasks/facets", headers=headers)
+        category_id = client.post("/api/tasks/categories", json={"name": "Short-lived"}, headers=headers).json()["id"]
+        client.get("/api/tasks/categories", headers=headers)
+        client.delete(f"/api/tasks/categories/{category_id}", headers=headers)
+        
+        client.put(f"/api/tasks/{task_ids[1]}", json={"title": "Renamed", "completed": True}, headers=headers)
+        client.put("/api/tasks/positions/update", json={str(task_ids[2]): 3, str(task_ids[3]): 2}, headers=headers)
+        client.post("/api/tasks/ops", json={"operations": [
+            {"op": "create", "title": "Batched"},
+            {"op": "update", "task_id": task_ids[2], "priority": "high"},
+            {"op": "subtask_add", "task_id": task_ids[2], "title": "Step"},
+            {"op": "move", "positions": {str(task_ids[2]): 0}},
+            {"op": "delete", "task_id": task_ids[3]},
+        ]}, headers=headers)
+        
+        client.post("/api/auth/register", json={"username": "planner", "email": "planner@example.com", "password": "pass123"})
+        workspace_id = client.post("/api/workspaces/", json={"name": "Plans"}, headers=headers).json()["id"]
+        client.put(f"/api/workspaces/{workspace_id}/members", json={"username": "planner", "role": "editor"}, headers=headers)
+        client.post(f"/api/workspaces/{workspace_id}/tasks", json={"title": "Shared"}, headers=headers)
+        client.get(f"/api/workspaces/{workspace_id}/tasks", headers=headers)
+        client.get(f"/api/workspaces/{workspace_id}/tasks", params={"fields": "title"}, headers=headers)
+        client.get("/api/tasks/visible", headers=headers)
+        client.get("/api/tasks/visible", params={"include": "subtasks"}, headers=headers)
+        
+        monkeypatch.setattr("infrastructure.auth.ADMIN_TOKEN", "admin-secret")
+        client.post("/api/admin/users", json={"users": [{"username": "provisioned", "email": "provisioned@example.com", "password": "pass123"}]}, headers={"X-Admin-Token": "admin-secret"})
+        
+        monkeypatch.setattr("infrastructure.archiving.storage_engines", lambda: [test_db_session.connection()])
+        monkeypatch.setattr(archive_worker, "after_days", -1)
+        archive_worker.run_once()
+        client.get("/api/tasks/archive", headers=headers)
+        client.post(f"/api/tasks/archive/{task_ids[1]}/restore", headers=headers)
+        client.put(f"/api/tasks/{task_ids[4]}", json={"completed": True}, headers=headers)
+        client.delete("/api/tasks/completed/all", headers=headers)
+        client.delete(f"/api/tasks/{task_ids[0]}", headers=headers)
+    
+    def test_visible_tasks_load_subtasks_in_bulk(self, client, auth_headers, test_db_session):
+        from sqlalchemy import event
+        
+        workspace_id = client.post("/api/workspaces/", json={"name": "Plans"}, headers=auth_headers).json()["id"]
+        for i in range(5):
+            for path in ("/api/tasks/", f"/api/workspaces/{workspace_id}/tasks"):
+                task_id = client.post(path, json={"title": f"Task {i}"}, headers=auth_headers).json()["id"]
+                client.post(f"/api/tasks/{task_id}/subtasks/bulk", json={"titles": ["A", "B"]}, headers=auth_headers)
+        
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not statement.startswith(("SAVEPOINT", "RELEASE")):
+                statements.append(statement)
+        
+        connection = test_db_session.connection()
+        event.listen(connection, "before_cursor_execute", record)
+        try:
+            tasks = client.get("/api/tasks/visible", headers=auth_headers).json()
+        finally:
+            event.remove(connection, "before_cursor_execute", record)
+        
+        assert len(tasks) == 10 and all(len(task["subtasks"]) == 2 for task in tasks)
+        # Token user, recurring series, then tasks and their subtasks for each
+        # half; a lazy load per task would add one statement per task.
+        assert len(statements) == 6
+    
+    def test_repository_queries_use_indexes(self, client, auth_headers, monkeypatch, test_db_session, repository_statements):
+        import re
+        
+        self._exercise_api(client, auth_headers, monkeypatch, test_db_session)
+        statements = dict(repository_statements)
+        
+        methods = {method for method, _ in statements.values()}
+        assert {"TaskRepository.get_all_by_user", "TaskRepository.get_visible", "TaskRepository._projected", "TaskRepository.iter_tasks",
+                "TaskRepository.get_archived", "TaskRepository.delete_completed", "UserRepository.get_by_username"} <= methods
+        
+        tables = "|".join(self.WATCHED_TABLES)
+        reads_watched = re.compile(rf"^(SEARCH|SCAN) ({tables})\b")
+        full_scan = re.compile(rf"^SCAN ({tables})\b")
+        problems = []
+        connection = test_db_session.connection()
+        for statement, (method, parameters) in statements.items():
+            if statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+                continue
+            details = [row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            bad = [detail for detail in details if full_scan.match(detail)]
+            if any(reads_watched.match(detail) for detail in details):
+                bad += [detail for detail in details if detail.startswith("USE TEMP B-TREE")]
+            if bad:
+                problems.append(f"{method}: {bad}\n    {' '.join(statement.split())[:300]}")
+        
+        assert not problems, "Unindexed repository queries:\n" + "\n".join(problems)
@@ -50,6 +50,41 @@ class TestAuthService:
         assert token is not None
         assert isinstance(token, str)
         assert len(token) > 0
+    
+    def test_provision_users_skips_existing_and_repeated(self, auth_service, test_user):
+        result = auth_service.provision_users([
+            UserCreate(username="bulk1", email="bulk1@example.com", password="pass123"),
+            UserCreate(username="testuser", email="bulk2@example.com", password="pass123"),
+            UserCreate(username="bulk3", email="test@example.com", password="pass123"),
+            UserCreate(username="bulk1", email="bulk4@example.com", password="pass123"),
+            UserCreate(username="bulk5", email="bulk5@example.com", password="pass123"),
+        ])
+        
+        assert [user.username for user in result.created] == ["bulk1", "bulk5"]
+        assert [(user.username, user.email) for user in result.skipped] == [
+            ("testuser", "bulk2@example.com"), ("bulk3", "test@example.com"), ("bulk1", "bulk4@example.com"),
+        ]
+        assert auth_service.authenticate_user("bulk5", "pass123") is not None
+    
+    def test_provision_users_reports_concurrent_registrations(self, auth_service, user_repository, monkeypatch):
+        monkeypatch.setattr(user_repository, "find_existing", lambda usernames, emails: [])
+        auth_service.register_user(UserCreate(username="racer", email="racer@example.com", password="pass123"))
+        
+        result = auth_service.provision_users([
+            UserCreate(username="racer", email="racer2@example.com", password="pass123"),
+            UserCreate(username="calm", email="calm@example.com", password="pass123"),
+        ])
+        
+        assert [user.username for user in result.created] == ["calm"]
+        assert result.skipped[0].reason == "registered concurrently"
+    
+    def test_hash_passwords_in_parallel(self, monkeypatch):
+        from infrastructure.auth import hash_passwords, verify_password
+        
+        monkeypatch.setattr("infrastructure.auth.PASSWORD_HASH_WORKERS", 4)
+        hashed = hash_passwords(["one", "two", "three"])
+        
+        assert [verify_password(p, h) for p, h in zip(["one", "two", "three"], hashed)] == [True, True, True]
 
 @pytest.mark.unit
 @pytest.mark.tasks
@@ -192,3 +227,1065 @@ class TestSubtaskOperations:
         result = task_service.delete_subtask(subtask.id, task.id, test_user.id)
         
         assert result is True
+    
+    def test_subtasks_keep_creation_order(self, task_repository, test_user):
+        task = task_repository.create("Parent Task", test_user.id)
+        subtasks = task_repository.add_subtasks(task.id, test_user.id, ["First", "Second", "Third"])
+        task_repository.toggle_subtask(subtasks[0].id, task.id, test_user.id, True)
+        task_repository.db.expire_all()
+        
+        listed = next(t for t in task_repository.get_all_by_user(test_user.id) if t.id == task.id)
+        
+        assert [s.title for s in listed.subtasks] == ["First", "Second", "Third"]
+        assert [s.title for s in task_repository.get_by_id(task.id, test_user.id).subtasks] == ["First", "Second", "Third"]
+
+@pytest.mark.unit
+class TestMigrations:
+    
+    @staticmethod
+    def _schema(engine):
+        from sqlalchemy import inspect
+        inspector = inspect(engine)
+        schema = {}
+        for table in inspector.get_table_names():
+            if table in ("schema_version", "sqlite_sequence"):
+                continue
+            columns = {(c["name"], str(c["type"]), c["nullable"]) for c in inspector.get_columns(table)}
+            indexes = {(i["name"], tuple(i["column_names"]), bool(i["unique"])) for i in inspector.get_indexes(table)}
+            schema[table] = (columns, indexes)
+        return schema
+    
+    def test_migrations_match_orm_models(self, tmp_path):
+        from sqlalchemy import create_engine
+        from infrastructure.database import Base
+        from infrastructure.migrations import upgrade
+        import infrastructure.orm_models  # noqa: F401
+        
+        migrated = create_engine(f"sqlite:///{tmp_path}/migrated.db")
+        upgrade(migrated)
+        declared = create_engine(f"sqlite:///{tmp_path}/declared.db")
+        Base.metadata.create_all(bind=declared)
+        
+        assert self._schema(migrated) == self._schema(declared)
+    
+    def test_upgrade_is_idempotent_and_checked(self, tmp_path):
+        from sqlalchemy import create_engine
+        from infrastructure.migrations import LATEST_VERSION, SchemaVersionError, check_schema, upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/app.db")
+        with pytest.raises(SchemaVersionError):
+            check_schema(engine)
+        
+        assert upgrade(engine)[-1] == LATEST_VERSION
+        assert upgrade(engine) == []
+        assert check_schema(engine) == LATEST_VERSION
+    
+    def test_completed_tasks_get_completion_time_of_upgrade(self, tmp_path):
+        from sqlalchemy import create_engine, text
+        from infrastructure.migrations import upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/app.db")
+        upgrade(engine, target=2)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')"))
+            connection.execute(text("INSERT INTO tasks (title, completed, user_id, created_at) VALUES ('Done long ago', 1, 1, '2020-01-01 00:00:00'), ('Open', 0, 1, '2020-01-01 00:00:00')"))
+        started = datetime.utcnow().replace(microsecond=0)
+        upgrade(engine)
+        
+        with engine.connect() as connection:
+            rows = dict(connection.execute(text("SELECT title, completed_at FROM tasks")).all())
+        assert datetime.fromisoformat(rows["Done long ago"]) >= started
+        assert rows["Open"] is None
+    
+    def test_custom_recurrence_becomes_daily(self, tmp_path):
+        from sqlalchemy import create_engine, text
+        from infrastructure.migrations import upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/app.db")
+        upgrade(engine, target=11)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')"))
+            connection.execute(text("INSERT INTO tasks (title, user_id, recurrence_frequency, recurrence_interval) VALUES ('Water plants', 1, 'custom', 3)"))
+        upgrade(engine)
+        
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT recurrence_frequency, recurrence_interval FROM tasks")).one() == ("daily", 3)
+
+@pytest.mark.unit
+class TestSharding:
+    
+    @pytest.fixture
+    def sharded_storage(self, tmp_path, monkeypatch):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure import repositories, sharding
+        from infrastructure.database import ShardSessionFactory
+        from infrastructure.migrations import upgrade
+        
+        main_engine = create_engine(f"sqlite:///{tmp_path}/main.db")
+        upgrade(main_engine)
+        main_sessions = sessionmaker(bind=main_engine)
+        shards = ShardSessionFactory(f"sqlite:///{tmp_path}/shard_{{}}.db")
+        for shard in range(4):
+            upgrade(shards.engine(shard))
+            sharding.seed_id_range(shards.engine(shard), shard)
+        for module in (sharding, repositories):
+            monkeypatch.setattr(module, "SessionLocal", main_sessions)
+            monkeypatch.setattr(module, "shard_sessions", shards)
+        return main_sessions, shards
+    
+    def test_jump_hash_moves_few_users_when_growing(self):
+        from infrastructure.sharding import jump_hash
+        
+        moved = sum(jump_hash(user_id, 4) != jump_hash(user_id, 5) for user_id in range(1, 2001))
+        
+        assert all(0 <= jump_hash(user_id, 4) < 4 for user_id in range(1, 100))
+        assert moved < 2000 * 0.3
+    
+    def test_tasks_are_stored_in_the_users_shard(self, sharded_storage):
+        from infrastructure.orm_models import TaskModel
+        from infrastructure.repositories import ShardedTaskRepository, ShardedUserRepository
+        from infrastructure.sharding import ShardRouter, SHARD_ID_RANGE
+        
+        main_sessions, shards = sharded_storage
+        router = ShardRouter(4, session_factory=main_sessions)
+        users = [ShardedUserRepository(main_sessions(), router).create(f"user{i}", f"u{i}@example.com", "x") for i in range(8)]
+        repository = ShardedTaskRepository(router)
+        tasks = [repository.create(f"Task of {user.username}", user.id) for user in users]
+        
+        for user, task in zip(users, tasks):
+            shard = router.shard_for(user.id)
+            assert task.id > (shard + 1) * SHARD_ID_RANGE
+            with shards.session(shard) as db:
+                assert db.query(TaskModel).filter(TaskModel.user_id == user.id).count() == 1
+            assert [t.title for t in repository.get_all_by_user(user.id)] == [task.title]
+        assert len({task.id for task in tasks}) == len(tasks)
+    
+    def test_rebalance_moves_tasks_out_of_main_database(self, sharded_storage):
+        from infrastructure.repositories import ShardedTaskRepository, TaskRepository, UserRepository
+        from infrastructure.sharding import ShardRouter, rebalance_shards
+        
+        main_sessions, shards = sharded_storage
+        user = UserRepository(main_sessions()).create("legacy", "legacy@example.com", "x")
+        task = TaskRepository(main_sessions()).create("Legacy task", user.id)
+        TaskRepository(main_sessions()).add_subtask(task.id, user.id, "Legacy subtask")
+        
+        summary = rebalance_shards(3)
+        
+        assert summary["users_moved"] == 1
+        assert TaskRepository(main_sessions()).get_all_by_user(user.id) == []
+        moved = ShardedTaskRepository(ShardRouter(3, session_factory=main_sessions)).get_by_id(task.id, user.id)
+        assert moved.title == "Legacy task"
+        assert [s.title for s in moved.subtasks] == ["Legacy subtask"]
+        assert moved.subtask_total == 1
+        assert rebalance_shards(3)["users_moved"] == 0
+    
+    def test_rebalance_keeps_categories_of_workspace_tasks(self, sharded_storage):
+        from infrastructure.repositories import ShardedTaskRepository, TaskRepository, UserRepository, WorkspaceRepository
+        from infrastructure.sharding import ShardRouter, rebalance_shards
+        
+        main_sessions, shards = sharded_storage
+        user = UserRepository(main_sessions()).create("member", "member@example.com", "x")
+        workspace = WorkspaceRepository(main_sessions()).create("Team", user.id)
+        shared = TaskRepository(main_sessions()).create("Shared", user.id, category="work", workspace_id=workspace.id)
+        personal = TaskRepository(main_sessions()).create("Mine", user.id, category="work")
+        
+        rebalance_shards(3)
+        
+        repository = ShardedTaskRepository(ShardRouter(3, session_factory=main_sessions))
+        assert repository.get_by_id(shared.id, user.id).category == "work"
+        assert repository.get_by_id(personal.id, user.id).category == "work"
+        
+        rebalance_shards(1)
+        
+        main = TaskRepository(main_sessions())
+        assert main.get_by_id(shared.id, user.id).category == "work"
+        assert main.get_by_id(personal.id, user.id).category == "work"
+        assert [c.name for c in main.get_categories(user.id)] == ["work"]
+    
+    def test_route_cache_is_bounded_and_follows_moves(self, sharded_storage, monkeypatch):
+        from infrastructure import sharding
+        from infrastructure.repositories import UserRepository
+        from infrastructure.sharding import ShardRouter, rebalance_shards
+        
+        main_sessions, shards = sharded_storage
+        router = ShardRouter(3, session_factory=main_sessions, cache_size=2)
+        monkeypatch.setattr(sharding, "shard_router", router)
+        users = [UserRepository(main_sessions()).create(f"routed{i}", f"routed{i}@example.com", "x") for i in range(3)]
+        
+        assert [router.shard_for(user.id) for user in users] == [None, None, None]
+        assert list(router._routes) == [users[1].id, users[2].id]
+        
+        rebalance_shards(3)
+        
+        assert [router.shard_for(user.id) for user in users] == [router.home_shard(user.id) for user in users]
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestArchiving:
+    
+    @pytest.fixture
+    def sessions(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/archive.db")
+        upgrade(engine)
+        return sessionmaker(bind=engine)
+    
+    def test_completion_time_is_tracked(self, sessions):
+        from infrastructure.repositories import TaskRepository
+        
+        repository = TaskRepository(sessions())
+        task = repository.create("Track me", 1)
+        completed = repository.update(task.id, 1, completed=True)
+        
+        assert task.completed_at is None
+        assert completed.completed_at is not None
+        assert repository.update(task.id, 1, completed=True).completed_at == completed.completed_at
+        assert repository.update(task.id, 1, completed=False).completed_at is None
+    
+    def test_archive_batches_and_restore(self, sessions):
+        from sqlalchemy import update
+        from infrastructure.archiving import archive_batch
+        from infrastructure.orm_models import TaskModel
+        from infrastructure.repositories import TaskRepository
+        
+        repository = TaskRepository(sessions())
+        old = [repository.create(f"Old {i}", 1) for i in range(3)]
+        recent = repository.create("Recent", 1)
+        active = repository.create("Active", 1)
+        repository.add_subtask(old[0].id, 1, "Old subtask")
+        for task in old + [recent]:
+            repository.update(task.id, 1, completed=True)
+        with sessions() as db:
+            db.execute(update(TaskModel).where(TaskModel.id.in_([t.id for t in old])).values(completed_at=datetime.utcnow() - timedelta(days=40)))
+            db.commit()
+        
+        cutoff = datetime.utcnow() - timedelta(days=30)
+        with sessions() as db:
+            assert archive_batch(db, cutoff, batch_size=2) == [1, 1]
+            assert archive_batch(db, cutoff, batch_size=2) == [1]
+            assert archive_batch(db, cutoff, batch_size=2) == []
+        
+        repository = TaskRepository(sessions())
+        assert [t.title for t in repository.get_all_by_user(1)] == ["Recent", "Active"]
+        archived = repository.get_archived(1)
+        assert sorted(t.title for t in archived) == ["Old 0", "Old 1", "Old 2"]
+        assert all(t.archived_at is not None for t in archived)
+        assert repository.get_archived(1, offset=1, limit=1)[0].id == archived[1].id
+        
+        restored = repository.restore_archived(old[0].id, 1)
+        
+        assert restored.id == old[0].id
+        assert [s.title for s in restored.subtasks] == ["Old subtask"]
+        assert restored.completed_at > cutoff
+        assert len(repository.get_archived(1)) == 2
+        assert repository.get_by_id(old[0].id, 1).title == "Old 0"
+        assert repository.restore_archived(old[0].id, 1) is None
+        assert repository.restore_archived(old[1].id, 2) is None
+    
+    def test_workspace_tasks_are_not_archived(self, sessions):
+        from sqlalchemy import update
+        from infrastructure.archiving import archive_batch
+        from infrastructure.orm_models import TaskModel
+        from infrastructure.repositories import TaskRepository, WorkspaceRepository
+        
+        workspace = WorkspaceRepository(sessions()).create("Team", 1)
+        repository = TaskRepository(sessions())
+        shared = repository.create("Shared", 1, workspace_id=workspace.id)
+        personal = repository.create("Personal", 1)
+        for task in (shared, personal):
+            repository.update(task.id, 1, completed=True)
+        with sessions() as db:
+            db.execute(update(TaskModel).values(completed_at=datetime.utcnow() - timedelta(days=40)))
+            db.commit()
+        
+        with sessions() as db:
+            assert archive_batch(db, datetime.utcnow() - timedelta(days=30)) == [1]
+        
+        repository = TaskRepository(sessions())
+        assert [t.title for t in repository.get_archived(1)] == ["Personal"]
+        assert [t.title for t in repository.get_all_by_user(1, workspace_id=workspace.id)] == ["Shared"]
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestRecurringTasks:
+    
+    @pytest.fixture
+    def repository(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/recurring.db")
+        upgrade(engine)
+        return TaskRepository(sessionmaker(bind=engine)())
+    
+    def test_occurrences_are_counted_from_the_start(self):
+        from domain.models import Recurrence
+        from domain.recurrence import first_index_from, occurrence_at
+        
+        monthly = Recurrence("monthly", 1, datetime(2026, 1, 31, 9))
+        fortnightly = Recurrence("weekly", 2, datetime(2026, 1, 5, 9))
+        
+        assert [occurrence_at(monthly, i).day for i in range(4)] == [31, 28, 31, 30]
+        assert first_index_from(monthly, datetime(2026, 3, 1)) == 2
+        assert first_index_from(fortnightly, datetime(2026, 1, 19, 9)) == 1
+        assert first_index_from(fortnightly, datetime(2026, 1, 19, 10)) == 2
+    
+    def test_next_occurrence_is_materialized_after_completion(self, repository):
+        from domain.models import Recurrence
+        
+        now = datetime.utcnow()
+        first = repository.create("Water plants", 1, now - timedelta(days=3), recurrence=Recurrence("daily", 1))
+        repository.add_subtasks(first.id, 1, ["Kitchen", "Balcony"])
+        assert [t.id for t in repository.get_all_by_user(1)] == [first.id]
+        
+        repository.update(first.id, 1, completed=True)
+        tasks = repository.get_all_by_user(1)
+        
+        assert len(tasks) == 2
+        upcoming = tasks[1]
+        assert upcoming.series_id == first.id and not upcoming.completed
+        assert now <= upcoming.deadline <= now + timedelta(days=1)
+        assert [s.title for s in upcoming.subtasks] == ["Kitchen", "Balcony"]
+        assert repository.get_all_by_user(1) == tasks
+    
+    def test_window_materializes_only_requested_occurrences(self, repository):
+        from domain.models import Recurrence
+        
+        now = datetime.utcnow()
+        first = repository.create("Stand-up", 1, now + timedelta(hours=1), recurrence=Recurrence("daily", 1))
+        
+        due = repository.get_due(1, now, now + timedelta(days=5))
+        
+        assert [t.occurrence for t in due] == [0, 1, 2, 3, 4]
+        assert len(repository.get_all_by_user(1)) == 5
+        assert len(repository.get_due(1, now, now + timedelta(days=5))) == 5
+        assert all(t.series_id == first.id for t in due)
+    
+    def test_completed_occurrences_are_compacted(self, repository):
+        from domain.models import Recurrence
+        
+        now = datetime.utcnow()
+        first = repository.create("Stand-up", 1, now + timedelta(hours=1), recurrence=Recurrence("daily", 1))
+        occurrences = repository.get_due(1, now, now + timedelta(days=3))
+        for task in occurrences:
+            repository.update(task.id, 1, completed=True)
+        
+        tasks = repository.get_all_by_user(1)
+        
+        assert [(t.occurrence, t.completed) for t in tasks] == [(2, True), (3, False)]
+        assert repository.delete(tasks[1].id, 1) is True
+        assert repository.get_all_by_user(1) == []
+        assert repository.get_by_id(first.id, 1) is None
+    
+    def test_cached_repository_sees_new_occurrences(self, repository):
+        from application.read_model import CachedTaskRepository, TaskReadModel
+        from domain.models import Recurrence
+        
+        now = datetime.utcnow()
+        cached = CachedTaskRepository(repository, TaskReadModel())
+        first = cached.create("Laundry", 1, now + timedelta(hours=1), recurrence=Recurrence("weekly", 1))
+        cached.get_all_by_user(1)
+        
+        assert [t.occurrence for t in cached.get_due(1, now, now + timedelta(days=15))] == [0, 1, 2]
+        cached.update(first.id, 1, completed=True)
+        
+        assert [(t.occurrence, t.completed) for t in cached.get_all_by_user(1)] == [(0, True), (1, False), (2, False)]
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestDeadlineQueries:
+    
+    @pytest.fixture
+    def repository(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/deadlines.db")
+        upgrade(engine)
+        return TaskRepository(sessionmaker(bind=engine)())
+    
+    def test_deadline_queries_use_index(self, repository):
+        from sqlalchemy import event
+        
+        engine = repository.db.get_bind()
+        statements = []
+        
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+        
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            now = datetime.utcnow()
+            repository.get_due(1, now, now + timedelta(days=1))
+            repository.get_overdue(1, now)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        
+        deadline_reads = [(statement, parameters) for statement, parameters in statements if "tasks.deadline <" in statement]
+        assert len(deadline_reads) == 2
+        for statement, parameters in deadline_reads:
+            plan = " ".join(row[3] for row in repository.db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+            assert "ix_tasks_user_id_workspace_id_completed_deadline" in plan
+            assert "TEMP B-TREE" not in plan
+    
+    def test_cached_repository_matches_database(self, repository):
+        from application.read_model import CachedTaskRepository, TaskReadModel
+        
+        now = datetime.utcnow()
+        for days in (-3, -1, 1, 2, 10):
+            repository.create(f"In {days} days", 1, deadline=now + timedelta(days=days))
+        repository.create("No deadline", 1)
+        cached = CachedTaskRepository(repository, TaskReadModel())
+        cached.get_all_by_user(1)
+        
+        window = (now - timedelta(days=2), now + timedelta(days=5))
+        assert [t.id for t in cached.get_due(1, *window, limit=2)] == [t.id for t in repository.get_due(1, *window, limit=2)]
+        assert [t.title for t in cached.get_overdue(1, now)] == ["In -3 days", "In -1 days"]
+        assert cached.read_model.stats()["hits"] == 2
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestCategoryFacets:
+    
+    @pytest.fixture
+    def repository(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/facets.db")
+        upgrade(engine)
+        return TaskRepository(sessionmaker(bind=engine)())
+    
+    def test_facets_count_categories_priorities_and_completion(self, repository):
+        repository.create("Report", 1, priority="high", category="work")
+        done = repository.create("Standup", 1, category="work")
+        repository.create("Run", 1, priority="low", category="sport")
+        repository.create("Other user", 2, category="work")
+        repository.update(done.id, 1, completed=True)
+        repository.create_category(1, "reading")
+        
+        facets = repository.get_facets(1)
+        
+        assert [(c.name, c.task_count) for c in facets.categories] == [("reading", 0), ("sport", 1), ("work", 2)]
+        assert facets.uncategorized == 0
+        assert facets.priorities == {"low": 1, "medium": 1, "high": 1}
+        assert (facets.completed, facets.open) == (1, 2)
+    
+    def test_deleting_a_category_clears_it_from_tasks(self, repository):
+        task = repository.create("Report", 1, category="work")
+        work = repository.get_categories(1)[0]
+        
+        assert repository.create_category(1, "work") is None
+        assert repository.delete_category(work.id, 2) is False
+        assert repository.delete_category(work.id, 1) is True
+        assert repository.get_by_id(task.id, 1).category is None
+        assert repository.update(task.id, 1, category="home").category == "home"
+        assert repository.update(task.id, 1, category="").category is None
+        assert repository.get_facets(1).uncategorized == 1
+    
+    def test_facet_queries_are_index_only(self, repository):
+        from sqlalchemy import text
+        
+        for column in ("category_id", "priority_id", "completed"):
+            statement = f"SELECT {column}, count(*) FROM tasks WHERE user_id = 1 AND workspace_id IS NULL GROUP BY {column}"
+            plan = " ".join(row[3] for row in repository.db.execute(text("EXPLAIN QUERY PLAN " + statement)))
+            assert "USING COVERING INDEX" in plan
+            assert "TEMP B-TREE" not in plan
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestWorkspaces:
+    
+    @pytest.fixture
+    def repositories(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository, WorkspaceRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/workspaces.db")
+        upgrade(engine)
+        session = sessionmaker(bind=engine)()
+        return TaskRepository(session), WorkspaceRepository(session)
+    
+    def test_roles_limit_what_members_can_do(self, repositories):
+        tasks, workspaces = repositories
+        workspace = workspaces.create("Household", 1)
+        workspaces.set_member(workspace.id, 2, "viewer")
+        shared = tasks.create("Groceries", 1, workspace_id=workspace.id)
+        
+        assert tasks.create("Not allowed", 2, workspace_id=workspace.id) is None
+        assert tasks.create("Not a member", 3, workspace_id=workspace.id) is None
+        assert tasks.get_by_id(shared.id, 2).title == "Groceries"
+        assert tasks.update(shared.id, 2, completed=True) is None
+        assert tasks.delete(shared.id, 2) is False
+        assert tasks.get_by_id(shared.id, 3) is None
+        
+        workspaces.set_member(workspace.id, 2, "editor")
+        assert tasks.update(shared.id, 2, completed=True).completed is True
+        
+        assert workspaces.remove_member(workspace.id, 2) is True
+        assert tasks.get_by_id(shared.id, 2) is None
+        assert tasks.get_all_by_user(2, workspace.id) == []
+    
+    def test_visible_tasks_combine_personal_and_shared_lists(self, repositories):
+        tasks, workspaces = repositories
+        workspace = workspaces.create("Team", 1)
+        workspaces.set_member(workspace.id, 2, "editor")
+        tasks.create("Mine", 2)
+        tasks.create("Shared", 1, workspace_id=workspace.id)
+        tasks.create("Private", 1)
+        
+        assert [task.title for task in tasks.get_visible(2)] == ["Mine", "Shared"]
+        assert [task.title for task in tasks.get_all_by_user(1)] == ["Private"]
+        assert [task.title for task in tasks.get_all_by_user(1, workspace.id)] == ["Shared"]
+        assert tasks.get_facets(1).open == 1
+        
+        assert workspaces.delete(workspace.id) is True
+        assert [task.title for task in tasks.get_visible(2)] == ["Mine"]
+    
+    def test_deleting_a_category_clears_it_from_workspace_tasks(self, repositories):
+        from sqlalchemy import select
+        from infrastructure.orm_models import TaskModel
+        
+        tasks, workspaces = repositories
+        workspace = workspaces.create("Team", 1)
+        workspaces.set_member(workspace.id, 2, "editor")
+        shared = tasks.create("Shared", 1, workspace_id=workspace.id)
+        tasks.update(shared.id, 2, category="errands")
+        errands = tasks.get_categories(2)[0]
+        
+        assert tasks.delete_category(errands.id, 2) is True
+        assert tasks.db.execute(select(TaskModel.category_id).where(TaskModel.id == shared.id)).scalar() is None
+    
+    def test_visibility_queries_use_indexes(self, repositories):
+        from sqlalchemy import text
+        
+        tasks, _ = repositories
+        statements = (
+            "SELECT workspace_id FROM workspace_members WHERE user_id = 1",
+            "SELECT id FROM tasks WHERE workspace_id IN (SELECT workspace_id FROM workspace_members WHERE user_id = 1) ORDER BY position",
+        )
+        for statement in statements:
+            plan = " ".join(row[3] for row in tasks.db.execute(text("EXPLAIN QUERY PLAN " + statement)))
+            assert "SCAN tasks" not in plan
+            assert "SCAN workspace_members" not in plan
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestWriteCoalescing:
+    
+    @pytest.fixture
+    def sessions(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/coalescing.db", connect_args={"check_same_thread": False, "timeout": 5})
+        upgrade(engine)
+        return sessionmaker(bind=engine)
+    
+    def test_concurrent_writes_share_one_transaction(self, sessions):
+        import threading
+        from application.services import TaskService
+        from application.write_coalescing import WriteCoalescer
+        from infrastructure.repositories import TaskRepository
+        
+        setup = TaskRepository(sessions())
+        first, second = setup.create("First", 1), setup.create("Second", 1)
+        subtask = setup.add_subtask(first.id, 1, "Step")
+        coalescer = WriteCoalescer(window_ms=200)
+        services = [TaskService(TaskRepository(sessions()), coalescer) for _ in range(4)]
+        writes = [
+            lambda service: service.toggle_subtask(subtask.id, first.id, 1, True),
+            lambda service: service.update_task_positions(1, [(first.id, 1), (second.id, 0)]),
+            lambda service: service.toggle_subtask(subtask.id, first.id, 1, False),
+            lambda service: service.toggle_subtask(subtask.id, first.id, 2, True),
+        ]
+        barrier = threading.Barrier(len(writes))
+        results = [None] * len(writes)
+        
+        def run(index):
+            barrier.wait()
+            results[index] = writes[index](services[index])
+        
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(writes))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Whichever toggle arrived last wins, and both callers see that final state.
+        final = setup.get_by_id(first.id, 1).subtasks[0].completed
+        assert results[0].completed is final and results[2].completed is final
+        assert results[1] is True
+        assert results[3] is None
+        assert [task.title for task in setup.get_all_by_user(1)] == ["Second", "First"]
+        stats = coalescer.stats()
+        assert (stats["requests"], stats["transactions"]) == (4, 2)
+        assert stats["coalescing_ratio"] == 2.0
+        assert stats["added_latency_ms_max"] >= 150
+    
+    def test_service_without_coalescer_writes_directly(self, task_service, test_user):
+        task = task_service.create_task(TaskCreate(title="Plain"), test_user.id)
+        subtask = task_service.add_subtask(task.id, test_user.id, "Step")
+        
+        assert task_service.toggle_subtask(subtask.id, task.id, test_user.id, True).completed is True
+        assert task_service.update_task_positions(test_user.id, [(task.id, 3)]) is True
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestTaskTransfer:
+    
+    @pytest.fixture
+    def repository(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/transfer.db")
+        upgrade(engine)
+        return TaskRepository(sessionmaker(bind=engine)())
+    
+    def test_iter_tasks_streams_in_chunks(self, repository):
+        from infrastructure.profiling import RequestStats, current_request_stats, install_request_diagnostics
+        
+        install_request_diagnostics()
+        for i in range(5):
+            task = repository.create(f"Task {i}", 1)
+            repository.add_subtask(task.id, 1, f"Sub {i}")
+        
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            tasks = list(repository.iter_tasks(1, chunk_size=2))
+        finally:
+            current_request_stats.reset(token)
+        
+        assert [t.title for t in tasks] == [f"Task {i}" for i in range(5)]
+        assert [[s.title for s in t.subtasks] for t in tasks] == [[f"Sub {i}"] for i in range(5)]
+        assert stats.sql_count == 1 + 3
+    
+    def test_import_commits_in_batches(self, repository):
+        import io
+        from application.services import TaskService
+        from application import task_transfer
+        
+        upload = io.BytesIO("".join(f'{{"title": "Imported {i}", "subtasks": [{{"title": "s"}}]}}\n' for i in range(5)).encode())
+        batches = []
+        service = TaskService(repository)
+        save = lambda batch: batches.append(len(batch)) or repository.import_tasks(1, batch)
+        
+        summary = task_transfer.import_tasks(upload, "ndjson", save, lambda value: value, batch_size=2)
+        
+        assert batches == [2, 2, 1]
+        assert summary.imported == 5 and summary.subtasks == 5 and summary.batches == 3
+        tasks = service.get_all_tasks(1)
+        assert [t.position for t in tasks] == list(range(5))
+        assert all(len(t.subtasks) == 1 for t in tasks)
+
+@pytest.mark.unit
+class TestMaintenance:
+    
+    @pytest.fixture
+    def engine(self, tmp_path):
+        from sqlalchemy import create_engine
+        from infrastructure.migrations import upgrade
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/maintenance.db")
+        upgrade(engine)
+        return engine
+    
+    def _churn(self, engine):
+        with engine.begin() as connection:
+            connection.exec_driver_sql("CREATE TABLE filler (data BLOB)")
+            connection.exec_driver_sql("INSERT INTO filler SELECT randomblob(4000) FROM (WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) SELECT i FROM n)")
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE filler")
+    
+    def test_incremental_vacuum_reclaims_free_pages(self, engine):
+        from infrastructure.maintenance import enable_incremental_vacuum, maintain_database
+        
+        enable_incremental_vacuum(engine)
+        self._churn(engine)
+        
+        report = maintain_database(engine, integrity="full")
+        
+        assert report["vacuum"] == "incremental"
+        assert report["reclaimed_bytes"] > 200 * 4000
+        assert report["freelist_pages"] == 0
+        assert report["integrity"] == "ok"
+        assert report["analyze"] == "full"
+        assert maintain_database(engine)["analyze"] == "optimize"
+    
+    def test_wal_checkpoint_truncates_large_log(self, engine):
+        from infrastructure.maintenance import maintain_database
+        
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        self._churn(engine)
+        
+        report = maintain_database(engine, wal_truncate_bytes=1)
+        
+        assert report["journal_mode"] == "wal"
+        assert report["wal_bytes_before"] > 0
+        assert report["checkpoint"]["mode"] == "truncate"
+        assert report["wal_bytes_after"] == 0
+    
+    def test_worker_waits_for_quiet_period(self):
+        from infrastructure.maintenance import MaintenanceWorker
+        
+        worker = MaintenanceWorker(quiet_seconds=30)
+        worker.idle_seconds = lambda: 5.0
+        assert not worker.should_run()
+        worker.idle_seconds = lambda: 31.0
+        assert worker.should_run()
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestTaskReadModel:
+    
+    def test_lru_eviction_respects_memory_budget(self):
+        from application.read_model import TaskReadModel, estimate_size
+        
+        tasks = [Task(id=i, title=f"Task {i}") for i in range(10)]
+        read_model = TaskReadModel(max_bytes=estimate_size(tasks) * 2)
+        for user_id in (1, 2):
+            read_model.put_list(user_id, list(tasks), read_model.generation(user_id))
+        read_model.get_list(1)
+        read_model.put_list(3, list(tasks), read_model.generation(3))
+        
+        assert read_model.is_warm(1) and read_model.is_warm(3)
+        assert not read_model.is_warm(2)
+        assert read_model.stats()["evictions"] == 1
+        assert read_model.size <= read_model.max_bytes
+    
+    def test_write_during_load_discards_stale_list(self):
+        from application.read_model import TaskReadModel
+        
+        read_model = TaskReadModel()
+        generation = read_model.generation(1)
+        read_model.invalidate(1)
+        read_model.put_list(1, [Task(id=1, title="stale")], generation)
+        
+        assert read_model.get_list(1) is None
+
+    def test_returned_tasks_are_copies(self):
+        from application.read_model import TaskReadModel
+        from domain.models import Subtask
+
+        read_model = TaskReadModel()
+        loaded = [Task(id=1, title="Pack", subtasks=[Subtask(id=1, title="Passport")])]
+        read_model.put_list(1, loaded, read_model.generation(1))
+        loaded[0].title = "changed by loader"
+
+        read_model.get_list(1)[0].subtasks.append(Subtask(id=2, title="Charger"))
+        read_model.get_task(1, 1).title = "changed by caller"
+
+        cached = read_model.get_task(1, 1)
+        assert cached.title == "Pack"
+        assert [s.id for s in cached.subtasks] == [1]
+
+    def test_generation_tracking_is_bounded(self, monkeypatch):
+        from application import read_model as read_model_module
+
+        monkeypatch.setattr(read_model_module, "TRACKED_GENERATIONS", 3)
+        read_model = read_model_module.TaskReadModel()
+        generation = read_model.generation(1)
+        for user_id in range(1, 6):
+            read_model.invalidate(user_id)
+        read_model.put_list(1, [Task(id=1, title="stale")], generation)
+
+        assert len(read_model._generations) == 3
+        assert read_model.get_list(1) is None
+        read_model.put_list(1, [Task(id=1, title="fresh")], read_model.generation(1))
+        assert read_model.get_list(1)[0].title == "fresh"
+
+    def test_cached_repository_serves_warm_user_and_applies_writes(self, task_repository, test_user):
+        from application.read_model import CachedTaskRepository, TaskReadModel
+        
+        read_model = TaskReadModel()
+        repository = CachedTaskRepository(task_repository, read_model)
+        first = repository.create("First", test_user.id)
+        repository.get_all_by_user(test_user.id)
+        second = repository.create("Second", test_user.id)
+        repository.update(first.id, test_user.id, completed=True)
+        
+        tasks = repository.get_all_by_user(test_user.id)
+        
+        assert [t.id for t in tasks] == [first.id, second.id]
+        assert tasks[0].completed is True
+        assert repository.get_by_id(second.id, test_user.id).title == "Second"
+        assert repository.get_by_id(99999, test_user.id) is None
+        stats = read_model.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 3
+        
+        repository.add_subtask(first.id, test_user.id, "Sub")
+        assert not read_model.is_warm(test_user.id)
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestTaskProjection:
+    
+    def test_projection_reads_requested_fields_and_counts(self, task_repository, test_user):
+        from domain.models import TaskProjection
+        
+        task = task_repository.create("Pack", test_user.id, priority="high", category="Trip")
+        subtasks = task_repository.add_subtasks(task.id, test_user.id, ["Passport", "Charger"])
+        task_repository.toggle_subtask(subtasks[0].id, task.id, test_user.id, True)
+        
+        counted = task_repository.get_all_by_user(test_user.id, projection=TaskProjection(fields=("id", "priority", "category"), subtask_counts=True))[0]
+        assert (counted.priority, counted.category, counted.title) == ("high", "Trip", "")
+        assert (counted.subtask_total, counted.subtask_completed) == (2, 1)
+        assert counted.subtasks == []
+        
+        embedded = task_repository.get_by_id(task.id, test_user.id, TaskProjection(fields=("id", "title"), subtasks=True))
+        assert [s.title for s in embedded.subtasks] == ["Passport", "Charger"]
+        assert task_repository.get_by_id(task.id, test_user.id + 1, TaskProjection()) is None
+    
+    def test_cached_projection_is_served_from_warm_list(self, task_repository, test_user):
+        from application.read_model import CachedTaskRepository, TaskReadModel
+        from domain.models import TaskProjection
+        
+        read_model = TaskReadModel()
+        repository = CachedTaskRepository(task_repository, read_model)
+        task = repository.create("Pack", test_user.id)
+        repository.add_subtask(task.id, test_user.id, "Passport")
+        repository.get_all_by_user(test_user.id)
+        
+        counted = repository.get_all_by_user(test_user.id, projection=TaskProjection(subtask_counts=True))
+        
+        assert counted[0].subtask_total == 1
+        assert read_model.stats()["hits"] == 1
+
+@pytest.mark.unit
+@pytest.mark.tasks
+class TestSubtaskCounters:
+    
+    def test_counters_follow_every_subtask_write(self, task_repository, test_user):
+        user_id = test_user.id
+        task = task_repository.create("Pack", user_id)
+        
+        def counters():
+            stored = task_repository.get_by_id(task.id, user_id)
+            return stored.subtask_total, stored.subtask_completed
+        
+        subtasks = task_repository.add_subtasks(task.id, user_id, ["Passport", "Charger", "Tickets"])
+        assert counters() == (3, 0)
+        task_repository.toggle_subtask(subtasks[0].id, task.id, user_id, True)
+        task_repository.toggle_subtask(subtasks[0].id, task.id, user_id, True)
+        assert counters() == (3, 1)
+        task_repository.delete_subtask(subtasks[1].id, task.id, user_id)
+        assert counters() == (2, 1)
+        task_repository.set_subtasks_completed(task.id, user_id, True)
+        assert counters() == (2, 2)
+        task_repository.delete_completed_subtasks(task.id, user_id)
+        assert counters() == (0, 0)
+        
+        task_repository.add_subtask(task.id, user_id, "Snacks")
+        listed = task_repository.get_all_by_user(user_id)[0]
+        assert (listed.subtask_total, listed.subtask_completed) == (1, 0)
+    
+    def test_repair_recomputes_drifted_counters(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from infrastructure.maintenance import repair_subtask_counts
+        from infrastructure.migrations import upgrade
+        from infrastructure.repositories import TaskRepository
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/counters.db")
+        upgrade(engine)
+        repository = TaskRepository(sessionmaker(bind=engine)())
+        task = repository.create("Pack", 1)
+        repository.add_subtasks(task.id, 1, ["Passport", "Charger"])
+        repository.create("Empty", 1)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE tasks SET subtask_total = 7, subtask_completed = 1")
+        
+        assert repair_subtask_counts(engine)["tasks"] == 2
+        assert repair_subtask_counts(engine)["tasks"] == 0
+        repository.db.expire_all()
+        assert [(t.subtask_total, t.subtask_completed) for t in repository.get_all_by_user(1)] == [(2, 0), (0, 0)]
+        repository.close()
+
+def _shared_cache_writer(path, worker, rounds):
+    # Runs in a separate process, like another API worker: every round writes
+    # to user 0, whom all workers read, and reloads the worker's own user.
+    from application.read_model import TaskReadModel
+    from infrastructure.shared_cache import SharedCache
+    
+    read_model = TaskReadModel(shared=SharedCache(path))
+    for round_number in range(rounds):
+        read_model.invalidate(0)
+        read_model.put_list(worker, [Task(id=round_number, title=f"w{worker}-{round_number}")], read_model.generation(worker))
+
+@pytest.mark.unit
+class TestSharedCache:
+    
+    def test_get_set_ttl_and_invalidate(self, tmp_path):
+        from infrastructure.shared_cache import SharedCache
+        
+        cache = SharedCache(str(tmp_path / "cache.db"))
+        cache.set("live", {"value": 1})
+        cache.set("expired", 2, ttl_seconds=-1)
+        
+        assert cache.get("live") == {"value": 1}
+        assert cache.get("expired") is None
+        
+        since = cache.version()
+        cache.invalidate("live")
+        assert cache.get("live") is None
+        assert cache.set("live", 3, since=since) is False
+        assert cache.set("live", 3, since=cache.version()) is True
+    
+    def test_task_lists_round_trip_as_json(self, tmp_path):
+        from application.read_model import TaskReadModel
+        from domain.models import Recurrence, Subtask
+        from infrastructure.shared_cache import SharedCache
+        
+        cache = SharedCache(str(tmp_path / "cache.db"))
+        now = datetime.utcnow()
+        task = Task(
+            id=1, title="Water plants", deadline=now, created_at=now, user_id=1, category="home",
+            subtasks=[Subtask(id=2, title="Balcony", completed=True, task_id=1)],
+            recurrence=Recurrence(frequency="weekly", interval=2, start=now), series_id=1,
+        )
+        TaskReadModel(shared=cache).put_list(1, [task], (0, cache.version()))
+        
+        cache._connect().execute("INSERT INTO cache_entries VALUES ('tasks:2', ?, 1e12)", (b"\x80\x04old pickle",))
+        worker = TaskReadModel(shared=cache)
+        assert worker.get_list(1) == [task]
+        assert worker.get_list(2) is None
+    
+    def test_writes_in_other_processes_reach_every_worker(self, tmp_path):
+        import multiprocessing
+        from application.read_model import TaskReadModel
+        from infrastructure.shared_cache import SharedCache
+        
+        path = str(tmp_path / "cache.db")
+        read_model = TaskReadModel(shared=SharedCache(path))
+        read_model.put_list(0, [Task(id=1, title="before")], read_model.generation(0))
+        assert read_model.get_list(0)[0].title == "before"
+        
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_shared_cache_writer, args=(path, worker, 5)) for worker in (1, 2, 3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        assert [process.exitcode for process in processes] == [0, 0, 0]
+        
+        assert read_model.get_list(0) is None
+        for worker in (1, 2, 3):
+            assert [t.title for t in read_model.get_list(worker)] == [f"w{worker}-4"]
+        stats = read_model.stats()
+        assert stats["remote_invalidations"] == 15
+        assert stats["shared_hits"] == 3
+    
+    def test_cached_user_lookup_is_invalidated_by_writes(self, tmp_path, user_repository):
+        from application.read_model import CachedUserRepository
+        from infrastructure.shared_cache import SharedCache
+        
+        cache = SharedCache(str(tmp_path / "cache.db"))
+        repository = CachedUserRepository(user_repository, cache, ttl_seconds=60)
+        assert repository.get_by_username("cached") is None
+        
+        repository.create("cached", "cached@example.com", "hash")
+        assert repository.get_by_username("cached").email == "cached@example.com"
+        assert repository.get_by_username("cached").email == "cached@example.com"
+        assert cache.stats()["hits"] == 1
+
+@pytest.mark.unit
+class TestServerConfig:
+    
+    def test_workers_follow_storage_backend(self, monkeypatch):
+        from infrastructure.server import autotune_workers
+        
+        monkeypatch.setattr("infrastructure.server.SQLITE_MAX_WORKERS", 4)
+        
+        assert autotune_workers(8, "sqlite:///./data/app.db", 1)[0] == 4
+        assert autotune_workers(2, "sqlite:///./data/app.db", 1)[0] == 2
+        assert autotune_workers(8, "sqlite:///./data/app.db", 8)[0] == 8
+        assert autotune_workers(8, "sqlite://", 1)[0] == 1
+        assert autotune_workers(4, "postgresql://db/app", 1)[0] == 9
+    
+    def test_explicit_workers_and_fallback_event_loop(self, monkeypatch):
+        from infrastructure.server import resolve_server_config, uvicorn_options
+        
+        monkeypatch.setattr("infrastructure.server._available", lambda module: False)
+        monkeypatch.setattr("infrastructure.server.WEB_MAX_REQUESTS", 1000)
+        config = resolve_server_config(workers=3, port=9000)
+        options = uvicorn_options(config)
+        
+        assert (config.workers, config.workers_reason) == (3, "set explicitly")
+        assert (options["loop"], options["http"], options["port"]) == ("asyncio", "h11", 9000)
+        assert options["limit_max_requests"] == 1000
+        assert "limit_max_requests" not in uvicorn_options(resolve_server_config(workers=1))
+    
+    def test_options_are_accepted_by_uvicorn(self, monkeypatch):
+        import inspect
+        import uvicorn
+        from infrastructure.server import resolve_server_config, uvicorn_options
+        
+        monkeypatch.setattr("infrastructure.server.WEB_MAX_REQUESTS", 1000)
+        monkeypatch.setattr("infrastructure.server.WEB_MAX_REQUESTS_JITTER", 100)
+        options = uvicorn_options(resolve_server_config(workers=3))
+        
+        assert "limit_max_requests_jitter" in options
+        assert set(options) <= set(inspect.signature(uvicorn.run).parameters)
+
+@pytest.mark.unit
+class TestAdmissionControl:
+    
+    def test_token_bucket_refills_at_rate(self):
+        from infrastructure.rate_limiting import RateLimit, TokenBucket
+        
+        bucket = TokenBucket(RateLimit(rate=2, burst=2), now=0.0)
+        
+        assert bucket.take(0.0) == 0
+        assert bucket.take(0.0) == 0
+        assert bucket.take(0.0) == pytest.approx(0.5)
+        assert bucket.take(0.5) == 0
+    
+    def test_budgets_are_separate_per_principal_and_kind(self):
+        from infrastructure.rate_limiting import AdmissionController, RateLimit
+        
+        limits = {kind: RateLimit(rate=0.001, burst=1) for kind in ("read", "write", "auth")}
+        controller = AdmissionController(limits, enabled=True)
+        
+        assert controller.check_rate("write", "user:a") == 0
+        assert controller.check_rate("write", "user:a") > 0
+        assert controller.check_rate("read", "user:a") == 0
+        assert controller.check_rate("write", "user:b") == 0
+        assert controller.stats()["rejections"] == {"rate_limited_write": 1}
+
+
+@pytest.mark.unit
+class TestMemorySampler:
+    
+    def test_samples_are_bounded_and_exported(self, tmp_path):
+        import json
+        from infrastructure.memory import MemorySampler
+        
+        path = tmp_path / "memory.jsonl"
+        sampler = MemorySampler(interval_seconds=0, history=2, series_path=str(path))
+        for _ in range(3):
+            sampler.run_once()
+        
+        exported = [json.loads(line) for line in path.read_text().splitlines()]
+        assert len(sampler.samples) == 2
+        assert len(exported) == 3
+        assert exported[-1] == sampler.stats()["latest"]
+        assert {"rss_bytes", "gc_counts", "sessions", "identity_map_objects"} <= set(exported[0])